@@ -0,0 +1,386 @@
+# benchmark.py
+# Headless benchmark for the dashboard layouts.
+# Every layout runs against the "capture" backend (the real ssd1306/sh1106
+# driver and I2C transport talking to a MockSMBus), so no panel or I2C bus is
+# needed.
+# Layouts are fed the same synthetic values on every run, so results from
+# different commits can be compared with --compare.
+#
+# Usage: python3 benchmark.py [--frames 200] [--output results.json] [--compare old.json]
+#        python3 benchmark.py --soak 3600
+#        python3 benchmark.py --replay recordings/1-0x3c-20250101-120000.oledrec
+# --soak renders every layout in turn for that many seconds and reports how
+# resident memory and live Python allocations develop; both should stay flat.
+# The marquee.* entries step a scrolling line once per frame instead of
+# redrawing, see marquee.py.
+# --replay pushes the frames of a recording (see recorder.py) through both
+# drivers instead of the layouts, measuring packing, diffing and transfer on
+# what a panel really showed.
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque, namedtuple
+
+os.environ.setdefault("OLED_BACKEND", "capture")
+
+import config  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# What psutil.disk_usage() returns for the root filesystem in the storage screen's input
+DiskUsage = namedtuple("DiskUsage", "total used free percent")
+ROOT_USAGE = DiskUsage(63.2e9, 18.4e9, 43.5e9, 31.2)
+
+
+def load_script(filename):
+    """Imports one of the dashboard scripts as a module without running its main loop."""
+    name = os.path.splitext(filename)[0].replace(".", "_")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_stats(frame):
+    """Deterministic values for frame: CPU changes every frame, memory every 5, the rest never."""
+    cpu = float((frame * 7) % 100) + 0.5
+    memory = 40.0 + (frame // 5) % 10
+    return {
+        "ip_address": "192.168.1.42",
+        "cpu_usage": cpu,
+        "memory": (memory, 3.9 * memory / 100, 3.9),
+        "temperature": f"{45 + frame % 3}.0'C",
+        "disk": (31.2, 18.4, 58.9),
+        "weather": ("Light rain", 11.2, 80),
+    }
+
+
+def layouts():
+    """Returns {name: (device, render(frame))} for every dashboard layout."""
+    result = {}
+
+    for filename in ("oled_stats.py", "oled_stats2.py"):
+        module = load_script(filename)
+        result[filename[:-3]] = (module.device, lambda frame, m=module: m.display_system_info(synthetic_stats(frame)))
+
+    stats3 = load_script("oled_stats3.py")
+
+    def render_stats3(frame):
+        stats3.stats.update(synthetic_stats(frame))
+        stats3.display_system_info()
+    result["oled_stats3.system"] = (stats3.device, render_stats3)
+
+    def render_stats3_weather(frame):
+        stats3.stats.update(synthetic_stats(frame))
+        stats3.display_weather_page()
+    result["oled_stats3.weather"] = (stats3.device, render_stats3_weather)
+
+    weather = load_script("oled_weather.py")
+
+    def render_weather(frame):
+        weather.stats.update(synthetic_stats(frame))
+        weather.display_weather_page()
+    result["oled_weather"] = (weather.device, render_weather)
+
+    oled_13 = load_script("oled_1.3.py")
+    for index, (screen, _) in enumerate(oled_13.screens):
+        def render_13(frame, index=index):
+            values = synthetic_stats(frame)
+            oled_13.stats.update(
+                ip_address=values["ip_address"], cpu_usage=values["cpu_usage"], cpu_speed="1500MHz",
+                cpu_temp=values["temperature"], ram_usage=values["memory"][0], ram_remaining="2048MB",
+                fan_speed="Lvl 1", mounts=[("OS", ROOT_USAGE, "ok"), ("USB", None, "missing")],
+                disk_io=(frame % 4 * 51200.0, 4096.0), net_io=(frame % 3 * 1024.0, 850.0))
+            oled_13.screen_index = index
+            oled_13.redraw()
+        result[f"oled_1.3.{screen.name}"] = (oled_13.device, render_13)
+
+    result.update(marquee_layouts())
+    return result
+
+
+def marquee_layouts():
+    """Returns {name: (device, render(frame))} scrolling a weather description one step per frame after the first."""
+    from PIL import Image, ImageDraw
+
+    import layouts as shared
+    from display import create_device
+    from fonts import get_font
+    from marquee import Marquee, Marquees
+
+    values = shared.weather.values({"weather": ("Thunderstorm with light drizzle", 11.2, 80), "weather_location": "Oslo, NO"})
+    result = {}
+    for driver in ("ssd1306", "sh1106"):
+        device = create_device(driver, width=128, height=64)
+        marquees = Marquees(device)
+
+        def render(frame, device=device, marquees=marquees):
+            if frame:
+                marquees.step()
+                return
+            image = Image.new('1', device.size)
+            draw = ImageDraw.Draw(image)
+            shared.weather.paint(draw, values)
+            marquees.update(shared.weather.marquees(values, device.size))
+            marquees.paint(draw)
+            device.display(image)
+        result[f"marquee.{driver}"] = (device, render)
+
+    # A ticker across the bottom two pages, scrolled by the controller itself
+    device = create_device("ssd1306", width=128, height=64)
+    ticker = Marquee(device, "CPU 12%  RAM 41%", (0, 48, 128, 64), get_font(), ticker=True)
+
+    def render_ticker(frame):
+        if frame:
+            ticker.step()
+            return
+        with device.canvas() as draw:
+            ticker.paint(draw)
+    result["marquee.ssd1306.hardware"] = (device, render_ticker)
+    return result
+
+
+def replay_layouts(path):
+    """Returns ({name: (device, render(frame))} replaying a recording on each driver, number of frames)."""
+    from display import create_device
+    from recorder import FrameReader
+
+    reader = FrameReader(path)
+    images = [image for _, image in reader.images()]
+    width, height = (reader.height, reader.width) if reader.rotate % 2 else (reader.width, reader.height)
+    result = {}
+    for driver in ("ssd1306", "sh1106"):
+        device = create_device(driver, width=width, height=height, rotate=reader.rotate)
+        result[f"replay.{driver}"] = (device, lambda frame, device=device: device.display(images[frame % len(images)]))
+    return result, len(images)
+
+
+def bench_layout(device, render, frames):
+    """Renders frames through device and returns timing and transfer figures."""
+    serial = device.device._serial_interface
+    render(0)  # First frame is a full transfer, keep it out of the steady-state numbers
+    bytes_before, transfers_before = serial.bytes_sent, serial.transfers
+    frames_before = device.frames + device.patches
+
+    timings = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for frame in range(1, frames + 1):
+        start = time.perf_counter()
+        render(frame)
+        timings.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    timings.sort()
+    return {
+        "fps": frames / wall,
+        "frame_ms_mean": 1000 * wall / frames,
+        "frame_ms_p95": 1000 * timings[int(len(timings) * 0.95) - 1],
+        "cpu_ms_per_frame": 1000 * cpu / frames,
+        "bytes_per_frame": (serial.bytes_sent - bytes_before) / frames,
+        "transfers_per_frame": (serial.transfers - transfers_before) / frames,
+        # Frames never drawn or sent because the shown values were unchanged (or the controller scrolled)
+        "skipped_fraction": 1 - (device.frames + device.patches - frames_before) / frames,
+    }
+
+
+def bench_collectors(repeat):
+    """Returns the CPU time per call, in microseconds, of every collector."""
+    import collectors
+
+    funcs = {
+        "read_proc_stat": collectors.read_proc_stat,
+        "get_cpu_usage": collectors.get_cpu_usage,
+        "read_ip_address": collectors.read_ip_address,
+        "get_ip_address": collectors.get_ip_address,
+        "read_cpu_temperature": collectors.read_cpu_temperature,
+        "get_memory_usage": collectors.get_memory_usage,
+        "get_disk_usage": collectors.get_disk_usage,
+        "get_cpu_info": collectors.get_cpu_info,
+        "get_fan_speed": collectors.get_fan_speed,
+    }
+    # What a dashboard pays instead while the collector daemon runs (see statsbus.py)
+    import statsbus
+    publisher = statsbus.StatsPublisher(f"oled_benchmark_{os.getpid()}")
+    reader = statsbus.StatsReader(publisher.name)
+    published = dict(synthetic_stats(0), mounts=[("OS", ROOT_USAGE, "ok")])
+    funcs["stats_bus_publish"] = lambda: publisher.publish(published)
+    funcs["stats_bus_read"] = lambda: reader.update({})
+    funcs["stats_bus_publish_read"] = lambda: (publisher.publish(published), reader.update({}))
+
+    result = {}
+    try:
+        for name, func in funcs.items():
+            func()
+            start = time.process_time()
+            for _ in range(repeat):
+                func()
+            result[name] = 1e6 * (time.process_time() - start) / repeat
+    finally:
+        reader.close()
+        publisher.close()
+        publisher.unlink()
+    return result
+
+
+def soak(seconds, samples=20):
+    """Renders every layout in turn for seconds; returns [(elapsed, frames, rss_bytes, allocated_blocks)]."""
+    import gc
+    from metrics import read_rss
+
+    renders = []
+    for device, render in layouts().values():
+        # The capture buses log their last writes, a short log keeps that out of the figures
+        device.device._serial_interface._bus.writes = deque(maxlen=8)
+        renders.append(render)
+    # Fill the font, text and icon caches first, they are meant to grow once
+    for frame in range(1000):
+        for render in renders:
+            render(frame)
+    gc.collect()
+
+    result = []
+    frame = 0
+    start = time.monotonic()
+    next_sample = start
+    while True:
+        now = time.monotonic()
+        if now >= next_sample:
+            result.append((now - start, frame * len(renders), read_rss(), sys.getallocatedblocks()))
+            if now - start >= seconds:
+                return result
+            next_sample += seconds / samples
+        for render in renders:
+            render(frame)
+        frame += 1
+
+
+def print_soak(samples):
+    print(f"{'seconds':>10}{'frames':>10}{'RSS KB':>10}{'blocks':>10}")
+    for elapsed, frames, rss, blocks in samples:
+        print(f"{elapsed:>10.0f}{frames:>10}{rss // 1024:>10}{blocks:>10}")
+    _, first_frames, first_rss, first_blocks = samples[1] if len(samples) > 2 else samples[0]
+    _, frames, rss, blocks = samples[-1]
+    frames -= first_frames
+    if frames:
+        print(f"after the first sample: RSS {(rss - first_rss) / 1024:+.0f} KB, "
+              f"{(blocks - first_blocks) / frames:+.4f} live allocations per frame over {frames} frames")
+
+
+def bench_packing(repeat):
+    """Returns the time per frame, in microseconds, of every page packer on a few panel sizes."""
+    import random
+    from PIL import Image
+    import display
+
+    result = {}
+    for width, height in ((128, 32), (128, 64), (128, 128)):
+        # Random pixels, packing cost does not depend on what is drawn
+        rng = random.Random(width * height)
+        image = Image.frombytes('1', (width, height), bytes(rng.getrandbits(8) for _ in range(width * height // 8)))
+        out = [bytearray(width) for _ in range(height // 8)]
+        for name in display.PACKERS:
+            pack = display.get_packer(name)
+            if pack is not display.PACKERS[name]:
+                continue  # numpy is not installed
+            # The per-pixel reference is ~20x slower, fewer rounds keep the run short
+            rounds = max(1, repeat // 20) if name == "python" else repeat
+            start = time.perf_counter()
+            for _ in range(rounds):
+                pack(image, width, height // 8, out)
+            result[f"{name} {width}x{height}"] = 1e6 * (time.perf_counter() - start) / rounds
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(frames, repeat, replay=None):
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "frames": frames,
+        "layouts": {},
+        "collectors": {},
+        "packing": {},
+    }
+    if replay:
+        benches, recorded = replay_layouts(replay)
+        # The whole recording once, after the first frame
+        frames = results["frames"] = frames or max(1, recorded - 1)
+    else:
+        benches = layouts()
+        frames = results["frames"] = frames or 200
+    for name, (device, render) in benches.items():
+        results["layouts"][name] = bench_layout(device, render, frames)
+    results["collectors"] = bench_collectors(repeat)
+    results["packing"] = bench_packing(repeat * 10)
+    return results
+
+
+def print_results(results, baseline=None):
+    def delta(section, name, key, value):
+        if not baseline or name not in baseline.get(section, {}):
+            return ""
+        old = baseline[section][name]
+        old = old[key] if key else old
+        return f" ({(value - old) / old * 100:+.0f}%)" if old else ""
+
+    print(f"commit {results['commit']}  python {results['python']}  {results['machine']}")
+    print(f"{'layout':<28}{'fps':>10}{'ms/frame':>10}{'p95 ms':>10}{'B/frame':>10}{'xfer/fr':>10}{'skipped':>10}")
+    for name, r in results["layouts"].items():
+        print(f"{name:<28}{r['fps']:>10.1f}{r['frame_ms_mean']:>10.2f}{r['frame_ms_p95']:>10.2f}"
+              f"{r['bytes_per_frame']:>10.1f}{r['transfers_per_frame']:>10.1f}{r.get('skipped_fraction', 0):>10.0%}"
+              f"{delta('layouts', name, 'frame_ms_mean', r['frame_ms_mean'])}")
+    print(f"{'collector':<28}{'us/call':>10}")
+    for name, us in results["collectors"].items():
+        print(f"{name:<28}{us:>10.1f}{delta('collectors', name, None, us)}")
+    print(f"{'page packing':<28}{'us/frame':>10}")
+    for name, us in results.get("packing", {}).items():
+        print(f"{name:<28}{us:>10.1f}{delta('packing', name, None, us)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OLED dashboard layouts without hardware.")
+    parser.add_argument("--frames", type=int, help="frames rendered per layout (default 200, or the whole recording)")
+    parser.add_argument("--repeat", type=int, default=200, help="calls timed per collector")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--soak", type=float, metavar="SECONDS", help="render for this long and report memory growth")
+    parser.add_argument("--replay", metavar="FILE", help="benchmark the frames of a recording instead of the layouts")
+    args = parser.parse_args()
+
+    # Keep benchmark history out of the real history files
+    config.HISTORY_DIR = tempfile.mkdtemp(prefix="oled-bench-")
+
+    if args.soak:
+        print_soak(soak(args.soak))
+        return
+
+    results = run(args.frames, args.repeat, args.replay)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
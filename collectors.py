@@ -0,0 +1,642 @@
+# collectors.py
+# Shared system-stat collectors for the OLED dashboards.
+# The render loops only read the latest values from here, nothing in this
+# module should ever block a frame. psutil is imported on first use, so
+# importing this module stays cheap on the way to the first frame.
+#
+# Disk space is the one stat that can hang: statvfs on a stuck USB drive or
+# network mount blocks until the kernel gives up. StorageMonitor probes every
+# mount on a throwaway thread with a timeout, so a hung mount is reported as
+# such and the render loop only ever reads cached results.
+#
+# The IP address, the mounts and the fan level are re-read when they change
+# (see watchers.py) rather than polled; polling is only a fallback where the
+# change notifications are not available.
+#
+# With the collector daemon running (stats_daemon.py), dashboards run none of
+# this: collector_tasks() then only copies the values it publishes in shared
+# memory (see statsbus.py).
+
+import fcntl
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import config
+from history import get_history
+from metrics import timed, register_gauge
+from statsbus import get_stats_reader
+from watchers import ChangeWatcher, ThermalTrips
+
+CPU_STAT_PATH = "/proc/stat"
+ROUTE_PATH = "/proc/net/route"
+NET_DEV_PATH = "/proc/net/dev"
+DISKSTATS_PATH = "/proc/diskstats"
+SYS_BLOCK_PATH = "/sys/block"
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+FAN_PATH = "/sys/class/thermal/cooling_device0/cur_state"
+
+SIOCGIFADDR = 0x8915
+
+
+def read_proc_stat(path=CPU_STAT_PATH):
+    """Returns the jiffy counters of every 'cpu' line in /proc/stat, keyed by name."""
+    counters = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            fields = line.split()
+            counters[fields[0]] = [int(v) for v in fields[1:]]
+    return counters
+
+
+def cpu_percentages(prev, cur):
+    """Returns (busy, iowait, steal) percentages between two /proc/stat counter lists."""
+    # user nice system idle iowait irq softirq steal (guest is already in user)
+    deltas = [c - p for c, p in zip(cur[:8], prev[:8])]
+    deltas += [0] * (8 - len(deltas))
+    total = sum(deltas)
+    if total <= 0:
+        return 0.0, 0.0, 0.0
+    idle = deltas[3] + deltas[4]
+    busy = 100.0 * (total - idle) / total
+    iowait = 100.0 * deltas[4] / total
+    steal = 100.0 * deltas[7] / total
+    return round(busy, 1), round(iowait, 1), round(steal, 1)
+
+
+class CpuSampler(threading.Thread):
+    """Background thread that keeps the latest CPU utilisation from /proc/stat deltas.
+
+    The sampling window (interval) is independent of the display refresh; readers
+    just pick up whatever the last completed window measured.
+    """
+
+    def __init__(self, interval=1.0, path=CPU_STAT_PATH):
+        super().__init__(name="cpu-sampler", daemon=True)
+        self.interval = interval
+        self.path = path
+        self._wake = threading.Event()
+        self._stopped = False
+        self._prev = read_proc_stat(path)
+        # Until the first window completes, report the average since boot
+        self._update({name: [0] * len(values) for name, values in self._prev.items()}, self._prev)
+
+    def _update(self, prev, cur):
+        self.total, self.iowait, self.steal = cpu_percentages(prev["cpu"], cur["cpu"])
+        cores = sorted((name for name in cur if name != "cpu" and name in prev),
+                       key=lambda name: int(name[3:]))
+        self.per_core = [cpu_percentages(prev[name], cur[name])[0] for name in cores]
+
+    def set_interval(self, interval):
+        """Changes the sampling window; a shorter one takes effect right away."""
+        shorter = interval < self.interval
+        self.interval = interval
+        if shorter:
+            self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                cur = read_proc_stat(self.path)
+            except OSError:
+                continue
+            self._update(self._prev, cur)
+            self._prev = cur
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+
+_cpu_sampler = None
+_cpu_sampler_lock = threading.Lock()
+
+
+def get_cpu_sampler(start=True):
+    """Returns the shared CpuSampler, starting it on first use; None if start is False and it is not running."""
+    global _cpu_sampler
+    with _cpu_sampler_lock:
+        if _cpu_sampler is None and start:
+            _cpu_sampler = CpuSampler(config.CPU_SAMPLE_INTERVAL)
+            _cpu_sampler.start()
+    return _cpu_sampler
+
+
+@timed("get_cpu_usage")
+def get_cpu_usage():
+    """Returns the latest total CPU usage percentage without blocking."""
+    return get_cpu_sampler().total
+
+
+class TTLCache:
+    """Caches the result of a collector function for ttl seconds."""
+
+    def __init__(self, func, ttl):
+        self.func = func
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._expires:
+                self._value = self.func()
+                self._expires = now + self.ttl
+            return self._value
+
+    def invalidate(self):
+        """Forces the next call to collect a fresh value."""
+        with self._lock:
+            self._expires = 0.0
+
+
+def get_default_interface(path=ROUTE_PATH):
+    """Returns the name of the interface carrying the default route, or None."""
+    with open(path, 'r') as f:
+        next(f)  # Header
+        for line in f:
+            fields = line.split()
+            if len(fields) > 1 and fields[1] == "00000000":
+                return fields[0]
+    return None
+
+
+def list_interfaces(path=NET_DEV_PATH):
+    """Returns the names of all network interfaces listed in /proc/net/dev."""
+    with open(path, 'r') as f:
+        lines = f.readlines()[2:]
+    return [line.split(":", 1)[0].strip() for line in lines]
+
+
+def get_interface_address(ifname):
+    """Returns the IPv4 address of an interface via the SIOCGIFADDR ioctl, or None."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            packed = fcntl.ioctl(sock.fileno(), SIOCGIFADDR,
+                                 struct.pack('256s', ifname[:15].encode()))
+        except OSError:
+            # Interface is down or has no IPv4 address
+            return None
+    return socket.inet_ntoa(packed[20:24])
+
+
+def read_ip_address():
+    """Gets the primary IP address in-process, falling back to 'hostname -I' only if that fails.
+
+    Returns "N/A" when no interface has an IPv4 address.
+    """
+    try:
+        default = get_default_interface()
+        candidates = [default] if default else []
+        candidates += [name for name in list_interfaces() if name not in ("lo", default)]
+    except OSError:
+        candidates = None
+    if candidates is not None:
+        for ifname in candidates:
+            ip = get_interface_address(ifname)
+            if ip:
+                return ip
+        # Not connected: hostname would find nothing either
+        return "N/A"
+
+    # Fast path unavailable, fork hostname as before
+    try:
+        return subprocess.check_output(['hostname', '-I'], text=True).split()[0]
+    except Exception:
+        return "N/A"
+
+
+def read_cpu_temperature():
+    """Returns the CPU temperature in Celsius from sysfs, falling back to vcgencmd."""
+    try:
+        with open(THERMAL_PATH, 'r') as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        pass
+
+    try:
+        temp = subprocess.check_output(["vcgencmd", "measure_temp"]).decode()
+        return float(temp.replace("temp=", "").replace("'C", "").strip())
+    except Exception:
+        return None
+
+
+# Only the real collection is timed, cache hits cost next to nothing
+get_ip_address = TTLCache(timed("read_ip_address")(read_ip_address), config.IP_ADDRESS_TTL)
+get_cpu_temperature = TTLCache(timed("read_cpu_temperature")(read_cpu_temperature), config.TEMPERATURE_TTL)
+
+
+def get_temperature():
+    """Returns the CPU temperature formatted like 'vcgencmd measure_temp' (e.g. 48.3'C)."""
+    temp = get_cpu_temperature()
+    if temp is None:
+        return "N/A"
+    return f"{temp:.1f}'C"
+
+
+def parse_temperature(text):
+    """Inverse of get_temperature(): the temperature in °C, or None for 'N/A'."""
+    try:
+        return float(text.split("'")[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+@timed("get_memory_usage")
+def get_memory_usage():
+    import psutil
+    mem = psutil.virtual_memory()
+    return mem.percent, mem.used / (1024 * 1024 * 1024), mem.total / (1024 * 1024 * 1024)
+
+
+@timed("get_disk_usage")
+def get_disk_usage():
+    """Returns root filesystem usage percentage, used GB and total GB from the storage monitor's cache."""
+    disk = get_storage_monitor().usage('/')
+    if disk is None:
+        return 0.0, 0.0, 0.0
+    return disk.percent, disk.used / (1024 * 1024 * 1024), disk.total / (1024 * 1024 * 1024)
+
+
+@timed("get_cpu_info")
+def get_cpu_info():
+    """Returns CPU usage percentage, speed in MHz, and temperature."""
+    # Sampled from /proc/stat in the background, so this never blocks
+    cpu_usage = get_cpu_usage()
+    # On Pi 5, current frequency is more reliable.
+    import psutil
+    try:
+        cpu_freq_info = psutil.cpu_freq()
+        cpu_speed = f"{cpu_freq_info.current:.0f}MHz"
+    except Exception:
+        cpu_speed = "N/A"
+
+    # Read CPU temperature (cached, sysfs with a vcgencmd fallback)
+    temp = get_cpu_temperature()
+    cpu_temp = f"{temp:.1f}°C" if temp is not None else "N/A"
+
+    return cpu_usage, cpu_speed, cpu_temp
+
+
+@timed("get_ram_info")
+def get_ram_info():
+    """Returns RAM usage percentage and remaining MB."""
+    import psutil
+    ram = psutil.virtual_memory()
+    ram_usage = ram.percent
+    ram_remaining = f"{ram.available / (1024*1024):.0f}MB"
+    return ram_usage, ram_remaining
+
+
+def read_disk_counters(path=DISKSTATS_PATH, block_path=SYS_BLOCK_PATH):
+    """Returns total bytes read and written by the physical disks since boot.
+
+    Only devices backed by hardware (with a device link in /sys/block) are
+    counted, so partitions, loop, zram and device-mapper I/O isn't counted twice.
+    """
+    disks = {name for name in os.listdir(block_path) if os.path.exists(os.path.join(block_path, name, "device"))}
+    read = written = 0
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) > 9 and fields[2] in disks:
+                read += int(fields[5])  # Sectors are always 512 bytes here
+                written += int(fields[9])
+    return read * 512, written * 512
+
+
+def read_net_counters(path=NET_DEV_PATH):
+    """Returns total bytes received and transmitted by all interfaces but loopback."""
+    received = transmitted = 0
+    with open(path, 'r') as f:
+        for line in f.readlines()[2:]:
+            name, counters = line.split(":", 1)
+            if name.strip() == "lo":
+                continue
+            fields = counters.split()
+            received += int(fields[0])
+            transmitted += int(fields[8])
+    return received, transmitted
+
+
+class StorageMonitor(threading.Thread):
+    """Keeps disk usage of the mounts and disk / network throughput up to date in the background.
+
+    Every mount is probed on its own short-lived thread. One that does not
+    answer within timeout seconds is marked "hung" and keeps its last result;
+    it is not probed again until the stuck call returns, so threads never pile up.
+    """
+
+    def __init__(self, mounts, interval=60, rate_interval=2, timeout=2):
+        super().__init__(name="storage-monitor", daemon=True)
+        self.mounts = list(mounts)
+        self.interval = interval
+        self.rate_interval = rate_interval
+        self.timeout = timeout
+        self.states = {path: "pending" for path in self.mounts}  # "ok", "missing", "hung" or "pending"
+        self.disk_rates = (0.0, 0.0)  # Read, write bytes/sec
+        self.net_rates = (0.0, 0.0)  # Receive, transmit bytes/sec
+        self.timeouts = 0
+        self._usage = {}
+        self._probes = {}
+        self._counters = None
+        self._after_probe = []
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def refresh(self, callback=None):
+        """Probes the mounts right away (e.g. when the mount table changed), then calls callback()."""
+        if callback is not None:
+            self._after_probe.append(callback)
+        self._wake.set()
+
+    def usage(self, path):
+        """Returns the last psutil disk_usage() result for path, or None if there is none."""
+        if path not in self.states:
+            # Probed from the next round on
+            self.mounts.append(path)
+            self.states[path] = "pending"
+            self._wake.set()
+        return self._usage.get(path)
+
+    def _probe(self, path):
+        import psutil
+        try:
+            if not os.path.ismount(path):
+                # An unplugged drive's mount point would report the root filesystem
+                raise FileNotFoundError(path)
+            self._usage[path] = psutil.disk_usage(path)
+            self.states[path] = "ok"
+        except OSError:
+            self._usage.pop(path, None)
+            self.states[path] = "missing"
+
+    @timed("probe_storage")
+    def probe_mounts(self):
+        """Probes every mount that is not still stuck, waiting at most timeout seconds in total."""
+        started = []
+        for path in list(self.mounts):
+            probe = self._probes.get(path)
+            if probe is not None and probe.is_alive():
+                continue
+            probe = threading.Thread(target=self._probe, args=(path,), name="storage-probe", daemon=True)
+            probe.start()
+            self._probes[path] = probe
+            started.append((path, probe))
+        deadline = time.monotonic() + self.timeout
+        for path, probe in started:
+            probe.join(max(0.0, deadline - time.monotonic()))
+            if probe.is_alive():
+                self.states[path] = "hung"
+                self.timeouts += 1
+
+    def sample_rates(self):
+        """Updates the throughput figures from the counter deltas since the last call."""
+        try:
+            now = time.monotonic()
+            counters = read_disk_counters() + read_net_counters()
+        except (OSError, ValueError, IndexError):
+            return
+        if self._counters is not None:
+            then, previous = self._counters
+            elapsed = now - then
+            if elapsed > 0:
+                # A counter that went backwards (device replugged) counts as idle
+                rates = [max(0, cur - prev) / elapsed for cur, prev in zip(counters, previous)]
+                self.disk_rates = (rates[0], rates[1])
+                self.net_rates = (rates[2], rates[3])
+        self._counters = (now, counters)
+
+    def run(self):
+        next_probe = time.monotonic() + self.interval
+        while True:
+            self._wake.wait(self.rate_interval)
+            if self._stopped:
+                return
+            if self._wake.is_set() or time.monotonic() >= next_probe:
+                self._wake.clear()
+                callbacks, self._after_probe = self._after_probe, []
+                self.probe_mounts()
+                next_probe = time.monotonic() + self.interval
+                for callback in callbacks:
+                    callback()
+            self.sample_rates()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+
+_storage_monitor = None
+_storage_monitor_lock = threading.Lock()
+
+
+def get_storage_monitor():
+    """Returns the shared StorageMonitor for config.STORAGE_MOUNTS, probed once and started on first use."""
+    global _storage_monitor
+    with _storage_monitor_lock:
+        if _storage_monitor is None:
+            paths = [path for _, path in config.STORAGE_MOUNTS]
+            monitor = StorageMonitor(['/'] + [path for path in paths if path != '/'],
+                                     STORAGE_INTERVAL, IO_INTERVAL, config.STORAGE_TIMEOUT)
+            # At most timeout seconds, and only the first time (during warm-up)
+            monitor.probe_mounts()
+            monitor.sample_rates()
+            monitor.start()
+            for label, path in config.STORAGE_MOUNTS:
+                register_gauge("storage_usage_percent", "Disk usage of a mount, unset while it is missing.",
+                               lambda path=path: monitor._usage[path].percent if path in monitor._usage else None,
+                               mount=path)
+                register_gauge("storage_hung", "1 while the last probe of a mount timed out.",
+                               lambda path=path: int(monitor.states[path] == "hung"), mount=path)
+            register_gauge("disk_read_bytes_per_second", "Bytes read from the physical disks.",
+                           lambda: monitor.disk_rates[0])
+            register_gauge("disk_write_bytes_per_second", "Bytes written to the physical disks.",
+                           lambda: monitor.disk_rates[1])
+            register_gauge("network_receive_bytes_per_second", "Bytes received on all interfaces but loopback.",
+                           lambda: monitor.net_rates[0])
+            register_gauge("network_transmit_bytes_per_second", "Bytes sent on all interfaces but loopback.",
+                           lambda: monitor.net_rates[1])
+            _storage_monitor = monitor
+    return _storage_monitor
+
+
+def get_mounts():
+    """Returns [(label, disk_usage or None, state)] for every mount in config.STORAGE_MOUNTS, without blocking."""
+    monitor = get_storage_monitor()
+    return [(label, monitor.usage(path), monitor.states[path]) for label, path in config.STORAGE_MOUNTS]
+
+
+_change_watcher = None
+_change_watcher_lock = threading.Lock()
+
+
+def get_change_watcher():
+    """Returns the shared ChangeWatcher, starting it on first use."""
+    global _change_watcher
+    with _change_watcher_lock:
+        if _change_watcher is None:
+            watcher = ChangeWatcher()
+            watcher.start()
+            for kind in watcher.events:
+                register_gauge("change_events", "Change notifications handled, by what changed.",
+                               lambda kind=kind: watcher.events[kind], kind=kind)
+            _change_watcher = watcher
+    return _change_watcher
+
+
+def watch_ip_address(on_change=None):
+    """Re-reads the IP address whenever the network configuration changes instead of every IP_ADDRESS_TTL seconds.
+
+    on_change() is called after the new address was read. Returns False
+    (and leaves the address polled) where changes cannot be watched.
+    """
+    def changed():
+        get_ip_address.invalidate()
+        get_ip_address()
+        if on_change is not None:
+            on_change()
+
+    if not get_change_watcher().subscribe("address", changed):
+        return False
+    get_ip_address.ttl = WATCHED_INTERVAL
+    return True
+
+
+@timed("get_fan_speed")
+def get_fan_speed():
+    """Returns the fan speed level if available."""
+    # This is a common path for the official Pi 5 fan controller.
+    # It might be different for third-party fans.
+    try:
+        with open(FAN_PATH, 'r') as f:
+            # The value often corresponds to a speed level, not direct RPM.
+            # For the official fan, it's often 0-4.
+            return f"Lvl {int(f.read().strip())}"
+    except (FileNotFoundError, ValueError):
+        return "N/A"
+
+
+# Refresh intervals (seconds) of the shared dashboard values
+CPU_INTERVAL = 1
+MEMORY_INTERVAL = 2
+FAN_INTERVAL = 5
+IP_INTERVAL = 30
+IO_INTERVAL = 2  # Also the disk / network throughput sampling window
+STORAGE_INTERVAL = 60  # How often the mounts are probed
+WATCHED_INTERVAL = 3600  # Safety net for values re-read on change notifications
+
+
+def published_stats():
+    """Returns a copy of the values the collector daemon last published, or None to collect in-process.
+
+    None without a daemon, before its first publish and while its values are stale.
+    """
+    reader = get_stats_reader()
+    if reader is None or reader.stale:
+        return None
+    published = reader.read()
+    return dict(published[0]) if published is not None else None
+
+
+def collector_tasks(stats, on_change=None, from_daemon=True):
+    """Returns (name, interval, collect) scheduler tasks keeping every value a layout reads in stats.
+
+    Every panel in a process reads the same dict, so each value is collected
+    once no matter how many displays show it. Values that are re-read on
+    change notifications call on_change() (from the watcher thread) once
+    they are in stats, e.g. to redraw right away.
+
+    With from_daemon and a collector daemon running, the only task copies
+    the values it publishes into stats, and calls on_change() when the
+    daemon saw such a change. While the daemon's values are stale, the same
+    task runs the in-process collectors at their own intervals instead.
+    """
+    reader = get_stats_reader() if from_daemon else None
+    if reader is not None:
+        local = []  # In-process tasks, only set up once the daemon has gone quiet
+        due = {}
+
+        def read_published():
+            if not reader.stale:
+                if reader.update(stats) and on_change is not None:
+                    on_change()
+                return
+            if not local:
+                local.extend(collector_tasks(stats, on_change, from_daemon=False))
+            now = time.monotonic()
+            for name, interval, collect in local:
+                if now >= due.get(name, 0.0):
+                    due[name] = now + interval
+                    collect()
+        return [("stats_bus", config.STATS_BUS_INTERVAL, read_published)]
+
+    def collect_cpu():
+        stats["cpu_usage"], stats["cpu_speed"], stats["cpu_temp"] = get_cpu_info()
+        stats["temperature"] = get_temperature()
+        now = time.time()
+        get_history("cpu").record(stats["cpu_usage"], now)
+        temp = get_cpu_temperature()
+        if temp is not None:
+            get_history("temperature").record(temp, now)
+            # The fan level only changes when the temperature crosses a trip point
+            if trips is not None and trips.crossed(temp):
+                collect_fan()
+
+    def collect_memory():
+        stats["memory"] = get_memory_usage()
+        stats["ram_usage"], stats["ram_remaining"] = get_ram_info()
+        get_history("ram").record(stats["ram_usage"], time.time())
+
+    def collect_fan():
+        stats["fan_speed"] = get_fan_speed()
+
+    def collect_ip():
+        stats["ip_address"] = get_ip_address()
+
+    def collect_storage():
+        # Cached by the storage monitor, a hung mount never holds this up
+        monitor = get_storage_monitor()
+        stats["disk"] = get_disk_usage()
+        stats["mounts"] = get_mounts()
+        stats["disk_io"] = monitor.disk_rates
+        stats["net_io"] = monitor.net_rates
+
+    def notify():
+        if on_change is not None:
+            on_change()
+
+    def ip_changed():
+        collect_ip()
+        notify()
+
+    def mounts_probed():
+        collect_storage()
+        notify()
+
+    def mounts_changed():
+        # Probed on the monitor's thread, a hung drive never holds up the watcher
+        get_storage_monitor().refresh(mounts_probed)
+
+    trips = ThermalTrips.from_zone()
+    ip_watched = watch_ip_address(ip_changed)
+    get_change_watcher().subscribe("mounts", mounts_changed)
+
+    return [
+        ("cpu", CPU_INTERVAL, collect_cpu),
+        ("memory", MEMORY_INTERVAL, collect_memory),
+        ("fan", WATCHED_INTERVAL if trips is not None else FAN_INTERVAL, collect_fan),
+        ("ip", WATCHED_INTERVAL if ip_watched else IP_INTERVAL, collect_ip),
+        ("storage", IO_INTERVAL, collect_storage),
+    ]
@@ -4,7 +4,88 @@
 API_KEY = "your_openweathermap_api_key"  # Replace with your API key
 CITY = "your_city"  # Replace with your city
 COUNTRY = "your country"  # Country code for your country
-WEATHER_URL = f"http://api.openweathermap.org/data/2.5/weather?q={CITY}&appid={API_KEY}&units=metric"
+WEATHER_UPDATE_INTERVAL = 60  # Seconds between weather fetches
+# Locations the weather page rotates through (see weather.py), each with an
+# optional "ttl" in seconds. Use "id" (OpenWeatherMap city ID, see
+# https://openweathermap.org/find) where you can: all IDs are fetched together
+# in one call. "q" looks a city up by name and costs one call per location.
+WEATHER_LOCATIONS = [
+    {"name": f"{CITY.capitalize()}, {COUNTRY.upper()}", "q": CITY},
+    # {"name": "London, GB", "id": 2643743, "ttl": 600},
+]
+WEATHER_CALLS_PER_HOUR = 100  # Cap on API calls in any hour, shared by all locations
+WEATHER_TIMEOUT = 10  # Seconds before a weather request is abandoned
+WEATHER_CACHE_PATH = "./weather_cache.json"  # Last good response, shown straight away after a restart
 # Path to the icons folder
 icons_path = "./icons/"  # Relative path, assuming the icons folder is in the same directory as config.py
+ICON_PACK_PATH = "./icons/icons.pack"  # Pre-baked icons, rebuild with: python3 icons.py
 
+# Display
+DISPLAY_BACKEND = "i2c"  # "i2c" for the panel, "dummy" or "capture" to run without hardware (or set OLED_BACKEND)
+I2C_CHUNK_SIZE = 4096  # Max bytes per I2C message (see transport.py); 33 or less for SMBus-only adapters
+PAGE_PACKING = "transpose"  # Frame to page bytes: "transpose" (PIL), "numpy" or "python"; compare with benchmark.py
+RECORD_DIR = None  # Directory to record every frame shown into (see recorder.py), e.g. "./recordings", or set OLED_RECORD
+# Panels driven together by oled_multi.py. Each gets its own driver, bus and
+# address, extra luma device options, and pages as (layout, redraw seconds);
+# layouts are listed in layouts.LAYOUTS. Panels on the same bus share a worker.
+DISPLAYS = [
+    {"driver": "sh1106", "port": 1, "address": 0x3C, "options": {"rotate": 0},
+     "pages": [("overview", 1), ("performance", 1), ("storage", 5), ("history", 10)]},
+    {"driver": "ssd1306", "port": 3, "address": 0x3C, "options": {"width": 128, "height": 64},
+     "pages": [("system", 1), ("weather", 30)]},
+]
+PAGE_INTERVAL = 5  # Seconds each page stays up
+
+# Fleet mode (see fleet.py): fleet_agent.py on every Pi, oled_fleet.py on the display node
+FLEET_SERVER = "192.168.1.10"  # Address of the display node the agents send to
+FLEET_BIND = "0.0.0.0"  # Address the display node listens on
+FLEET_PORT = 9110
+FLEET_INTERVAL = 5  # Seconds between agent samples
+FLEET_STALE_AFTER = 15  # Seconds without a sample before a host shows as stale
+FLEET_DISPLAY = {"driver": "sh1106", "port": 1, "address": 0x3C, "options": {"rotate": 0}}
+
+# Startup (see startup.py): the last frame is kept on disk and painted straight away on the next start
+FRAME_CACHE_DIR = "./frames"
+FRAME_CACHE_INTERVAL = 60  # Seconds between frame cache writes, keeps SD card writes down
+WARM_UP_TIMEOUT = 10  # Seconds to wait for the collectors before drawing anyway
+
+# System stats
+# Your external drive mount point (1.3" storage screen).
+# Use 'df -h' command in terminal to find it. Example: /media/pi/MyUSB
+EXTERNAL_DRIVE_PATH = "/media/pi/MY_USB_DRIVE"  # <--- CHANGE THIS
+# Mount points on the storage screen as (label, path), probed off the render loop (see collectors.py)
+STORAGE_MOUNTS = [("OS", "/"), ("USB", EXTERNAL_DRIVE_PATH)]
+STORAGE_TIMEOUT = 2  # Seconds before a mount that does not answer is shown as hung
+CPU_SAMPLE_INTERVAL = 1.0  # Seconds per CPU usage sample, independent of the display refresh
+IP_ADDRESS_TTL = 30  # Seconds to cache the IP address
+TEMPERATURE_TTL = 2  # Seconds to cache the CPU temperature
+# Collector daemon (see stats_daemon.py): collects once for every dashboard, which read its values from shared memory
+STATS_BUS_NAME = "oled_stats"  # Shared memory block (/dev/shm/oled_stats), None to always collect in each dashboard
+STATS_BUS_INTERVAL = 0.5  # Seconds between dashboard reads of the block, a few microseconds each
+STATS_BUS_STALE_AFTER = 10  # Seconds without a publish after which dashboards collect for themselves
+
+# Adaptive refresh (see governor.py) for oled_stats.py and oled_stats2.py
+GOVERNOR_MIN_INTERVAL = 1.0  # Seconds between refreshes while values change
+GOVERNOR_MAX_INTERVAL = 10.0  # Seconds between refreshes while everything is steady
+GOVERNOR_BACKOFF = 1.5  # Interval growth per steady refresh
+GOVERNOR_STABLE_CHANGE = 1.0  # Changes below this (percent points or degrees) count as steady
+GOVERNOR_FAST_CHANGE = 5.0  # Changes of this much snap back to the minimum interval
+GOVERNOR_THRESHOLDS = {"cpu": 80, "memory": 90, "disk": 90, "temperature": 70}  # Refresh fast at or above these
+
+# Metric history (see history.py), kept in mmap'd files so it survives restarts
+HISTORY_DIR = "./history"
+HISTORY_TIERS = [(10, 8640), (300, 2016)]  # (seconds per sample, samples): 24 h at 10 s, 7 days at 5 min, ~42 KB per metric
+
+# Local Prometheus-text metrics endpoint (see metrics.py), None to disable
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Live web mirror of the panels (see mirror.py), None to disable; or set OLED_MIRROR to a port
+MIRROR_HOST = "0.0.0.0"  # Reachable from the LAN, only page deltas of what the panels show are served
+MIRROR_PORT = None  # e.g. 9109, then open http://<pi>:9109/
+
+# Rendering
+TEXT_CACHE_SIZE = 256  # Rendered text bitmaps kept in memory
+MARQUEE_SPEED = 30  # Pixels per second that text too long for its line scrolls by (see marquee.py)
+MARQUEE_STEP = 3  # Pixels per step: more means fewer, equally sized patches over the bus, but jerkier motion
+MARQUEE_GAP = 24  # Pixels between the end of scrolling text and its next repetition
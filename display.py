@@ -0,0 +1,569 @@
+# display.py
+# Diffing display layer for the ssd1306 / sh1106 OLEDs.
+# Keeps the last frame sent to each panel and only pushes the 8-row pages
+# (and the column range inside each page) that actually changed.
+#
+# create_device() also provides the headless backends: "dummy" (luma's dummy
+# device, keeps the last image) and "capture" (the real ssd1306/sh1106 driver
+# and I2C transport talking to a MockSMBus, see transport.py).
+# With several panels in one process, a TransferWorker per I2C bus sends the
+# frames so a slow or hung panel never holds up the render loop or other buses.
+#
+# Dashboards draw into FrameBuffers (preallocated images that are cleared and
+# reused, use device.canvas() instead of luma's canvas(device)), and the packed
+# pages are kept in two preallocated buffers that swap roles every frame. The
+# packers still make one short-lived copy of the frame each time (the rotated
+# image and its bytes, or numpy's packed array, 1 KB for 128x64): neither PIL
+# nor numpy can write those into existing storage.
+#
+# With RECORD_DIR (or OLED_RECORD) set, every frame a panel shows is also
+# appended to a compact recording, see recorder.py. With MIRROR_PORT (or
+# OLED_MIRROR) set, browsers can watch the panels live, see mirror.py.
+#
+# Animations (see marquee.py) change small regions many times a second with
+# patch(), which sends only that region, and can hand scrolling over to the
+# ssd1306 controller with start_scroll().
+
+import contextlib
+import os
+import threading
+
+import config
+from metrics import register_gauge, span
+
+
+def pack_pages_python(image, width, pages, out=None):
+    """Packs a 1-bit image into controller page layout pixel by pixel, one buffer per 8-row page.
+
+    The pages are written into out (a list of pages writable buffers of width
+    bytes) if given, otherwise new bytearrays are returned. Kept as the
+    reference the faster packers are checked against.
+    """
+    image_data = image.getdata()
+    result = out if out is not None else [bytearray(width) for _ in range(pages)]
+    for page in range(pages):
+        buf = result[page]
+        offsets = [(page * 8 + i) * width for i in range(8)]
+        for x in range(width):
+            val = 0
+            for i in range(8):
+                if image_data[x + offsets[i]]:
+                    val |= 1 << i
+            buf[x] = val
+    return result
+
+
+def pack_pages_transpose(image, width, pages, out=None):
+    """Packs a 1-bit image into page layout with one PIL transpose, same contract as pack_pages_python.
+
+    Rotated by 270 degrees, every column becomes a row whose packed bytes
+    are the column's page bytes, bottom page first and top row in the low bit.
+    """
+    from PIL import Image
+    data = image.transpose(Image.Transpose.ROTATE_270).tobytes()
+    result = out if out is not None else [bytearray(width) for _ in range(pages)]
+    for page in range(pages):
+        result[page][:] = data[pages - 1 - page::pages]
+    return result
+
+
+def pack_pages_numpy(image, width, pages, out=None):
+    """Packs a 1-bit image into page layout with numpy.packbits, same contract as pack_pages_python."""
+    import numpy
+    packed = numpy.packbits(numpy.asarray(image).reshape(pages, 8, width), axis=1, bitorder="little")
+    result = out if out is not None else [bytearray(width) for _ in range(pages)]
+    for page in range(pages):
+        result[page][:] = packed[page, 0].data
+    return result
+
+
+# ssd1306 continuous horizontal scroll commands; the sh1106 has none
+SCROLL_RIGHT = 0x26
+SCROLL_LEFT = 0x27
+SCROLL_STOP = 0x2E
+SCROLL_START = 0x2F
+# Frames between two scroll steps for each interval setting of SCROLL_LEFT/SCROLL_RIGHT
+SCROLL_FRAMES = {0: 5, 1: 64, 2: 128, 3: 256, 4: 3, 5: 4, 6: 25, 7: 2}
+
+
+PACKERS = {
+    "python": pack_pages_python,
+    "transpose": pack_pages_transpose,
+    "numpy": pack_pages_numpy,
+}
+
+
+def get_packer(name=None):
+    """Returns the page packer called name (default config.PAGE_PACKING); "numpy" falls back to "transpose" without numpy."""
+    name = config.PAGE_PACKING if name is None else name
+    if name == "numpy":
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("numpy is not installed, packing pages with PIL instead")
+            name = "transpose"
+    return PACKERS[name]
+
+
+def image_to_pages(image, width, pages, out=None):
+    """Packs a 1-bit image into controller page layout with the configured packer."""
+    return get_packer()(image, width, pages, out)
+
+
+def dirty_range(buf, last):
+    """Returns (start, end) of the columns where buf differs from last, or None if they are equal."""
+    if buf == last:
+        return None
+    start = 0
+    while buf[start] == last[start]:
+        start += 1
+    end = len(buf)
+    while buf[end - 1] == last[end - 1]:
+        end -= 1
+    return start, end
+
+
+class FrameBuffers:
+    """Preallocated images for one device, handed out cleared and reused instead of allocated per frame.
+
+    Two buffers are enough when frames are displayed right away. When frames
+    go through a TransferWorker, one can be on the bus and one queued while
+    the next is drawn, so use three.
+    """
+
+    def __init__(self, mode, size, count=2):
+        from PIL import Image, ImageDraw
+        self.images = [Image.new(mode, size) for _ in range(count)]
+        self._draws = {id(image): ImageDraw.Draw(image) for image in self.images}
+        self._box = (0, 0) + tuple(size)
+        self._free = list(self.images)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Returns (image, draw) for the least recently used free buffer, cleared to black."""
+        with self._cond:
+            while not self._free:
+                self._cond.wait()
+            image = self._free.pop(0)
+        # Clears the pixels in place, the image memory itself is kept
+        image.paste(0, self._box)
+        return image, self._draws[id(image)]
+
+    def release(self, image):
+        """Hands a buffer back once nothing reads it any more."""
+        with self._cond:
+            self._free.append(image)
+            self._cond.notify()
+
+
+class DiffDisplay:
+    """Wraps a luma ssd1306/sh1106 device and only sends the dirty parts of each frame.
+
+    Anything not handled here (width, height, mode, contrast(), ...) is forwarded
+    to the wrapped device, so the wrapper can be passed straight to canvas().
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self._w = device._w
+        self._pages = device._h // 8
+        if hasattr(device, "_colstart"):
+            # ssd1306: horizontal addressing with a column/page window
+            self._mode = "window"
+            self._window_cost = 6
+            self._full_cost = self._window_cost + self._w * self._pages
+        elif hasattr(device, "_page_address_offset"):
+            # sh1106: page addressing, one page per command
+            self._mode = "page"
+            self._window_cost = 3
+            self._full_cost = (self._window_cost + self._w) * self._pages
+        else:
+            # Not a page-based controller (e.g. luma's dummy device): pass through
+            self._mode = None
+            self._full_cost = 0
+        self._last = None
+        self._pack = get_packer()
+        # Packed pages of the last frame sent and of the frame being packed, swapped after every frame
+        self._page_buffers = [
+            [memoryview(buf)[page * self._w:(page + 1) * self._w] for page in range(self._pages)]
+            for buf in (bytearray(self._w * self._pages), bytearray(self._w * self._pages))
+        ]
+        self._buffers = None
+        # Lets the transport send a frame's writes as one bus transaction
+        self._batch = getattr(getattr(device, "_serial_interface", None), "batch", contextlib.nullcontext)
+        # Set by startup.show_first_frame(): keeps the last frame for the next start
+        self.frame_cache = None
+        # Set by create_device() when recording: gets the page data of every frame shown
+        self.recorder = None
+        # Set by create_device() when mirroring: gets the page data of every frame and patch shown
+        self.mirror = None
+        # (first page, last page) while the controller scrolls them by itself
+        self.scrolling = None
+        # display() may run on a transfer worker while an animation patches the panel
+        self._lock = threading.RLock()
+
+        # Transfer statistics, in bytes (commands + data)
+        self.frames = 0
+        self.patches = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.last_bytes_sent = 0
+        self.last_bytes_saved = 0
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def invalidate(self):
+        """Forgets the last frame so the next display() sends everything."""
+        self._last = None
+
+    def framebuffers(self, count=2):
+        """Returns the FrameBuffers of this panel, created with count buffers on first use."""
+        if self._buffers is None:
+            self._buffers = FrameBuffers(self.device.mode, self.device.size, count)
+        return self._buffers
+
+    @contextlib.contextmanager
+    def canvas(self):
+        """Like luma's canvas(device), but draws into a reused framebuffer instead of a new image."""
+        buffers = self.framebuffers()
+        image, draw = buffers.acquire()
+        try:
+            yield draw
+            self.display(image)
+        finally:
+            buffers.release(image)
+
+    def display(self, image):
+        """Sends only the pages and column ranges of image that differ from the last frame."""
+        with self._lock:
+            if self.scrolling is not None:
+                self.stop_scroll()
+            self._display(image)
+
+    def _display(self, image):
+        if self._mode is None:
+            # Packed anyway, so patch() works on the headless backend too
+            pages = self._page_buffers[self._page_buffers[0] is self._last]
+            self._pack(self.device.preprocess(image), self._w, self._pages, pages)
+            self.device.display(image)
+            self._last = pages
+            if self.frame_cache is not None:
+                self.frame_cache.save(image)
+            if self.recorder is not None:
+                self.recorder.record(pages[0].obj)
+            if self.mirror is not None:
+                self.mirror.publish(pages[0].obj)
+            return
+
+        assert image.mode == self.device.mode
+        assert image.size == self.device.size
+
+        with span("pack"):
+            frame = self.device.preprocess(image)
+            # Packed into whichever page buffer does not hold the last frame
+            pages = self._page_buffers[self._page_buffers[0] is self._last]
+            self._pack(frame, self._w, self._pages, pages)
+
+        # Work out the dirty column range of every page
+        windows = []
+        for page, buf in enumerate(pages):
+            if self._last is None:
+                windows.append((page, 0, self._w))
+                continue
+            dirty = dirty_range(buf, self._last[page])
+            if dirty is not None:
+                windows.append((page,) + dirty)
+
+        cost = sum(self._window_cost + end - start for _, start, end in windows)
+
+        try:
+            with span("transfer"), self._batch():
+                if self._mode == "window" and cost >= self._full_cost:
+                    # Cheaper to rewrite the whole panel in one window
+                    cost = self._full_cost
+                    self._send_window(0, self._pages - 1, 0, self._w, pages[0].obj)
+                else:
+                    for page, start, end in windows:
+                        self._send(page, start, end, pages[page][start:end])
+        except Exception:
+            # The panel is in an unknown state now, resend everything next time
+            self._last = None
+            self.errors += 1
+            raise
+
+        self._last = pages
+        self.frames += 1
+        self.last_bytes_sent = cost
+        self.last_bytes_saved = self._full_cost - cost
+        self.bytes_sent += cost
+        self.bytes_saved += self.last_bytes_saved
+        if self.frame_cache is not None:
+            self.frame_cache.save(image)
+        if self.recorder is not None:
+            self.recorder.record(pages[0].obj)
+        if self.mirror is not None:
+            self.mirror.publish(pages[0].obj)
+
+    def patch(self, first_page, start, pages, masks=None):
+        """Writes pages (equally long page byte strings, from first_page on) at column start, outside of a frame.
+
+        Only the columns that differ from what the panel shows are sent, and
+        the last frame is updated, so the next display() diffs against the
+        patched panel. Where masks (one byte per page) are given, only their
+        bits come from pages; the other rows keep what the last frame showed.
+        The patched frame is mirrored, and recorded at most every 2 seconds (see
+        FrameRecorder.record_patch). Returns False if there is no frame to
+        patch yet (nothing shown, or the panel state is unknown after an error).
+        """
+        with self._lock:
+            if self.scrolling is not None:
+                self.stop_scroll()
+            if self._last is None:
+                return False
+
+            windows = []
+            for index, data in enumerate(pages):
+                page = first_page + index
+                last = self._last[page][start:start + len(data)]
+                if masks is not None and masks[index] != 0xFF:
+                    mask = int.from_bytes(bytes((masks[index],)) * len(data), "little")
+                    merged = (int.from_bytes(last, "little") & ~mask) | (int.from_bytes(data, "little") & mask)
+                    data = merged.to_bytes(len(data), "little")
+                dirty = dirty_range(data, last)
+                if dirty is not None:
+                    last[:] = data
+                    windows.append((page, start + dirty[0], start + dirty[1]))
+            if not windows:
+                return True
+
+            if self._mode is None:
+                from recorder import pages_to_image
+                for page, first, end in windows:
+                    strip = pages_to_image(bytes(self._last[page][first:end]), end - first, 8)
+                    self.device.image.paste(strip, (first, page * 8))
+                self._patched()
+                return True
+
+            cost = sum(self._window_cost + end - first for _, first, end in windows)
+            try:
+                with span("transfer"), self._batch():
+                    for page, first, end in windows:
+                        self._send(page, first, end, self._last[page][first:end])
+            except Exception:
+                self._last = None
+                self.errors += 1
+                raise
+            self.patches += 1
+            self.last_bytes_sent = cost
+            self.bytes_sent += cost
+            self._patched()
+            return True
+
+    def _patched(self):
+        # Only once the panel shows the patch, so neither ever has a frame the panel didn't
+        if self.recorder is not None:
+            self.recorder.record_patch(self._last[0].obj)
+        if self.mirror is not None:
+            self.mirror.publish(self._last[0].obj)
+
+    def can_scroll(self):
+        """True if the controller can scroll whole pages by itself: an ssd1306 showing all 128 columns of its RAM."""
+        return self._mode == "window" and self.device._colstart == 0 and self._w == 128
+
+    def start_scroll(self, first_page, last_page, interval, left=True):
+        """Lets the controller scroll pages first_page to last_page across the panel, wrapping around.
+
+        It moves them by a column every SCROLL_FRAMES[interval] frames with
+        nothing sent over the bus. The panel RAM must not be written while it
+        scrolls, so the next display() or patch() stops it first (stop_scroll()).
+        """
+        if not self.can_scroll():
+            raise ValueError("hardware scrolling needs an ssd1306 showing all 128 columns")
+        with self._lock:
+            self.device.command(SCROLL_STOP)
+            self.device.command(SCROLL_LEFT if left else SCROLL_RIGHT, 0x00, first_page, interval, last_page, 0x00, 0xFF)
+            self.device.command(SCROLL_START)
+            self.scrolling = (first_page, last_page)
+
+    def stop_scroll(self):
+        """Stops a hardware scroll and puts the scrolled pages back the way the last frame had them."""
+        with self._lock:
+            if self.scrolling is None:
+                return
+            first_page, last_page = self.scrolling
+            self.scrolling = None
+            try:
+                self.device.command(SCROLL_STOP)
+                if self._last is not None:
+                    # The controller has moved these pages around in its RAM
+                    self._send_window(first_page, last_page, 0, self._w,
+                                      b"".join(self._last[first_page:last_page + 1]))
+            except Exception:
+                self._last = None
+                self.errors += 1
+                raise
+            cost = self._window_cost + self._w * (last_page - first_page + 1)
+            self.last_bytes_sent = cost
+            self.bytes_sent += cost
+
+    def stats(self):
+        """Returns the transfer statistics as a dict."""
+        return {
+            "frames": self.frames,
+            "patches": self.patches,
+            "errors": self.errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved,
+            "last_bytes_sent": self.last_bytes_sent,
+            "last_bytes_saved": self.last_bytes_saved,
+        }
+
+    def _send(self, page, start, end, data):
+        if self._mode == "window":
+            self._send_window(page, page, start, end, data)
+        else:
+            col = self.device._page_address_offset + start
+            self.device.command(0xB0 + page, col & 0x0F, 0x10 | (col >> 4))
+            self.device.data(data)
+
+    def _send_window(self, first_page, last_page, start, end, data):
+        const = self.device._const
+        colstart = self.device._colstart
+        self.device.command(
+            const.COLUMNADDR, colstart + start, colstart + end - 1,
+            const.PAGEADDR, first_page, last_page)
+        self.device.data(data)
+
+
+class TransferWorker(threading.Thread):
+    """Sends frames to the panels on one bus from its own thread.
+
+    Only the newest frame per panel is kept: if a panel falls behind, frames
+    it never got to are replaced instead of queueing up.
+    """
+
+    def __init__(self, name):
+        super().__init__(name=f"transfer-{name}", daemon=True)
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def submit(self, device, image, done=None):
+        """Queues image for device, replacing a frame that has not been sent yet.
+
+        done(image) is called once the frame was sent or replaced, e.g. FrameBuffers.release.
+        """
+        with self._cond:
+            replaced = self._pending.get(device)
+            self._pending[device] = (image, done)
+            self._cond.notify()
+        if replaced is not None:
+            self.dropped += 1
+            if replaced[1] is not None:
+                replaced[1](replaced[0])
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                pending, self._pending = self._pending, {}
+            for device, (image, done) in pending.items():
+                try:
+                    with span("bus_transfer"):
+                        device.display(image)
+                    self.frames += 1
+                except Exception as e:
+                    # Keep the bus alive; DiffDisplay resends the whole frame next time
+                    self.errors += 1
+                    print(f"Error sending frame on {self.name}: {e}")
+                finally:
+                    if done is not None:
+                        done(image)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_transfer_worker(port):
+    """Returns the shared TransferWorker for I2C bus port, starting it on first use."""
+    with _workers_lock:
+        worker = _workers.get(port)
+        if worker is None:
+            worker = TransferWorker(f"i2c-{port}")
+            worker.start()
+            _workers[port] = worker
+            register_gauge("bus_frames", "Frames sent by the bus transfer worker.",
+                           lambda: worker.frames, bus=port)
+            register_gauge("bus_frames_dropped", "Frames replaced by a newer one before the bus was free.",
+                           lambda: worker.dropped, bus=port)
+    return worker
+
+
+def _attach_outputs(device, name):
+    # Recording (RECORD_DIR / OLED_RECORD) and the live mirror (MIRROR_PORT / OLED_MIRROR), both optional
+    record_dir = os.environ.get("OLED_RECORD", config.RECORD_DIR)
+    if record_dir:
+        from recorder import FrameRecorder
+        device.recorder = FrameRecorder.create(record_dir, name, device)
+    mirror_port = os.environ.get("OLED_MIRROR", config.MIRROR_PORT)
+    if mirror_port:
+        from mirror import get_mirror_server
+        server = get_mirror_server(port=int(mirror_port))
+        if server is not None:
+            device.mirror = server.add_display(name, device)
+
+
+def create_device(driver, port=1, address=0x3C, backend=None, **kwargs):
+    """Creates a diffing OLED device for driver ("ssd1306" or "sh1106").
+
+    backend is "i2c" for the real panel, "capture" for the real driver and
+    transport on a MockSMBus, or "dummy" for luma's dummy device. It defaults
+    to the OLED_BACKEND environment variable, then config.DISPLAY_BACKEND.
+    """
+    if backend is None:
+        backend = os.environ.get("OLED_BACKEND", config.DISPLAY_BACKEND)
+    name = f"{port}-{address:#x}"
+
+    if backend == "dummy":
+        from luma.core.device import dummy
+        device = DiffDisplay(dummy(mode="1", **kwargs))
+        _attach_outputs(device, name)
+        return device
+
+    import luma.oled.device
+    from transport import I2CTransport, MockSMBus, read_bus_clock
+    if backend == "capture":
+        bus = MockSMBus()
+    elif backend == "i2c":
+        bus = None
+    else:
+        raise ValueError(f"Unknown display backend: {backend}")
+    serial = I2CTransport(bus, port=port, address=address, chunk_size=config.I2C_CHUNK_SIZE)
+    device = DiffDisplay(getattr(luma.oled.device, driver)(serial, **kwargs))
+    _attach_outputs(device, name)
+    register_gauge("i2c_bytes_per_second", "Achieved I2C throughput while the bus was busy.",
+                   lambda: serial.bytes_per_second, display=name)
+    register_gauge("i2c_transfers", "I2C bus transactions since startup.",
+                   lambda: serial.transfers, display=name)
+    if backend == "i2c":
+        register_gauge("i2c_bus_clock_hz", "I2C adapter clock from the device tree.",
+                       lambda: read_bus_clock(port), bus=port)
+    register_gauge("display_bytes_sent", "Bytes sent to the panel since startup.",
+                   lambda: device.bytes_sent, display=name)
+    register_gauge("display_bytes_saved", "Bytes not sent thanks to page diffing.",
+                   lambda: device.bytes_saved, display=name)
+    return device
@@ -0,0 +1,188 @@
+# fleet.py
+# Fleet mode: agents on many Pis push their stats to one display node.
+#
+# Each agent sends one small UDP datagram per interval:
+#   magic "OF", version, flags, boot nonce (uint32), sequence number (uint32),
+#   host name length, host name (UTF-8, at most 32 bytes), then CPU %,
+#   memory %, memory used GB, disk % and temperature in °C (NaN if unknown) as
+#   little-endian float32.
+# That is 33 bytes (a 13-byte header and 20 bytes of values) plus the host
+# name. The boot nonce is drawn at random when an agent starts, so the display
+# node can tell a restarted agent, whose sequence begins again at 1, from
+# reordered or duplicated datagrams; late datagrams from before a restart carry
+# an old nonce and are dropped. The display node's FleetReceiver collects them
+# on its own thread, so any number of agents never touches the render loop;
+# pages only read a snapshot of the latest sample per host.
+
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import config
+from collectors import get_cpu_usage, get_cpu_temperature, get_memory_usage, get_disk_usage
+
+MAGIC = b"OF"
+VERSION = 2
+HEADER = struct.Struct('<2sBBIIB')
+VALUES = struct.Struct('<5f')
+MAX_NAME = 32
+RETIRED_BOOTS = 8  # Superseded boot nonces remembered per host
+
+
+def encode_sample(host, boot, seq, cpu, memory, memory_used, disk, temperature):
+    """Packs one agent sample into a datagram."""
+    name = host.encode()[:MAX_NAME]
+    return (HEADER.pack(MAGIC, VERSION, 0, boot, seq & 0xFFFFFFFF, len(name)) + name +
+            VALUES.pack(cpu, memory, memory_used, disk, math.nan if temperature is None else temperature))
+
+
+def decode_sample(datagram):
+    """Returns (host, boot, seq, (cpu, memory, memory_used, disk, temperature)); raises ValueError if malformed."""
+    try:
+        magic, version, _, boot, seq, length = HEADER.unpack_from(datagram, 0)
+        if magic != MAGIC or version != VERSION or length > MAX_NAME:
+            raise ValueError("not a fleet datagram")
+        host = datagram[HEADER.size:HEADER.size + length].decode()
+        values = VALUES.unpack_from(datagram, HEADER.size + length)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"malformed fleet datagram: {e}") from e
+    cpu, memory, memory_used, disk, temperature = values
+    return host, boot, seq, (cpu, memory, memory_used, disk, None if math.isnan(temperature) else temperature)
+
+
+def collect_sample():
+    """Returns this host's (cpu, memory, memory_used, disk, temperature) from the shared collectors."""
+    memory, memory_used, _ = get_memory_usage()
+    disk = get_disk_usage()[0]
+    return get_cpu_usage(), memory, memory_used, disk, get_cpu_temperature()
+
+
+class FleetSender:
+    """Sends this host's samples to the display node."""
+
+    def __init__(self, server, port, host=None):
+        self.address = (server, port)
+        self.host = host or socket.gethostname()
+        self.boot = random.getrandbits(32)
+        self.seq = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, sample):
+        self.seq += 1
+        try:
+            self.sock.sendto(encode_sample(self.host, self.boot, self.seq, *sample), self.address)
+        except OSError as e:
+            # Network down or display node unreachable; the next interval tries again
+            print(f"Fleet send failed: {e}")
+
+    def close(self):
+        self.sock.close()
+
+
+class HostState:
+    """Latest sample of one agent, plus receive bookkeeping."""
+
+    __slots__ = ("host", "address", "values", "boot", "seq", "received_at", "samples", "lost", "restarts",
+                 "retired")
+
+    def __init__(self, host, address, values, boot, seq, received_at):
+        self.host = host
+        self.address = address
+        self.values = values
+        self.boot = boot
+        self.seq = seq
+        self.received_at = received_at
+        self.samples = 1
+        self.lost = 0
+        self.restarts = 0
+        self.retired = deque(maxlen=RETIRED_BOOTS)  # Boot nonces of earlier runs, newest last
+
+
+class FleetReceiver(threading.Thread):
+    """Collects agent datagrams in the background; readers only ever take snapshots."""
+
+    def __init__(self, bind="0.0.0.0", port=0, stale_after=15.0, clock=time.monotonic):
+        super().__init__(name="fleet-receiver", daemon=True)
+        self.stale_after = stale_after
+        self.clock = clock
+        self.hosts = {}
+        self.received = 0
+        self.rejected = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((bind, port))
+        self.sock.settimeout(1.0)
+        self.address = self.sock.getsockname()
+        self._stopped = False
+
+    def handle(self, datagram, address):
+        """Records one datagram; safe to call directly in tests."""
+        try:
+            host, boot, seq, values = decode_sample(datagram)
+        except ValueError:
+            self.rejected += 1
+            return
+        self.received += 1
+        now = self.clock()
+        state = self.hosts.get(host)
+        if state is None:
+            self.hosts[host] = HostState(host, address[0], values, boot, seq, now)
+            return
+        if boot != state.boot:
+            if boot in state.retired:
+                return  # Sent before a restart and delivered late
+            # The agent restarted and its sequence began again
+            state.restarts += 1
+            state.retired.append(state.boot)
+            state.boot = boot
+            state.seq = seq - 1
+        if seq <= state.seq:
+            return  # Duplicate or reordered, we already have something newer
+        state.lost += seq - state.seq - 1
+        state.samples += 1
+        state.seq = seq
+        state.values = values
+        state.address = address[0]
+        state.received_at = now
+
+    def run(self):
+        while not self._stopped:
+            try:
+                datagram, address = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stopped:
+                    return
+                continue
+            self.handle(datagram, address)
+
+    def snapshot(self):
+        """Returns [(host, values, age_seconds, stale)] for every known host, sorted by name."""
+        now = self.clock()
+        hosts = []
+        for state in sorted(self.hosts.copy().values(), key=lambda state: state.host):
+            age = now - state.received_at
+            hosts.append((state.host, state.values, age, age > self.stale_after))
+        return hosts
+
+    def stop(self):
+        self._stopped = True
+        self.sock.close()
+
+
+_fleet_receiver = None
+_fleet_receiver_lock = threading.Lock()
+
+
+def get_fleet_receiver():
+    """Returns the shared FleetReceiver on config.FLEET_BIND:config.FLEET_PORT, starting it on first use."""
+    global _fleet_receiver
+    with _fleet_receiver_lock:
+        if _fleet_receiver is None:
+            _fleet_receiver = FleetReceiver(config.FLEET_BIND, config.FLEET_PORT, config.FLEET_STALE_AFTER)
+            _fleet_receiver.start()
+    return _fleet_receiver
@@ -0,0 +1,22 @@
+#fleet_agent.py
+# Runs on every Pi in the fleet: sends this host's CPU, memory, disk and
+# temperature to the display node (config.FLEET_SERVER) every
+# config.FLEET_INTERVAL seconds. Needs no display.
+
+import time
+import config
+from fleet import FleetSender, collect_sample
+
+
+def main():
+    sender = FleetSender(config.FLEET_SERVER, config.FLEET_PORT)
+    while True:
+        sender.send(collect_sample())
+        time.sleep(config.FLEET_INTERVAL)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,96 @@
+# fonts.py
+# Font registry and text-raster cache.
+# Every font is loaded once, and rendered 1-bit text bitmaps and bounding
+# boxes are kept in an LRU cache so static labels and repeated values are
+# pasted instead of being rasterized again on every frame.
+
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+import config
+from metrics import register_gauge
+
+_fonts = {}
+
+
+def get_font(path=None, size=None):
+    """Returns the font at path/size, loading it only once. No path gives PIL's default font."""
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = ImageFont.load_default() if path is None else ImageFont.truetype(path, size)
+        _fonts[key] = font
+    return font
+
+
+def font_key(font):
+    """Returns a hashable (font, size) key for a PIL font."""
+    if hasattr(font, "path"):
+        return (font.path, font.size)
+    # Bitmap fonts have no path; registry fonts live forever so their id is stable
+    return (id(font), None)
+
+
+class TextCache:
+    """LRU cache of rendered 1-bit text bitmaps and their bounding boxes, keyed by (font, size, text)."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, text, font):
+        """Returns (bitmap, offset, bbox) for text, rendering it on a miss.
+
+        bitmap is the cropped ink (None for blank text) and offset is where it
+        sits relative to the draw position.
+        """
+        key = font_key(font) + (text,)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        bbox = font.getbbox(text, mode='1')
+        left, top, right, bottom = bbox
+        # Glyphs can spill past the layout box, so render with a margin and crop to the ink
+        pad = getattr(font, "size", 16)
+        canvas = Image.new('1', (right - left + 2 * pad, bottom - top + 2 * pad), 0)
+        ImageDraw.Draw(canvas).text((pad - left, pad - top), text, font=font, fill=255)
+        ink = canvas.getbbox()
+        if ink is None:
+            entry = (None, (0, 0), bbox)
+        else:
+            entry = (canvas.crop(ink), (ink[0] - pad + left, ink[1] - pad + top), bbox)
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        """Returns the hit/miss counters as a dict."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "fonts": len(_fonts)}
+
+
+text_cache = TextCache(config.TEXT_CACHE_SIZE)
+register_gauge("text_cache_hits", "Text bitmaps pasted from the cache.", lambda: text_cache.hits)
+register_gauge("text_cache_misses", "Text bitmaps rasterized on a cache miss.", lambda: text_cache.misses)
+
+
+def text_bbox(text, font):
+    """Cached equivalent of draw.textbbox((0, 0), text, font=font)."""
+    return text_cache.get(text, font)[2]
+
+
+def draw_text(draw, xy, text, font=None, fill="white"):
+    """Cached equivalent of draw.text(xy, text, font=font, fill=fill) for single-line text."""
+    if font is None:
+        font = get_font()
+    bitmap, (dx, dy), _ = text_cache.get(text, font)
+    if bitmap is not None:
+        draw.bitmap((xy[0] + dx, xy[1] + dy), bitmap, fill=fill)
@@ -0,0 +1,58 @@
+# governor.py
+# Adaptive refresh governor.
+# Instead of refreshing every second no matter what, a dashboard asks the
+# governor how long to wait after each frame. While the shown metrics hold
+# steady the interval backs off towards config.GOVERNOR_MAX_INTERVAL; a fast
+# change or a value past its threshold snaps it back to
+# config.GOVERNOR_MIN_INTERVAL. The CPU sampler follows the same interval, so
+# an idle Pi at night costs a fraction of the CPU and bus time.
+
+import time
+
+import config
+from collectors import get_cpu_sampler
+from metrics import register_gauge
+
+
+class RefreshGovernor:
+    """Picks the next refresh interval from how fast the shown metrics change."""
+
+    def __init__(self, name, min_interval=None, max_interval=None, clock=time.monotonic, cpu_clock=time.process_time):
+        self.min_interval = config.GOVERNOR_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_interval = config.GOVERNOR_MAX_INTERVAL if max_interval is None else max_interval
+        self.interval = self.min_interval
+        self.cpu_percent = 0.0
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self._last = {}
+        self._usage = (clock(), cpu_clock())
+        register_gauge("governor_interval_seconds", "Current refresh interval chosen by the governor.",
+                       lambda: self.interval, display=name)
+        register_gauge("process_cpu_percent", "CPU used by this dashboard over the last refresh interval.",
+                       lambda: self.cpu_percent, display=name)
+
+    def update(self, **metrics):
+        """Takes the latest metrics (None values are ignored) and returns the seconds to wait."""
+        metrics = {name: value for name, value in metrics.items() if value is not None}
+        delta = max((abs(value - self._last[name]) for name, value in metrics.items() if name in self._last),
+                    default=None)
+        alert = any(value >= config.GOVERNOR_THRESHOLDS.get(name, float("inf"))
+                    for name, value in metrics.items())
+        self._last = metrics
+
+        if alert or delta is None or delta >= config.GOVERNOR_FAST_CHANGE:
+            self.interval = self.min_interval
+        elif delta < config.GOVERNOR_STABLE_CHANGE:
+            self.interval = min(self.interval * config.GOVERNOR_BACKOFF, self.max_interval)
+        # Only where this process samples the CPU itself, not while it reads the collector daemon's values
+        sampler = get_cpu_sampler(start=False)
+        if sampler is not None:
+            sampler.set_interval(self.interval)
+
+        # Our own CPU use since the last update, all threads included
+        now, cpu = self.clock(), self.cpu_clock()
+        elapsed = now - self._usage[0]
+        if elapsed > 0:
+            self.cpu_percent = round(100.0 * (cpu - self._usage[1]) / elapsed, 2)
+        self._usage = (now, cpu)
+        return self.interval
@@ -0,0 +1,206 @@
+# history.py
+# Fixed-size metric history backed by an mmap'd file, plus a sparkline widget.
+#
+# Each metric keeps one ring buffer of float32 bucket averages per tier, e.g.
+# the default config.HISTORY_TIERS of (10 s x 8640) + (300 s x 2016) keeps
+# 24 h at 10 s and 7 days at 5 min. Memory is fixed at 4 bytes per slot plus a
+# small header: 8640 * 4 + 2016 * 4 + 84 = 42708 bytes (~42 KB) per metric,
+# and the same on disk. Because the buffers live in a file mapping, history
+# survives service restarts; gaps while the service was down read as NaN.
+#
+# Several processes may share the files: every dashboard that collects for
+# itself records into them, and any of them can draw the graphs. Each record
+# and read holds an flock on the file (exclusive to record, shared to read),
+# so two processes never interleave the read-modify-write of a tier header
+# and a reader never sees a bucket half written. Their samples simply share
+# the buckets. With the collector daemon running, only the daemon records.
+
+import fcntl
+import math
+import mmap
+import os
+import struct
+
+import config
+
+MAGIC = b"OLEDHIS1"
+HEADER = struct.Struct('<8sI')
+# resolution, slots, head (next slot to write), current bucket, bucket sum, bucket count
+TIER = struct.Struct('<dIIqdI')
+
+
+class MetricHistory:
+    """Multi-tier ring buffer of bucket averages for one metric, stored in an mmap'd file."""
+
+    def __init__(self, path, tiers):
+        self.path = path
+        self.tiers = [(float(resolution), int(slots)) for resolution, slots in tiers]
+        self._data_offset = HEADER.size + TIER.size * len(self.tiers)
+        self.size = self._data_offset + 4 * sum(slots for _, slots in self.tiers)
+
+        # Kept open for the locks; another process may be creating the same file right now
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._create()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _create(self):
+        fresh = not self._matches_layout()
+        if fresh:
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, self.size)
+        self._mm = mmap.mmap(self._fd, self.size)
+
+        # One float32 view per tier straight onto the mapping, no copies
+        self._buffers = []
+        offset = self._data_offset
+        for _, slots in self.tiers:
+            self._buffers.append(memoryview(self._mm)[offset:offset + 4 * slots].cast('f'))
+            offset += 4 * slots
+
+        if fresh:
+            HEADER.pack_into(self._mm, 0, MAGIC, len(self.tiers))
+            for index, (resolution, slots) in enumerate(self.tiers):
+                self._write_tier(index, 0, -1, 0.0, 0)
+                buf = self._buffers[index]
+                for slot in range(slots):
+                    buf[slot] = math.nan
+
+    def _matches_layout(self):
+        """Returns True if the file on disk was written with the same tiers."""
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(self._data_offset)
+            if os.path.getsize(self.path) != self.size:
+                return False
+        except OSError:
+            return False
+        magic, count = HEADER.unpack_from(header, 0)
+        if magic != MAGIC or count != len(self.tiers):
+            return False
+        for index, (resolution, slots) in enumerate(self.tiers):
+            stored = TIER.unpack_from(header, HEADER.size + TIER.size * index)
+            if stored[0] != resolution or stored[1] != slots:
+                return False
+        return True
+
+    def _read_tier(self, index):
+        _, _, head, bucket, total, count = TIER.unpack_from(self._mm, HEADER.size + TIER.size * index)
+        return head, bucket, total, count
+
+    def _write_tier(self, index, head, bucket, total, count):
+        resolution, slots = self.tiers[index]
+        TIER.pack_into(self._mm, HEADER.size + TIER.size * index,
+                       resolution, slots, head, bucket, total, count)
+
+    def record(self, value, now):
+        """Adds a sample taken at wall-clock time now (seconds) to every tier."""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._record(value, now)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _record(self, value, now):
+        for index, (resolution, slots) in enumerate(self.tiers):
+            head, bucket, total, count = self._read_tier(index)
+            current = int(now // resolution)
+            if current != bucket:
+                buf = self._buffers[index]
+                if bucket >= 0 and current > bucket:
+                    # Close the finished bucket, then mark any skipped buckets as gaps
+                    buf[head] = total / count if count else math.nan
+                    head = (head + 1) % slots
+                    for _ in range(min(current - bucket - 1, slots)):
+                        buf[head] = math.nan
+                        head = (head + 1) % slots
+                bucket, total, count = current, 0.0, 0
+            self._write_tier(index, head, bucket, total + value, count + 1)
+
+    def values(self, count=None, tier=0):
+        """Returns up to count completed bucket averages of a tier, oldest first (NaN for gaps)."""
+        _, slots = self.tiers[tier]
+        count = slots if count is None else min(count, slots)
+        buf = self._buffers[tier]
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            head = self._read_tier(tier)[0]
+            start = (head - count) % slots
+            if start + count <= slots:
+                return buf[start:start + count].tolist()
+            return buf[start:].tolist() + buf[:head].tolist()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        for buf in self._buffers:
+            buf.release()
+        self._buffers = []
+        self._mm.close()
+        os.close(self._fd)
+
+
+_histories = {}
+
+
+def get_history(name):
+    """Returns the shared history for a metric, creating its file under config.HISTORY_DIR."""
+    history = _histories.get(name)
+    if history is None:
+        os.makedirs(config.HISTORY_DIR, exist_ok=True)
+        history = MetricHistory(os.path.join(config.HISTORY_DIR, f"{name}.ring"), config.HISTORY_TIERS)
+        _histories[name] = history
+    return history
+
+
+def sparkline_segments(box, values, low=None, high=None):
+    """Returns the pixel points of a sparkline inside box (x0, y0, x1, y1), one list per unbroken run.
+
+    Only the newest x1 - x0 + 1 values are used; NaN gaps break the line.
+    Without low/high the graph is scaled to the visible values.
+    """
+    x0, y0, x1, y1 = box
+    values = values[-(x1 - x0 + 1):]
+    present = [v for v in values if not math.isnan(v)]
+    if not present:
+        return []
+    low = min(present) if low is None else low
+    high = max(present) if high is None else high
+    span = (high - low) or 1.0
+    scale = (y1 - y0) / span
+
+    # Right-align so the newest value is always at the right edge
+    x = x1 - len(values) + 1
+    segments = []
+    segment = []
+    for value in values:
+        if math.isnan(value):
+            if segment:
+                segments.append(tuple(segment))
+            segment = []
+        else:
+            clamped = min(max(value, low), high)
+            segment.append((x, round(y1 - (clamped - low) * scale)))
+        x += 1
+    if segment:
+        segments.append(tuple(segment))
+    return segments
+
+
+def draw_sparkline(draw, box, values, low=None, high=None, fill="white"):
+    """Draws values as a line graph inside box (x0, y0, x1, y1), one value per pixel column."""
+    draw_segments(draw, sparkline_segments(box, values, low, high), fill)
+
+
+def draw_segments(draw, segments, fill="white"):
+    """Draws the segments returned by sparkline_segments()."""
+    for segment in segments:
+        if len(segment) > 1:
+            draw.line(segment, fill=fill)
+        else:
+            draw.point(segment, fill=fill)
@@ -0,0 +1,148 @@
+# icons.py
+# Pre-baked weather icon pack.
+# 'python3 icons.py' converts icons/*.bmp into a single pack of 1-bit bitmaps
+# at every target size. The dashboards load the pack once, so an icon lookup
+# is a dict lookup plus one paste.
+#
+# Pack layout: b"OLEDICN1", uint16 entry count, then for every entry
+# uint8 name length, name, uint8 size and size x size packed 1-bit rows.
+
+import glob
+import os
+import struct
+
+from PIL import Image
+
+import config
+
+PACK_MAGIC = b"OLEDICN1"
+ICON_SIZES = (32, 16)
+
+# Icon mapping for weather
+icon_mapping = {
+    "clear sky": "01",
+    "few clouds": "02",
+    "scattered clouds": "03",
+    "broken clouds": "04",
+    "shower rain": "09",
+    "rain": "10",
+    "thunderstorm": "11",
+    "snow": "13",
+    "mist": "50"
+}
+
+# Descriptions not in icon_mapping fall back to the icon of their OpenWeatherMap
+# condition group, matched by keyword in this order
+condition_keywords = [
+    ("thunderstorm", "11"),
+    ("snow", "13"),
+    ("sleet", "13"),
+    ("drizzle", "09"),
+    ("shower", "09"),
+    ("rain", "10"),
+    ("mist", "50"),
+    ("smoke", "50"),
+    ("haze", "50"),
+    ("fog", "50"),
+    ("sand", "50"),
+    ("dust", "50"),
+    ("ash", "50"),
+    ("squall", "50"),
+    ("tornado", "50"),
+    ("overcast", "04"),
+    ("broken", "04"),
+    ("scattered", "03"),
+    ("few", "02"),
+    ("cloud", "03"),
+    ("clear", "01"),
+]
+
+
+def icon_code(description):
+    """Returns the icon name for a weather description, using the nearest condition group if unmapped."""
+    description = description.lower()
+    code = icon_mapping.get(description)
+    if code is not None:
+        return code
+    for keyword, code in condition_keywords:
+        if keyword in description:
+            return code
+    return "unknown"
+
+
+def bake_icon(path, size):
+    """Downsamples a BMP icon to a size x size 1-bit image."""
+    with Image.open(path) as source:
+        resized = source.convert('L').resize((size, size), Image.Resampling.LANCZOS)
+    return resized.point(lambda value: 255 if value >= 128 else 0, mode='1')
+
+
+def bake_icons(icons_dir, sizes=ICON_SIZES):
+    """Returns {(name, size): image} for every BMP in icons_dir."""
+    icons = {}
+    for path in sorted(glob.glob(os.path.join(icons_dir, "*.bmp"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        for size in sizes:
+            icons[(name, size)] = bake_icon(path, size)
+    return icons
+
+
+def write_pack(icons, pack_path):
+    """Writes baked icons to a pack file."""
+    with open(pack_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(struct.pack('<H', len(icons)))
+        for (name, size), image in sorted(icons.items()):
+            encoded = name.encode()
+            f.write(struct.pack('<B', len(encoded)) + encoded + struct.pack('<B', size))
+            f.write(image.tobytes())
+
+
+def read_pack(pack_path):
+    """Reads a pack file back into {(name, size): image}."""
+    with open(pack_path, 'rb') as f:
+        blob = f.read()
+    if blob[:len(PACK_MAGIC)] != PACK_MAGIC:
+        raise ValueError(f"Not an icon pack: {pack_path}")
+    offset = len(PACK_MAGIC)
+    count, = struct.unpack_from('<H', blob, offset)
+    offset += 2
+    icons = {}
+    for _ in range(count):
+        name_len = blob[offset]
+        name = blob[offset + 1:offset + 1 + name_len].decode()
+        size = blob[offset + 1 + name_len]
+        offset += 2 + name_len
+        length = (size + 7) // 8 * size
+        icons[(name, size)] = Image.frombytes('1', (size, size), blob[offset:offset + length])
+        offset += length
+    return icons
+
+
+_icons = None
+
+
+def load_icons():
+    """Loads the icon pack once, baking it from the BMPs in memory if the pack is missing."""
+    global _icons
+    if _icons is None:
+        try:
+            _icons = read_pack(config.ICON_PACK_PATH)
+        except (OSError, ValueError):
+            _icons = bake_icons(config.icons_path)
+    return _icons
+
+
+def get_icon(description, size=32):
+    """Returns the pre-baked 1-bit icon for a weather description."""
+    icons = load_icons()
+    icon = icons.get((icon_code(description), size))
+    if icon is None:
+        icon = icons[("unknown", size)]
+    return icon
+
+
+if __name__ == "__main__":
+    baked = bake_icons(config.icons_path)
+    write_pack(baked, config.ICON_PACK_PATH)
+    print(f"Wrote {len(baked)} icons to {config.ICON_PACK_PATH}")
@@ -35,6 +35,9 @@ mkdir -p "$PROJECT_DIR"
 # Copy all project files to the project directory
 cp -r * "$PROJECT_DIR/"
 
+# Pre-bake the weather icons into a single pack
+(cd "$PROJECT_DIR" && python3 icons.py)
+
 # Set permissions and make the main script executable
 chmod +x "$PROJECT_DIR/oled_stats3.py"
 
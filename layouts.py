@@ -0,0 +1,403 @@
+# layouts.py
+# Screen layouts shared by the dashboards.
+# Every layout draws one screen from the values in a stats dict (filled in by
+# collectors.collector_tasks) onto any 1-bit ImageDraw, sized from the image it
+# draws on, so one process can render the same screens for several panels.
+#
+# A layout is split in two: values(stats) formats exactly what the screen will
+# show (text at its displayed precision, bar widths, sparkline pixels) and
+# paint(draw, values) draws only from that. The formatted values double as a
+# render key: when they match the last frame, RenderMemo skips both drawing
+# and the transfer.
+#
+# Lines that may not fit their panel (IP addresses, weather descriptions,
+# host names) are also listed by marquees(values, size) as (text, box, font):
+# dashboards scroll the ones that overflow with a marquee.Marquees.
+
+import math
+from datetime import datetime
+
+import config
+from fonts import get_font, draw_text, text_bbox
+from history import get_history, sparkline_segments, draw_segments
+from icons import get_icon
+from metrics import register_gauge
+
+# Fonts as get_font() arguments; they come from the shared registry, so every
+# panel uses the same instances, and load on first paint instead of at import
+DEFAULT_FONT = (None, None)  # Small default font
+IP_FONT = ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 12)  # Larger font for IP
+TITLE_FONT = ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 11)  # 1.3" titles
+SMALL_FONT = ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 9)
+
+
+class Layout:
+    """A screen: values(stats) formats what it shows, paint(draw, values) draws exactly that."""
+
+    def __init__(self, name, values, paint, marquees=None):
+        self.name = name
+        self.values = values
+        self.paint = paint
+        self.marquees = marquees or no_marquees
+
+    def draw(self, draw, stats):
+        self.paint(draw, self.values(stats))
+
+
+def no_marquees(values, size):
+    return ()
+
+
+class RenderMemo:
+    """Remembers the render key of the last frame drawn for one display."""
+
+    def __init__(self, name):
+        self.name = name
+        self.drawn = 0
+        self.skipped = 0
+        self._key = None
+        register_gauge("render_drawn", "Frames drawn and sent.", lambda: self.drawn, display=name)
+        register_gauge("render_skipped", "Frames skipped because the shown values were unchanged.",
+                       lambda: self.skipped, display=name)
+
+    def changed(self, key):
+        """Returns True (and remembers key) if the frame for key needs drawing."""
+        if key == self._key:
+            self.skipped += 1
+            return False
+        self._key = key
+        self.drawn += 1
+        return True
+
+    def invalidate(self):
+        """Forces the next frame to be drawn."""
+        self._key = None
+
+
+# --- 0.96" ssd1306 screens ---
+
+def system_info_values(stats):
+    memory_usage_percent, memory_used, memory_total = stats["memory"]
+    disk_usage_percent, disk_used, disk_total = stats["disk"]
+    return (
+        f"IP: {stats['ip_address']}",
+        f"CPU: {stats['cpu_usage']}%  Temp: {stats['temperature']}",
+        f"RAM: {memory_used:.2f}/{memory_total:.2f}GB ({memory_usage_percent}%)",
+        f"Disk: {disk_used:.2f}/{disk_total:.2f}GB ({disk_usage_percent}%)",
+    )
+
+
+def paint_system_info(draw, values):
+    """IP, CPU and temperature, RAM and disk usage."""
+    ip_line, cpu_line, ram_line, disk_line = values
+    default_font = get_font(*DEFAULT_FONT)
+
+    # Draw IP address with larger font
+    draw_text(draw, (0, 0), ip_line, font=get_font(*IP_FONT), fill="yellow")
+
+    # Combine CPU and Temperature on one line
+    draw_text(draw, (0, 15), cpu_line, font=default_font, fill="blue")
+
+    # Memory Usage in GB with percentage
+    draw_text(draw, (0, 30), ram_line, font=default_font, fill="blue")
+
+    # Disk Usage in GB with percentage
+    draw_text(draw, (0, 45), disk_line, font=default_font, fill="blue")
+
+
+def system_info_marquees(values, size):
+    # A long IP address scrolls instead of running off the panel
+    return ((values[0], (0, 0, size[0], 15), get_font(*IP_FONT)),)
+
+
+def weather_values(stats):
+    # Latest weather for the location being shown, blank until the first fetch lands
+    description, temperature, humidity = stats.get("weather") or ("", 0, 0)
+    now = datetime.now()
+    return (
+        stats.get("weather_location") or f"{config.CITY.capitalize()}, {config.COUNTRY.upper()}",
+        now.strftime("%d %b %Y"),
+        description,
+        f"Temp: {math.ceil(temperature)}°C",
+        f"({math.ceil(temperature - 5)}°C)",  # Example calculation for low temperature
+        f"Humid: {humidity}%",
+        now.strftime("%I:%M %p"),  # 12-hour format with AM/PM
+    )
+
+
+# The weather description below the icon, from this far left of the right edge
+WEATHER_DESCRIPTION_X = 55
+WEATHER_DESCRIPTION_Y = 39
+
+
+def description_lines(description):
+    """Splits a weather description after the first word, or keeps it on one line if either part is too wide."""
+    font = get_font(*DEFAULT_FONT)
+    line1, _, line2 = description.partition(" ")
+    if max(text_bbox(line1, font)[2], text_bbox(line2, font)[2]) > WEATHER_DESCRIPTION_X:
+        return description, ""
+    return line1, line2
+
+
+def weather_marquees(values, size):
+    description = values[2]
+    if description_lines(description)[1]:
+        return ()
+    box = (size[0] - WEATHER_DESCRIPTION_X, WEATHER_DESCRIPTION_Y, size[0], WEATHER_DESCRIPTION_Y + 12)
+    return ((description, box, get_font(*DEFAULT_FONT)),)
+
+
+def paint_weather(draw, values):
+    """City, date and time, weather icon and description, temperature and humidity."""
+    city_name, current_date, description, temperature_text, low_temp_text, humidity_text, current_time = values
+    width, height = draw.im.size
+    default_font = get_font(*DEFAULT_FONT)
+
+    # City name at the top-left corner, current date at the top-right corner
+    draw_text(draw, (0, 0), city_name, font=default_font, fill=255)
+    date_bbox = text_bbox(current_date, default_font)
+    draw_text(draw, (width - (date_bbox[2] - date_bbox[0]), 0), current_date, font=default_font, fill=255)
+
+    # Icon on the right (pre-baked 32x32, loaded once); clear its box first so it
+    # covers whatever is underneath exactly like Image.paste()
+    icon = get_icon(description)
+    icon_x = width - 45
+    icon_y = 10
+    draw.rectangle((icon_x, icon_y, icon_x + icon.width - 1, icon_y + icon.height - 1), fill=0)
+    draw.bitmap((icon_x, icon_y), icon, fill=255)
+
+    # Weather description below the icon (2 lines if 2 words, else one that scrolls)
+    line1, line2 = description_lines(description)
+    description_x = width - WEATHER_DESCRIPTION_X
+    draw_text(draw, (description_x, WEATHER_DESCRIPTION_Y), line1, font=default_font, fill=255)
+    if line2:
+        draw_text(draw, (description_x, WEATHER_DESCRIPTION_Y + 15), line2, font=default_font, fill=255)
+
+    # Temperature (and low temperature beside it) and humidity on the left side
+    temp_text_bbox = text_bbox(temperature_text, default_font)
+    draw_text(draw, (0, 20), temperature_text, font=default_font, fill=255)
+    draw_text(draw, (temp_text_bbox[2] - temp_text_bbox[0], 20), low_temp_text, font=default_font, fill=255)
+    draw_text(draw, (0, 35), humidity_text, font=default_font, fill=255)
+
+    # Current time at the bottom-left corner
+    time_bbox = text_bbox(current_time, default_font)
+    draw_text(draw, (0, height - time_bbox[3]), current_time, font=default_font, fill=255)
+
+
+# --- 1.3" sh1106 screens ---
+
+def draw_bar(draw, x, y, width, height, percentage, label):
+    """Draws a horizontal progress bar with a label."""
+    # Draw border
+    draw.rectangle((x, y, x + width, y + height), outline="white", fill="black")
+    # Draw filled part
+    fill_width = int((percentage / 100.0) * (width - 2))
+    draw.rectangle((x + 1, y + 1, x + 1 + fill_width, y + height - 1), outline="white", fill="white")
+    # Draw label
+    draw_text(draw, (x + width + 5, y), label, font=get_font(*SMALL_FONT), fill="white")
+
+
+def draw_title(draw, title):
+    draw_text(draw, (0, 0), title, font=get_font(*TITLE_FONT), fill="white")
+    draw.line((0, 13, draw.im.size[0], 13), fill="white")
+
+
+def overview_values(stats):
+    return (
+        f"[i] IP: {stats['ip_address']}",
+        f"[C] CPU: {stats['cpu_temp']}",
+        stats["cpu_usage"], f"{stats['cpu_usage']}%",
+        stats["ram_usage"], f"{stats['ram_usage']}%",
+    )
+
+
+def paint_overview(draw, values):
+    """Overview (IP, CPU, RAM)"""
+    ip_line, cpu_line, cpu_usage, cpu_label, ram_usage, ram_label = values
+    draw_title(draw, "SYSTEM OVERVIEW")
+    font_small = get_font(*SMALL_FONT)
+
+    # IP Address
+    draw_text(draw, (0, 18), ip_line, font=font_small, fill="white")
+
+    # CPU Info
+    draw_text(draw, (0, 32), cpu_line, font=font_small, fill="white")
+    draw_bar(draw, 45, 33, 40, 8, cpu_usage, cpu_label)
+
+    # RAM Info
+    draw_text(draw, (0, 46), "[R] RAM:", font=font_small, fill="white")
+    draw_bar(draw, 45, 47, 40, 8, ram_usage, ram_label)
+
+
+def overview_marquees(values, size):
+    return ((values[0], (0, 18, size[0], 30), get_font(*SMALL_FONT)),)
+
+
+def performance_values(stats):
+    return (
+        f"CPU Temp: {stats['cpu_temp']}",
+        f"CPU Speed: {stats['cpu_speed']}",
+        f"Fan Speed: {stats['fan_speed']}",
+        f"RAM Free: {stats['ram_remaining']}",
+    )
+
+
+def paint_performance(draw, values):
+    """Detailed Performance"""
+    draw_title(draw, "PERFORMANCE")
+    font_small = get_font(*SMALL_FONT)
+    for y, line in zip((18, 30, 42, 54), values):
+        draw_text(draw, (0, y), line, font=font_small, fill="white")
+
+
+# Mounts shown on the storage screen, above the throughput lines
+STORAGE_ROWS = 3
+MOUNT_STATES = {"missing": "N/A", "hung": "hung", "pending": "..."}
+
+
+def format_rate(rate):
+    """Bytes/sec as a short string: 850B, 1.2K, 45K, 3.4M."""
+    for unit in "BKM":
+        if rate < 999.5:
+            return f"{rate:.1f}{unit}" if unit != "B" and rate < 9.95 else f"{rate:.0f}{unit}"
+        rate /= 1024
+    return f"{rate:.1f}G"
+
+
+def storage_values(stats):
+    # Cached by the storage monitor; a hung mount keeps its last usage and says so
+    rows = []
+    for label, usage, state in stats["mounts"][:STORAGE_ROWS]:
+        percent = usage.percent if usage is not None else 0
+        if state == "ok":
+            free = f"{usage.free / (1024 * 1024 * 1024):.1f}G"
+        else:
+            free = MOUNT_STATES[state]
+        rows.append((label, percent, free))
+    read, write = stats["disk_io"]
+    received, transmitted = stats["net_io"]
+    return (
+        tuple(rows),
+        f"Disk R {format_rate(read)}  W {format_rate(write)}",
+        f"Net  R {format_rate(received)}  T {format_rate(transmitted)}",
+    )
+
+
+def paint_storage(draw, values):
+    """Storage Details: usage and free space of every mount, disk and network throughput per second"""
+    rows, disk_line, net_line = values
+    draw_title(draw, "STORAGE")
+    font_small = get_font(*SMALL_FONT)
+
+    for index, (label, percent, free) in enumerate(rows):
+        y = 16 + index * 9
+        draw_text(draw, (0, y), label, font=font_small, fill="white")
+        draw_bar(draw, 26, y + 1, 56, 6, percent, free)
+
+    draw_text(draw, (0, 44), disk_line, font=font_small, fill="white")
+    draw_text(draw, (0, 54), net_line, font=font_small, fill="white")
+
+
+# Sparkline boxes of the history screen on a 128 pixel wide panel
+CPU_GRAPH = (45, 16, 127, 37)
+TEMPERATURE_GRAPH = (45, 42, 127, 63)
+
+
+def history_values(stats):
+    # Quantized to pixels: the key only changes when a point of the graph moves
+    count = CPU_GRAPH[2] - CPU_GRAPH[0] + 1
+    return (
+        f"CPU {stats['cpu_usage']:.0f}%",
+        tuple(sparkline_segments(CPU_GRAPH, get_history("cpu").values(count), low=0, high=100)),
+        stats["cpu_temp"],
+        tuple(sparkline_segments(TEMPERATURE_GRAPH, get_history("temperature").values(count))),
+    )
+
+
+def paint_history(draw, values):
+    """CPU and temperature history (newest on the right, 10 s per pixel)"""
+    cpu_line, cpu_graph, temp_line, temp_graph = values
+    draw_title(draw, "HISTORY")
+    font_small = get_font(*SMALL_FONT)
+
+    draw_text(draw, (0, 18), cpu_line, font=font_small, fill="white")
+    draw_segments(draw, cpu_graph)
+
+    draw_text(draw, (0, 46), temp_line, font=font_small, fill="white")
+    draw_segments(draw, temp_graph)
+
+
+# --- Fleet screens (1.3" sh1106, see fleet.py) ---
+# stats["fleet"] holds FleetReceiver.snapshot(), stats["fleet_host"] the host
+# whose page is showing.
+
+FLEET_ROWS = 4
+
+
+def fleet_values(stats):
+    hosts = stats.get("fleet") or []
+    stale = sum(1 for _, _, _, is_stale in hosts if is_stale)
+    # Stale hosts first, then the busiest ones
+    shown = sorted(hosts, key=lambda host: (not host[3], -host[1][0]))[:FLEET_ROWS]
+    rows = []
+    for name, (cpu, _, _, _, temperature), _, is_stale in shown:
+        if is_stale:
+            rows.append(f"{name[:12]}  STALE")
+        else:
+            temp = f"{temperature:.0f}°C" if temperature is not None else "N/A"
+            rows.append(f"{name[:12]}  {cpu:.0f}%  {temp}")
+    return f"FLEET {len(hosts) - stale}/{len(hosts)} UP", tuple(rows)
+
+
+def paint_fleet(draw, values):
+    """Fleet summary: hosts up out of all known ones, then the stale and busiest hosts"""
+    title, rows = values
+    draw_title(draw, title)
+    font_small = get_font(*SMALL_FONT)
+    for y, row in zip((16, 28, 40, 52), rows):
+        draw_text(draw, (0, y), row, font=font_small, fill="white")
+
+
+def fleet_host_values(stats):
+    name, (cpu, memory, memory_used, disk, temperature), age, is_stale = stats["fleet_host"]
+    temp = f"{temperature:.1f}°C" if temperature is not None else "N/A"
+    return (
+        name,
+        f"no data for {age:.0f}s" if is_stale else f"Temp: {temp}",
+        cpu, f"{cpu:.0f}%",
+        memory, f"{memory_used:.1f}GB",
+        disk, f"{disk:.0f}%",
+    )
+
+
+def paint_fleet_host(draw, values):
+    """One fleet host (CPU, RAM, disk, temperature or how long it has been silent)"""
+    name, status, cpu, cpu_label, memory, memory_label, disk, disk_label = values
+    draw_title(draw, name)
+    font_small = get_font(*SMALL_FONT)
+
+    draw_text(draw, (0, 16), status, font=font_small, fill="white")
+    draw_text(draw, (0, 28), "CPU", font=font_small, fill="white")
+    draw_bar(draw, 30, 29, 50, 8, cpu, cpu_label)
+    draw_text(draw, (0, 40), "RAM", font=font_small, fill="white")
+    draw_bar(draw, 30, 41, 50, 8, memory, memory_label)
+    draw_text(draw, (0, 52), "Disk", font=font_small, fill="white")
+    draw_bar(draw, 30, 53, 50, 8, disk, disk_label)
+
+
+def fleet_host_marquees(values, size):
+    # Above the title underline
+    return ((values[0], (0, 0, size[0], 13), get_font(*TITLE_FONT)),)
+
+
+system_info = Layout("system", system_info_values, paint_system_info, system_info_marquees)
+weather = Layout("weather", weather_values, paint_weather, weather_marquees)
+overview = Layout("overview", overview_values, paint_overview, overview_marquees)
+performance = Layout("performance", performance_values, paint_performance)
+storage = Layout("storage", storage_values, paint_storage)
+history = Layout("history", history_values, paint_history)
+fleet = Layout("fleet", fleet_values, paint_fleet)
+fleet_host = Layout("fleet_host", fleet_host_values, paint_fleet_host, fleet_host_marquees)
+
+# Layouts by name, as used in config.DISPLAYS
+LAYOUTS = {layout.name: layout for layout in (system_info, weather, overview, performance, storage, history, fleet)}
@@ -0,0 +1,175 @@
+# marquee.py
+# Scrolling text for lines too long for their box.
+#
+# The text is rendered once into a strip (text, gap, text again) that is
+# packed into the panel's page layout. Every step sends only the box's columns
+# of the next window into the strip with DiffDisplay.patch(): no frame is
+# drawn, packed or diffed, and rows of the box's pages outside the box keep
+# what the frame drew there.
+#
+# A ticker (text that fits, but should scroll anyway) across the full width of
+# whole pages of a 128 column ssd1306 is scrolled by the controller itself,
+# with nothing sent at all. The next frame stops it, the next step restarts
+# it. The controller only wraps its own 128 columns, so text longer than the
+# panel always scrolls with patches (as on the sh1106, which cannot scroll).
+#
+# Bus cost: a step re-sends nearly every column of the box (a byte per column
+# per page it covers, plus a window command per page) however far the text
+# moves, so it moves MARQUEE_STEP pixels per step rather than one. The 55 x 12
+# pixel weather description covers 2 pages: about 120 bytes a step, 10 steps
+# a second at the defaults (30 px/s in 3 px steps), some 1.2 KB/s. That is
+# about a tenth of a 100 kHz bus, or 3% of a 400 kHz one; a pixel per step
+# would take three times as much.
+#
+# Dashboards paint the marquees into every frame they draw (so a redraw shows
+# them where they are) and call step() every interval seconds.
+
+import time
+
+from PIL import Image, ImageDraw
+
+import config
+from display import SCROLL_FRAMES, pack_pages_transpose
+from fonts import draw_text, font_key, text_bbox
+
+# ssd1306 frame rate at luma's clock setting: ~370 kHz oscillator, 54 clocks per row
+OSCILLATOR_HZ = 370000
+CLOCKS_PER_ROW = 54
+IDLE_INTERVAL = 1.0  # Seconds between steps while nothing scrolls
+
+
+class Marquee:
+    """Text in box (x0, y0, x1, y1, ends exclusive) that scrolls left at speed pixels/sec when it does not fit."""
+
+    def __init__(self, device, text, box, font, speed=None, gap=None, ticker=False, step=None):
+        self.device = device
+        self.text = text
+        self.box = box
+        self.font = font
+        self.speed = speed or config.MARQUEE_SPEED
+        self.step_size = step or config.MARQUEE_STEP
+        self.interval = self.step_size / self.speed
+        self.offset = 0
+        x0, y0, x1, y1 = box
+        self.width = x1 - x0
+        self.height = y1 - y0
+        text_width = text_bbox(text, font)[2]
+        self.scrolling = ticker or text_width > self.width
+        self.hardware = False
+        if not self.scrolling:
+            return
+
+        rotate = getattr(device, "rotate", 0)
+        if rotate not in (0, 2):
+            raise ValueError("marquees need a panel rotated by 0 or 180 degrees")
+        self._flipped = rotate == 2
+        panel_width, panel_height = device.width, device.height
+        self.hardware = (ticker and text_width <= panel_width and device.can_scroll()
+                         and self.width == panel_width and y0 % 8 == 0 and y1 % 8 == 0)
+        # One period of the strip: the text and the gap after it, the whole panel for the controller to wrap
+        self.period = panel_width if self.hardware else text_width + (gap or config.MARQUEE_GAP)
+
+        # The panel pages the box covers, and the panel column its window starts at
+        rows = (panel_height - y1, panel_height - y0) if self._flipped else (y0, y1)
+        first_page, last_page = rows[0] // 8, (rows[1] - 1) // 8
+        self._first_page = first_page
+        self._column = panel_width - x1 if self._flipped else x0
+        self._masks = [sum(1 << bit for bit in range(8) if rows[0] <= page * 8 + bit < rows[1])
+                       for page in range(first_page, last_page + 1)]
+
+        # Rendered once, at the box's place within its pages
+        pages = last_page - first_page + 1
+        band_top = panel_height - (last_page + 1) * 8 if self._flipped else first_page * 8
+        self._top = y0 - band_top
+        self._strip = Image.new('1', (self.period + self.width, pages * 8))
+        draw = ImageDraw.Draw(self._strip)
+        for x in range(0, self.period + self.width, self.period):
+            draw_text(draw, (x, self._top), self.text, font=font, fill=255)
+        strip = self._strip.rotate(180) if self._flipped else self._strip
+        self._pages = pack_pages_transpose(strip, strip.width, pages)
+
+        if self.hardware:
+            # The scroll interval that comes closest to speed
+            frame_rate = OSCILLATOR_HZ / (CLOCKS_PER_ROW * panel_height)
+            self._scroll_interval = min(SCROLL_FRAMES, key=lambda i: abs(frame_rate / SCROLL_FRAMES[i] - self.speed))
+            self._scroll_pages = (first_page, last_page)
+
+    def paint(self, draw):
+        """Draws the marquee into a frame where it is now, replacing whatever is in its box."""
+        x0, y0, x1, y1 = self.box
+        draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=0)
+        if not self.scrolling:
+            draw_text(draw, (x0, y0), self.text, font=self.font, fill=255)
+            return
+        window = self._strip.crop((self.offset, self._top, self.offset + self.width, self._top + self.height))
+        draw.bitmap((x0, y0), window, fill=255)
+
+    def step(self):
+        """Moves the text on by step_size pixels. Returns False while there is no frame on the panel to patch."""
+        if not self.scrolling:
+            return True
+        if self.hardware:
+            if self.device.scrolling is not None:
+                return True
+            # A frame stopped the scroll: put the text back where it was and let the controller go on
+            if not self._patch():
+                return False
+            self.device.start_scroll(*self._scroll_pages, self._scroll_interval, left=not self._flipped)
+            return True
+        self.offset = (self.offset + self.step_size) % self.period
+        return self._patch()
+
+    def _patch(self):
+        # Upside down, the strip is mirrored: the window for offset starts at period - offset
+        start = self.period - self.offset if self._flipped else self.offset
+        pages = [page[start:start + self.width] for page in self._pages]
+        return self.device.patch(self._first_page, self._column, pages, self._masks)
+
+
+class Marquees:
+    """The marquees of one panel; a marquee lives on (and keeps its position) while its text and box stay the same."""
+
+    def __init__(self, device, speed=None):
+        self.device = device
+        self.speed = speed
+        self.items = {}
+
+    @property
+    def interval(self):
+        """Seconds between steps: the fastest scrolling marquee's, IDLE_INTERVAL if none scrolls."""
+        return min((item.interval for item in self.items.values() if item.scrolling), default=IDLE_INTERVAL)
+
+    def update(self, specs):
+        """Sets the marquees of the frame being drawn from (text, box, font) specs."""
+        items = {}
+        for text, box, font in specs:
+            key = (text, box, font_key(font))
+            items[key] = self.items.get(key) or Marquee(self.device, text, box, font, self.speed)
+        self.items = items
+
+    def paint(self, draw):
+        for item in self.items.values():
+            item.paint(draw)
+
+    def step(self):
+        for item in self.items.values():
+            item.step()
+
+    def schedule(self, scheduler, name):
+        """Registers a task stepping the marquees: at their speed while one scrolls, every IDLE_INTERVAL otherwise."""
+        def step():
+            self.step()
+            task.interval = self.interval
+        task = scheduler.every(name, self.interval, step)
+        return task
+
+
+def play(marquees, seconds, clock=time.monotonic):
+    """Steps marquees for seconds, for dashboards that sleep between frames instead of using a Scheduler."""
+    end = clock() + seconds
+    while True:
+        remaining = end - clock()
+        if remaining <= 0:
+            return
+        time.sleep(min(marquees.interval, remaining))
+        marquees.step()
@@ -0,0 +1,162 @@
+# metrics.py
+# Low-overhead timing spans and a local Prometheus-text metrics endpoint.
+#
+# Wrap hot paths with span("name") / @timed("name"); each observation is two
+# perf_counter() calls and a bisect into a fixed bucket list. Histograms and
+# registered gauges are served as Prometheus text on
+# http://config.METRICS_HOST:config.METRICS_PORT/metrics. The HTTP server is
+# only imported when the endpoint is started.
+
+import bisect
+import functools
+import os
+import threading
+import time
+
+import config
+
+# Upper bounds in seconds, from sub-millisecond draws to multi-second network calls
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+histograms = {}
+gauges = {}
+
+
+def observe(name, seconds):
+    """Records one duration for span name."""
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+
+class span:
+    """Context manager timing a block into the histogram for name."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+
+
+def timed(name):
+    """Decorator timing every call of a function into the histogram for name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def register_gauge(name, help_text, func, **labels):
+    """Exposes the value returned by func() as gauge oled_<name>, evaluated on every scrape."""
+    gauges[(name, tuple(sorted(labels.items())))] = (help_text, func)
+
+
+def read_rss():
+    """Returns the resident memory of this process in bytes."""
+    with open("/proc/self/statm", 'r') as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# The dashboard's own footprint, every thread included
+register_gauge("process_cpu_seconds", "CPU time used by this dashboard process.", time.process_time)
+register_gauge("process_rss_bytes", "Resident memory of this dashboard process.", read_rss)
+
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+
+def render_prometheus():
+    """Returns every histogram and gauge in the Prometheus text exposition format."""
+    lines = [
+        "# HELP oled_span_seconds Time spent in instrumented code paths.",
+        "# TYPE oled_span_seconds histogram",
+    ]
+    # Copies are atomic under the GIL, so collectors can keep adding spans meanwhile
+    for name, histogram in sorted(histograms.copy().items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'oled_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'oled_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+        lines.append(f'oled_span_seconds_sum{{span="{name}"}} {histogram.sum:.6f}')
+        lines.append(f'oled_span_seconds_count{{span="{name}"}} {histogram.count}')
+
+    documented = set()
+    for (name, labels), (help_text, func) in sorted(gauges.copy().items()):
+        try:
+            value = func()
+        except Exception:
+            continue
+        if value is None:
+            continue
+        if name not in documented:
+            lines.append(f"# HELP oled_{name} {help_text}")
+            lines.append(f"# TYPE oled_{name} gauge")
+            documented.add(name)
+        lines.append(f"oled_{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(host=None, port=None):
+    """Serves /metrics on a daemon thread. Returns the server, or None if config.METRICS_PORT is None."""
+    host = config.METRICS_HOST if host is None else host
+    port = config.METRICS_PORT if port is None else port
+    if port is None:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        # Another dashboard already owns the port; keep running without the endpoint
+        print(f"Metrics endpoint disabled: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
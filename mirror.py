@@ -0,0 +1,359 @@
+# mirror.py
+# Live web mirror of the panels, light enough for a Pi Zero and a slow link.
+#
+# A DiffDisplay with a mirror hands the packed page data of every frame and
+# patch to its MirrorChannel: one copy of at most 1 KB and a flag, so the
+# render loop never waits on the network or on viewers. The mirror thread
+# diffs the newest frame against the last one it published (frames that come
+# faster are coalesced) and encodes the changed column range of every page
+# ONCE, as a server-sent event kept in a short backlog that every viewer's
+# connection reads from. A viewer that falls behind the backlog, or has just
+# connected, gets a keyframe instead, encoded at most once per frame too.
+# Browsers unpack the 1-bit pages onto a canvas themselves.
+#
+# Enabled with MIRROR_PORT in config.py or OLED_MIRROR=<port>; open
+# http://<pi>:<port>/ in a browser. The panel controller's own scrolling (see
+# marquee.py) is not mirrored: viewers see the text where the frame drew it.
+#
+# Events of /displays/<name>/events:
+#   init:  JSON {"width", "height", "rotate"}, the panel RAM size before rotation
+#   frame: base64 of (page, first column, column count) uint8 triples, each followed by its page bytes
+#
+# Headless viewer, decoding the same stream:
+#   python3 mirror.py http://127.0.0.1:9109 [--display 1-0x3c] [--frames 20] [--png last.png]
+
+import argparse
+import base64
+import json
+import struct
+import threading
+import time
+from collections import deque
+
+import config
+from display import dirty_range
+from metrics import register_gauge
+
+WINDOW = struct.Struct('BBB')
+BACKLOG = 64  # Events kept for viewers that are a few frames behind
+KEEPALIVE = 15  # Seconds between comments on an idle stream, so closed connections are noticed
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>OLED mirror</title>
+<style>
+body {{ background: #111; color: #888; font: 13px sans-serif; }}
+figure {{ display: inline-block; margin: 16px; }}
+canvas {{ background: #000; image-rendering: pixelated; }}
+</style></head>
+<body>
+<script>
+const SCALE = 4;
+for (const name of {names}) {{
+  const figure = document.body.appendChild(document.createElement("figure"));
+  const canvas = figure.appendChild(document.createElement("canvas"));
+  figure.appendChild(document.createElement("figcaption")).textContent = name;
+  const context = canvas.getContext("2d");
+  const source = new EventSource("displays/" + encodeURIComponent(name) + "/events");
+  let image;
+  source.addEventListener("init", event => {{
+    const info = JSON.parse(event.data);
+    canvas.width = info.width;
+    canvas.height = info.height;
+    canvas.style.width = info.width * SCALE + "px";
+    canvas.style.transform = "rotate(" + info.rotate * 90 + "deg)";
+    image = context.createImageData(info.width, info.height);
+  }});
+  source.addEventListener("frame", event => {{
+    const data = Uint8Array.from(atob(event.data), c => c.charCodeAt(0));
+    const pixels = new Uint32Array(image.data.buffer);
+    for (let i = 0; i < data.length;) {{
+      const page = data[i], start = data[i + 1], end = start + data[i + 2];
+      i += 3;
+      for (let x = start; x < end; x++, i++) {{
+        for (let bit = 0; bit < 8; bit++) {{
+          pixels[(page * 8 + bit) * image.width + x] = data[i] >> bit & 1 ? 0xFFFFFFFF : 0xFF000000;
+        }}
+      }}
+    }}
+    context.putImageData(image, 0, 0);
+  }});
+}}
+</script>
+</body></html>
+"""
+
+
+def sse_message(event, data):
+    """One server-sent event, ready to write to every viewer."""
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+def encode_windows(frame, last, width, pages):
+    """Packs the changed column range of every page of frame (all of it where last is None)."""
+    out = bytearray()
+    for page in range(pages):
+        row = frame[page * width:(page + 1) * width]
+        dirty = (0, width) if last is None else dirty_range(row, last[page * width:(page + 1) * width])
+        if dirty is not None:
+            start, end = dirty
+            out += WINDOW.pack(page, start, end - start) + row[start:end]
+    return bytes(out)
+
+
+def apply_windows(frame, data, width):
+    """Applies what encode_windows() packed to frame, a bytearray of page data."""
+    pos = 0
+    while pos < len(data):
+        page, start, count = WINDOW.unpack_from(data, pos)
+        pos += WINDOW.size
+        frame[page * width + start:page * width + start + count] = data[pos:pos + count]
+        pos += count
+
+
+class MirrorChannel:
+    """One mirrored panel: the newest frame handed over by the render loop and the events encoded from it."""
+
+    def __init__(self, server, name, width, height, rotate=0):
+        self.name = name
+        self.width = width
+        self.pages = height // 8
+        self.init = sse_message("init", json.dumps({"width": width, "height": height, "rotate": rotate}))
+        self.seq = 0
+        self.events = deque(maxlen=BACKLOG)  # (seq, message)
+        self.encoded = 0
+        self._frame = None
+        self._pending = None
+        self._keyframe = None  # (seq, message)
+        self._server = server
+        # publish() runs on the render loop, encode() on the mirror thread
+        self._pending_lock = threading.Lock()
+
+    def publish(self, frame):
+        """Hands over a frame of packed page data. Called from the render loop; never blocks on viewers."""
+        frame = bytes(frame)
+        with self._pending_lock:
+            self._pending = frame
+        self._server.wake()
+
+    def encode(self):
+        """Turns the newest frame handed over into an event. Returns True if there was a change."""
+        with self._pending_lock:
+            frame, self._pending = self._pending, None
+        if frame is None or frame == self._frame:
+            return False
+        message = sse_message("frame", base64.b64encode(encode_windows(frame, self._frame, self.width, self.pages)).decode())
+        self._frame = frame
+        self.seq += 1
+        self.events.append((self.seq, message))
+        self.encoded += 1
+        return True
+
+    def keyframe(self):
+        """(seq, message) of an event carrying the whole current frame, encoded once per frame."""
+        if self._keyframe is None or self._keyframe[0] != self.seq:
+            frame = self._frame or bytes(self.width * self.pages)
+            message = sse_message("frame", base64.b64encode(encode_windows(frame, None, self.width, self.pages)).decode())
+            self._keyframe = (self.seq, message)
+            self.encoded += 1
+        return self._keyframe
+
+    def since(self, seq):
+        """(seq, messages) bringing a viewer at seq up to date: the events it missed, or a keyframe."""
+        if self.events and self.events[0][0] <= seq + 1:
+            return self.seq, [message for event_seq, message in self.events if event_seq > seq]
+        seq, message = self.keyframe()
+        return seq, [message]
+
+
+class MirrorServer:
+    """Serves the mirror page and an event stream per channel; one thread encodes for all viewers."""
+
+    def __init__(self, host, port):
+        from http.server import ThreadingHTTPServer
+        self.channels = {}
+        self.viewers = 0
+        self._changed = threading.Event()
+        # Guards the channels' events; viewer connections wait on it for the next one
+        self._cond = threading.Condition()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def add_display(self, name, device):
+        """Creates the channel of a DiffDisplay; set it as the display's mirror."""
+        channel = MirrorChannel(self, name, device._w, device._pages * 8, getattr(device.device, "rotate", 0))
+        self.channels[name] = channel
+        return channel
+
+    def wake(self):
+        self._changed.set()
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="mirror-server", daemon=True).start()
+        threading.Thread(target=self._encode, name="mirror-encoder", daemon=True).start()
+        return self
+
+    def _encode(self):
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            with self._cond:
+                if any([channel.encode() for channel in list(self.channels.values())]):
+                    self._cond.notify_all()
+
+    def _stream(self, channel, wfile):
+        # Runs on the connection's own thread: a slow viewer only ever holds up itself
+        with self._cond:
+            seq, message = channel.keyframe()
+        wfile.write(channel.init + message)
+        while True:
+            with self._cond:
+                if channel.seq == seq:
+                    self._cond.wait(KEEPALIVE)
+                if channel.seq == seq:
+                    messages = [b": keepalive\n\n"]
+                else:
+                    seq, messages = channel.since(seq)
+            wfile.write(b"".join(messages))
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+        server = self
+
+        class MirrorHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts == [""]:
+                    self._send("text/html; charset=utf-8", PAGE.format(names=json.dumps(sorted(server.channels))))
+                elif parts == ["displays"]:
+                    self._send("application/json", json.dumps(sorted(server.channels)))
+                elif len(parts) == 3 and parts[0] == "displays" and parts[2] == "events":
+                    channel = server.channels.get(parts[1])
+                    if channel is None:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    server.viewers += 1
+                    try:
+                        server._stream(channel, self.wfile)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                    finally:
+                        server.viewers -= 1
+                else:
+                    self.send_error(404)
+
+            def _send(self, content_type, text):
+                body = text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MirrorHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_mirror_server(host=None, port=None):
+    """Returns the process-wide mirror server, started on first use; None if its port is taken."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = MirrorServer(config.MIRROR_HOST if host is None else host, port).start()
+            except OSError as e:
+                # Another dashboard already mirrors on this port; keep running without
+                print(f"Mirror disabled: {e}")
+                _server = False
+                return None
+            register_gauge("mirror_viewers", "Browsers watching the live mirror.", lambda: _server.viewers)
+        return _server or None
+
+
+class MirrorClient:
+    """Follows one panel's event stream like a browser does; iterating yields (frame, event size) per frame."""
+
+    def __init__(self, url, name, timeout=30):
+        from urllib.parse import quote
+        self.url = f"{url.rstrip('/')}/displays/{quote(name)}/events"
+        self.timeout = timeout
+        self.width = self.height = self.rotate = None
+        self.frame = None
+
+    def __iter__(self):
+        from urllib.request import urlopen
+        with urlopen(self.url, timeout=self.timeout) as stream:
+            event, data, size = None, [], 0
+            for line in stream:
+                size += len(line)
+                line = line.rstrip(b"\r\n").decode()
+                if line:
+                    field, _, value = line.partition(":")
+                    if field == "event":
+                        event = value.strip()
+                    elif field == "data":
+                        data.append(value.strip())
+                    continue
+                if event == "init":
+                    info = json.loads("".join(data))
+                    self.width, self.height, self.rotate = info["width"], info["height"], info["rotate"]
+                    self.frame = bytearray(self.width * self.height // 8)
+                elif event == "frame":
+                    apply_windows(self.frame, base64.b64decode("".join(data)), self.width)
+                    yield bytes(self.frame), size
+                event, data, size = None, [], 0
+
+    def image(self):
+        """The current frame as the dashboard drew it."""
+        from recorder import pages_to_image
+        return pages_to_image(self.frame, self.width, self.height, self.rotate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a mirrored panel without a browser.")
+    parser.add_argument("url", help="mirror address, e.g. http://127.0.0.1:9109")
+    parser.add_argument("--display", help="panel to watch (default: the first one)")
+    parser.add_argument("--frames", type=int, help="stop after this many frames")
+    parser.add_argument("--png", help="save the last frame received to this PNG")
+    args = parser.parse_args()
+
+    name = args.display
+    if name is None:
+        from urllib.request import urlopen
+        with urlopen(f"{args.url.rstrip('/')}/displays", timeout=10) as response:
+            names = json.load(response)
+        if not names:
+            parser.error("nothing is mirrored there")
+        name = names[0]
+
+    client = MirrorClient(args.url, name)
+    count = total = 0
+    start = time.monotonic()
+    try:
+        for frame, size in client:
+            count += 1
+            total += size
+            print(f"{name} frame {count}: {size} B")
+            if args.frames and count >= args.frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - start
+    if count:
+        print(f"{count} frames, {total} B in {elapsed:.1f} s ({total / count:.0f} B per frame)")
+    if args.png and client.frame is not None:
+        client.image().save(args.png)
+        print(f"Saved the last frame to {args.png}")
+
+
+if __name__ == "__main__":
+    main()
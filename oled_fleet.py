@@ -0,0 +1,75 @@
+#oled_fleet.py
+# Display node for fleet mode: shows the stats pushed by fleet_agent.py on
+# every Pi. A summary page (hosts up and stale, the busiest ones) alternates
+# with one page per host; hosts that stop reporting are flagged as stale.
+
+import config
+from display import create_device
+from layouts import fleet, fleet_host, RenderMemo
+from marquee import Marquees
+from fleet import get_fleet_receiver
+from metrics import timed, start_metrics_server
+from scheduler import Scheduler
+from startup import show_first_frame
+
+# Only sends the changed pages; set OLED_BACKEND=dummy to run without a panel
+device = create_device(config.FLEET_DISPLAY["driver"], port=config.FLEET_DISPLAY.get("port", 1),
+                       address=config.FLEET_DISPLAY.get("address", 0x3C), **config.FLEET_DISPLAY.get("options", {}))
+
+stats = {}
+page = None  # None for the summary, else the name of the host shown
+memo = RenderMemo("oled_fleet")
+# Host names too long for the title scroll in between, only their pixels are sent
+marquees = Marquees(device)
+
+
+def collect_fleet():
+    # The receiver thread takes the datagrams; this only copies the latest samples
+    stats["fleet"] = get_fleet_receiver().snapshot()
+
+
+@timed("render")
+def redraw():
+    layout = fleet
+    if page is not None:
+        stats["fleet_host"] = next((host for host in stats["fleet"] if host[0] == page), None)
+        if stats["fleet_host"] is not None:
+            layout = fleet_host
+    values = layout.values(stats)
+    if not memo.changed((layout.name, values)):
+        return
+    with device.canvas() as draw:
+        layout.paint(draw, values)
+        marquees.update(layout.marquees(values, device.size))
+        marquees.paint(draw)
+
+
+def next_page():
+    # Summary, then every host in turn
+    global page
+    names = [host[0] for host in stats.get("fleet", [])]
+    pages = [None] + names
+    page = pages[(pages.index(page) + 1) % len(pages)] if page in pages else None
+    scheduler.trigger("redraw")
+
+
+scheduler = Scheduler()
+
+
+def main():
+    show_first_frame(device, "oled_fleet")
+    start_metrics_server()
+    get_fleet_receiver()
+
+    scheduler.every("fleet", 1, collect_fleet)
+    scheduler.every("redraw", 1, redraw)
+    marquees.schedule(scheduler, "marquee")
+    scheduler.every("page", config.PAGE_INTERVAL, next_page, delay=config.PAGE_INTERVAL)
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Dashboard stopped.")
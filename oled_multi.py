@@ -0,0 +1,105 @@
+#oled_multi.py
+# Drives every panel in config.DISPLAYS from one process, e.g. a 1.3" sh1106 and
+# a 0.96" ssd1306 on different I2C buses.
+# Collectors, fonts, text and icon caches are shared by all panels; each bus has
+# its own transfer worker, so a slow panel never delays another one.
+
+import config
+from display import create_device, get_transfer_worker
+from layouts import LAYOUTS, RenderMemo
+from marquee import Marquees
+from collectors import collector_tasks
+from weather import update_weather  # Fetched in the background, never blocks
+from fleet import get_fleet_receiver
+from metrics import timed, start_metrics_server
+from scheduler import Scheduler
+from startup import show_first_frame, warm_up
+
+
+class Panel:
+    """One display with its own pages, drawn from the shared stats."""
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.device = create_device(settings["driver"], port=settings.get("port", 1),
+                                    address=settings.get("address", 0x3C), **settings.get("options", {}))
+        self.worker = get_transfer_worker(settings.get("port", 1))
+        # One frame on the bus, one queued and one being drawn
+        self.buffers = self.device.framebuffers(3)
+        self.pages = [(LAYOUTS[layout], interval) for layout, interval in settings["pages"]]
+        self.page_index = 0
+        # Unchanged pages are neither drawn nor queued for the bus
+        self.memo = RenderMemo(name)
+        # Lines too long for the panel scroll in between, patched from the scheduler thread
+        self.marquees = Marquees(self.device)
+
+    @timed("render")
+    def redraw(self):
+        layout = self.pages[self.page_index][0]
+        values = layout.values(stats)
+        # A failed transfer changes the key, so the page is sent again
+        if not self.memo.changed((layout.name, values, self.device.errors)):
+            return
+        # Rendered here, sent by the bus worker; the buffer is only reused once the worker is done with it
+        image, draw = self.buffers.acquire()
+        layout.paint(draw, values)
+        self.marquees.update(layout.marquees(values, self.device.size))
+        self.marquees.paint(draw)
+        self.worker.submit(self.device, image, done=self.buffers.release)
+
+    def next_page(self):
+        # Every showing of the weather page is for the next configured location
+        if self.pages[self.page_index][0].name == "weather":
+            update_weather(stats, advance=True)
+        self.page_index = (self.page_index + 1) % len(self.pages)
+        scheduler.tasks[f"redraw-{self.name}"].interval = self.pages[self.page_index][1]
+        scheduler.trigger(f"redraw-{self.name}")
+
+
+stats = {}
+scheduler = Scheduler()
+
+
+def main():
+    try:
+        panels = [Panel(f"{settings.get('port', 1)}-{settings.get('address', 0x3C):#x}", settings)
+                  for settings in config.DISPLAYS]
+    except Exception as e:
+        print(f"Error initializing displays: {e}")
+        print("Please ensure I2C is enabled and the displays are connected correctly.")
+        return
+
+    # Show every panel's last frame of the previous run straight away, or a splash
+    for panel in panels:
+        show_first_frame(panel.device, f"multi-{panel.name}")
+
+    # Collectors, the weather fetcher and the metrics endpoint warm up concurrently,
+    # so their values exist before the first redraw
+    # A new IP address or drive shows up right away on every panel instead of on the next poll
+    def redraw_all():
+        for panel in panels:
+            scheduler.trigger(f"redraw-{panel.name}")
+
+    collectors = collector_tasks(stats, on_change=redraw_all)
+    layouts = {layout for settings in config.DISPLAYS for layout, _ in settings["pages"]}
+    if "weather" in layouts:
+        collectors.append(("weather", 5, lambda: update_weather(stats)))
+    if "fleet" in layouts:
+        collectors.append(("fleet", 1, lambda: stats.update(fleet=get_fleet_receiver().snapshot())))
+    warmed = warm_up([collect for _, _, collect in collectors] + [start_metrics_server])
+    for name, interval, collect in collectors:
+        scheduler.every(name, interval, collect, delay=interval if warmed else 0)
+
+    for panel in panels:
+        scheduler.every(f"redraw-{panel.name}", panel.pages[0][1], panel.redraw)
+        panel.marquees.schedule(scheduler, f"marquee-{panel.name}")
+        if len(panel.pages) > 1:
+            scheduler.every(f"page-{panel.name}", config.PAGE_INTERVAL, panel.next_page, delay=config.PAGE_INTERVAL)
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Dashboard stopped.")
@@ -4,24 +4,24 @@
 #feature: with welcome screen || it has only IP, CPU, Temp, RAM and Disk information.
 
 import time
-import subprocess
-import psutil
-from luma.core.interface.serial import i2c
-from luma.core.render import canvas
-from luma.oled.device import ssd1306
-from PIL import ImageFont, ImageDraw
+from PIL import ImageDraw
+from display import create_device
+from fonts import get_font  # Fonts load once, text bitmaps are cached
+from collectors import get_cpu_usage, get_ip_address, get_temperature, get_memory_usage, get_disk_usage, watch_ip_address, parse_temperature, published_stats  # In-process and cached, never fork
+from layouts import system_info, RenderMemo  # Shared with the other dashboards
+from metrics import timed, start_metrics_server
+from startup import show_first_frame, warm_up
+from governor import RefreshGovernor
 
 # OLED setup
-serial = i2c(port=1, address=0x3C)  # Adjust the I2C address if needed
-device = ssd1306(serial, width=128, height=64)
+# Only sends the changed pages; set OLED_BACKEND=dummy to run without a panel
+device = create_device("ssd1306", port=1, address=0x3C, width=128, height=64)  # Adjust the I2C address if needed
 
 # Load fonts
-default_font = ImageFont.load_default()  # Small default font
-ip_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 12)  # Larger font for IP
-welcome_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 11)  # Font for welcome message
+welcome_font = get_font("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 11)  # Font for welcome message
 
 def display_welcome_message():
-    with canvas(device) as draw:
+    with device.canvas() as draw:
         welcome_message = "Welcome to Raspi \nHome Media Center"
         
         # Calculate text size and position to center the text
@@ -31,51 +31,53 @@ def display_welcome_message():
         
         # Draw the welcome message centered
         draw.multiline_text((text_x, text_y), welcome_message, font=welcome_font, fill="white", align="center")
-    
-    # Display the message for 10 seconds
-    time.sleep(10)
 
-def get_ip_address():
-    cmd = "hostname -I | cut -d' ' -f1"
-    return subprocess.check_output(cmd, shell=True).decode('utf-8').strip()
+def collect_stats():
+    """Collects every value shown on the stats screen, or reads them from the collector daemon while it publishes."""
+    stats = published_stats()
+    if stats is not None:
+        return stats
+    return {
+        "ip_address": get_ip_address(),
+        "cpu_usage": get_cpu_usage(),
+        "memory": get_memory_usage(),
+        "temperature": get_temperature(),
+        "disk": get_disk_usage(),
+    }
 
-def get_cpu_usage():
-    return psutil.cpu_percent(interval=1)
+# The stats screen is only drawn and sent when a value it shows has changed
+memo = RenderMemo("oled_stats")
 
-def get_memory_usage():
-    mem = psutil.virtual_memory()
-    return mem.percent, mem.used / (1024 * 1024 * 1024), mem.total / (1024 * 1024 * 1024)
+@timed("render")
+def display_system_info(stats):
+    values = system_info.values(stats)
+    if not memo.changed(values):
+        return
+    with device.canvas() as draw:
+        system_info.paint(draw, values)
 
-def get_temperature():
-    temp = subprocess.check_output(["vcgencmd", "measure_temp"]).decode()
-    return temp.replace("temp=", "").strip()
+def main():
+    # Show the last frame of the previous run straight away, or the welcome message
+    show_first_frame(device, "oled_stats", display_welcome_message)
 
-def get_disk_usage():
-    disk = psutil.disk_usage('/')
-    return disk.percent, disk.used / (1024 * 1024 * 1024), disk.total / (1024 * 1024 * 1024)
+    # With the collector daemon running nothing is collected here (see stats_daemon.py)
+    warmers = [start_metrics_server]
+    if published_stats() is None:
+        # The IP address is only re-read when the network configuration changes
+        watch_ip_address()
+        warmers += [get_ip_address, get_cpu_usage, get_memory_usage, get_temperature, get_disk_usage]
+    # Warm every collector (and the metrics endpoint) up at once; the welcome
+    # message only stays until they are ready instead of a fixed 10 seconds
+    warm_up(warmers)
 
-# Display the welcome message at startup
-display_welcome_message()
+    # Main loop for displaying system stats, refreshing faster while values
+    # change and backing off while they are steady
+    governor = RefreshGovernor("oled_stats")
+    while True:
+        stats = collect_stats()
+        display_system_info(stats)
+        time.sleep(governor.update(cpu=stats["cpu_usage"], memory=stats["memory"][0],
+                                   disk=stats["disk"][0], temperature=parse_temperature(stats["temperature"])))
 
-# Main loop for displaying system stats
-while True:
-    ip_address = get_ip_address()
-    cpu_usage = get_cpu_usage()
-    memory_usage_percent, memory_used, memory_total = get_memory_usage()
-    temperature = get_temperature()
-    disk_usage_percent, disk_used, disk_total = get_disk_usage()
-
-    with canvas(device) as draw:
-        # Draw IP address with larger font
-        draw.text((0, 0), f"IP: {ip_address}", font=ip_font, fill="yellow")
-        
-        # Combine CPU and Temperature on one line
-        draw.text((0, 15), f"CPU: {cpu_usage}%  Temp: {temperature}", font=default_font, fill="blue")
-
-        # Memory Usage in GB with percentage
-        draw.text((0, 30), f"RAM: {memory_used:.2f}/{memory_total:.2f}GB ({memory_usage_percent}%)", font=default_font, fill="blue")
-        
-        # Disk Usage in GB with percentage
-        draw.text((0, 45), f"Disk: {disk_used:.2f}/{disk_total:.2f}GB ({disk_usage_percent}%)", font=default_font, fill="blue")
-
-    time.sleep(1)
+if __name__ == "__main__":
+    main()
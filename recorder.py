@@ -0,0 +1,321 @@
+# recorder.py
+# Records exactly what a panel showed, compactly enough to leave it running.
+#
+# Frames are kept as packed 1-bit page data (what DiffDisplay sends to the
+# panel RAM), XORed against the previous frame and run-length encoded
+# (PackBits), with a keyframe every KEYFRAME_INTERVAL frames so a damaged
+# stretch doesn't spoil the rest. An unchanged frame costs only its header,
+# so 24 h of a stats page redrawn every second stays under 7 MB. Patches
+# (scrolling text, see marquee.py) come many times a second and are recorded
+# at most every PATCH_INTERVAL seconds, so a line scrolling all day adds
+# about 5.5 MB rather than a record per step. A recording is split into a new
+# file every ROTATE_AFTER seconds (a day), <name>.1.oledrec, <name>.2.oledrec
+# and so on, each starting with a keyframe, so record times never run out.
+#
+# File layout (little-endian):
+#   header: magic "OR", version, width, height, rotate, start time (float64, epoch seconds)
+#   record: milliseconds since the start of the file (uint32, 49 days at most), kind, payload length (uint16), payload
+#
+# Usage: python3 recorder.py FILE [--speed 10] [--backend dummy|capture|i2c] [--driver ssd1306]
+#        python3 recorder.py FILE --gif out.gif [--scale 2] [--start 0] [--limit 600]
+#        python3 recorder.py FILE --png frames/
+# Recorded frames can also be replayed through the benchmark: benchmark.py --replay FILE
+
+import argparse
+import os
+import re
+import struct
+import time
+from datetime import datetime
+
+MAGIC = b"OR"
+VERSION = 1
+HEADER = struct.Struct('<2sBHHBd')
+RECORD = struct.Struct('<IBH')
+KEYFRAME = 0
+DELTA = 1
+REPEAT = 2
+KEYFRAME_INTERVAL = 600
+PATCH_INTERVAL = 2.0  # Seconds between records of a panel that only changes by patches
+ROTATE_AFTER = 86400.0  # Seconds per file, well below the 49 days a record time can count
+
+_RUN = re.compile(rb"(.)\1{2,}", re.S)
+
+
+def rle_encode(data):
+    """PackBits: header n < 128 is followed by n + 1 literal bytes, n > 128 repeats the next byte 257 - n times."""
+    out = bytearray()
+
+    def literal(chunk):
+        for start in range(0, len(chunk), 128):
+            part = chunk[start:start + 128]
+            out.append(len(part) - 1)
+            out.extend(part)
+
+    pos = 0
+    for match in _RUN.finditer(data):
+        literal(data[pos:match.start()])
+        length = match.end() - match.start()
+        while length >= 2:
+            count = min(length, 128)
+            out.append(257 - count)
+            out.append(data[match.start()])
+            length -= count
+        if length:
+            literal(data[match.end() - 1:match.end()])
+        pos = match.end()
+    literal(data[pos:])
+    return bytes(out)
+
+
+def rle_decode(data):
+    """Inverse of rle_encode()."""
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        header = data[pos]
+        if header < 128:
+            out += data[pos + 1:pos + header + 2]
+            pos += header + 2
+        elif header > 128:
+            out += data[pos + 1:pos + 2] * (257 - header)
+            pos += 2
+        else:
+            pos += 1
+    return bytes(out)
+
+
+def xor_bytes(a, b):
+    """XOR of two equally long byte strings."""
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def pages_to_image(data, width, height, rotate=0):
+    """Unpacks page layout bytes into a mode '1' image, turned back the way the dashboard drew it."""
+    from PIL import Image
+    pages = height // 8
+    # Inverse of display.pack_pages_transpose: every column is one row of page bytes, bottom page first
+    rotated = bytearray(width * pages)
+    for page in range(pages):
+        rotated[pages - 1 - page::pages] = data[page * width:(page + 1) * width]
+    image = Image.frombytes('1', (height, width), bytes(rotated)).transpose(Image.Transpose.ROTATE_90)
+    if rotate:
+        image = image.rotate(rotate * 90, expand=True)
+    return image
+
+
+class FrameRecorder:
+    """Appends every frame shown on one panel to a recording file."""
+
+    def __init__(self, path, width, height, rotate=0, clock=time.time, patch_interval=PATCH_INTERVAL,
+                 rotate_after=ROTATE_AFTER):
+        self.clock = clock
+        self.patch_interval = patch_interval
+        self.rotate_after = rotate_after
+        self.paths = []  # Every file of this recording, the one written to last
+        self.frames = 0
+        self.bytes_written = 0
+        self._header = (width, height, rotate)
+        self._written_at = None
+        self._patched = None  # Newest patched frame not written yet
+        self._open(path, clock())
+
+    def _open(self, path, now):
+        self.path = path
+        self.paths.append(path)
+        self.start = now
+        self._previous = None  # Every file starts with a keyframe
+        self._since_keyframe = 0
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, *self._header, self.start))
+        self._file.flush()
+        self.bytes_written += HEADER.size
+
+    def _rotate(self, now):
+        """Continues the recording in a new file, <name>.<n>.oledrec next to the first one."""
+        self._file.close()
+        root, ext = os.path.splitext(self.paths[0])
+        self._open(f"{root}.{len(self.paths)}{ext}", now)
+
+    @classmethod
+    def create(cls, directory, name, device):
+        """Starts a recording for a DiffDisplay in directory, named after the panel and the start time."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.oledrec")
+        return cls(path, device._w, device._pages * 8, getattr(device.device, "rotate", 0))
+
+    def record(self, frame):
+        """Appends one frame of packed page data."""
+        self._patched = None
+        self._write(bytes(frame), self.clock())
+
+    def record_patch(self, frame):
+        """Records a frame changed by a patch, at most once every patch_interval seconds.
+
+        A marquee patches its panel many times a second; in between only the
+        newest patched frame is kept, and the next frame or patch due replaces it.
+        """
+        now = self.clock()
+        if self._written_at is not None and now - self._written_at < self.patch_interval:
+            self._patched = bytes(frame)
+            return
+        self._patched = None
+        self._write(bytes(frame), now)
+
+    def _write(self, frame, now):
+        if self.rotate_after is not None and now - self.start >= self.rotate_after:
+            self._rotate(now)
+        # Relative to the start rather than the previous frame, so rounding never adds up
+        elapsed = min(max(0, round((now - self.start) * 1000)), 0xFFFFFFFF)
+
+        if frame == self._previous:
+            kind, payload = REPEAT, b""
+        elif self._previous is None or self._since_keyframe >= KEYFRAME_INTERVAL:
+            kind, payload = KEYFRAME, rle_encode(frame)
+            self._since_keyframe = 0
+        else:
+            kind, payload = DELTA, rle_encode(xor_bytes(frame, self._previous))
+        self._since_keyframe += 1
+        self._previous = frame
+
+        # Into the page cache right away, the kernel decides when it reaches the card
+        self._file.write(RECORD.pack(elapsed, kind, len(payload)) + payload)
+        self._file.flush()
+        self.frames += 1
+        self.bytes_written += RECORD.size + len(payload)
+        self._written_at = now
+
+    def close(self):
+        if self._patched is not None:
+            self._write(self._patched, self.clock())
+        self._file.close()
+
+
+class FrameReader:
+    """Reads a recording; iterating yields (timestamp, page data) for every frame."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        try:
+            magic, version, self.width, self.height, self.rotate, self.start = HEADER.unpack_from(self._data)
+        except struct.error:
+            raise ValueError(f"{path} is not a frame recording") from None
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a frame recording")
+
+    def __iter__(self):
+        data = self._data
+        size = self.width * self.height // 8
+        pos = HEADER.size
+        frame = None
+        while pos + RECORD.size <= len(data):
+            elapsed, kind, length = RECORD.unpack_from(data, pos)
+            pos += RECORD.size
+            if pos + length > len(data):
+                return  # Cut off mid-record, e.g. by a power loss
+            payload = data[pos:pos + length]
+            pos += length
+            if kind in (KEYFRAME, DELTA):
+                decoded = rle_decode(payload)
+                if len(decoded) != size or (kind == DELTA and frame is None):
+                    # Damaged, or nothing to apply the delta to: wait for the next keyframe
+                    frame = None
+                    continue
+                frame = decoded if kind == KEYFRAME else xor_bytes(frame, decoded)
+            elif kind != REPEAT or frame is None:
+                continue
+            yield self.start + elapsed / 1000, frame
+
+    def images(self):
+        """Yields (timestamp, image) for every frame, as the dashboard drew it."""
+        for timestamp, frame in self:
+            yield timestamp, pages_to_image(frame, self.width, self.height, self.rotate)
+
+
+def select(frames, start=0.0, limit=None):
+    """Frames from start seconds into the recording on, at most limit of them."""
+    first = None
+    count = 0
+    for timestamp, item in frames:
+        if first is None:
+            first = timestamp
+        if timestamp - first < start:
+            continue
+        if limit is not None and count >= limit:
+            return
+        count += 1
+        yield timestamp, item
+
+
+def replay(reader, device, speed=1.0, start=0.0, limit=None):
+    """Shows the recorded frames on device, speed times faster than they were recorded (0: no waiting)."""
+    previous = None
+    wall = time.monotonic()
+    for timestamp, image in select(reader.images(), start, limit):
+        if previous is not None and speed:
+            wall += (timestamp - previous) / speed
+            time.sleep(max(0.0, wall - time.monotonic()))
+        previous = timestamp
+        device.display(image)
+
+
+def export_gif(reader, path, speed=1.0, scale=1, start=0.0, limit=None):
+    """Writes the recorded frames to an animated GIF, speed times faster than they were recorded."""
+    frames = list(select(reader.images(), start, limit))
+    if not frames:
+        raise ValueError("no frames to export")
+    images = [image.convert('L').resize((image.width * scale, image.height * scale)) for _, image in frames]
+    # Each frame stays up until the next one was recorded; GIF delays are in ms, 20 at the least
+    durations = [max(20, round((b[0] - a[0]) * 1000 / speed)) for a, b in zip(frames, frames[1:])] + [1000]
+    images[0].save(path, save_all=True, append_images=images[1:], duration=durations, loop=0)
+    return len(images)
+
+
+def export_png(reader, directory, scale=1, start=0.0, limit=None):
+    """Writes every recorded frame to directory as <index>-<time>.png."""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for count, (timestamp, image) in enumerate(select(reader.images(), start, limit), 1):
+        image = image.resize((image.width * scale, image.height * scale))
+        image.save(os.path.join(directory, f"{count:06d}-{datetime.fromtimestamp(timestamp):%H%M%S}.png"))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay or export a frame recording.")
+    parser.add_argument("file", help="recording made with RECORD_DIR / OLED_RECORD set")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed factor, 0 for as fast as possible")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the recording to start at")
+    parser.add_argument("--limit", type=int, help="frames to replay or export at most")
+    parser.add_argument("--backend", help="display backend to replay on (default: OLED_BACKEND / DISPLAY_BACKEND)")
+    parser.add_argument("--driver", default="ssd1306", help="panel driver to replay on")
+    parser.add_argument("--port", type=int, default=1, help="I2C bus of the panel")
+    parser.add_argument("--gif", help="export to this animated GIF instead of replaying")
+    parser.add_argument("--png", help="export every frame into this directory instead of replaying")
+    parser.add_argument("--scale", type=int, default=1, help="pixel size of exported frames")
+    args = parser.parse_args()
+
+    reader = FrameReader(args.file)
+    started = datetime.fromtimestamp(reader.start)
+    print(f"{args.file}: {reader.width}x{reader.height}, recorded from {started:%Y-%m-%d %H:%M:%S}")
+    if args.gif:
+        count = export_gif(reader, args.gif, args.speed or 1.0, args.scale, args.start, args.limit)
+        print(f"Wrote {count} frames to {args.gif}")
+    elif args.png:
+        count = export_png(reader, args.png, args.scale, args.start, args.limit)
+        print(f"Wrote {count} frames to {args.png}")
+    else:
+        from display import create_device
+        width, height = (reader.height, reader.width) if reader.rotate % 2 else (reader.width, reader.height)
+        device = create_device(args.driver, port=args.port, backend=args.backend, width=width, height=height,
+                               rotate=reader.rotate)
+        try:
+            replay(reader, device, args.speed, args.start, args.limit)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# scheduler.py
+# Deadline-based scheduler for pages and widgets.
+# Every task declares its own refresh interval and only runs when its deadline
+# is due. Between deadlines the loop sleeps until the next earliest one instead
+# of a fixed interval, and keeps track of missed deadlines and jitter. A task
+# that raises is logged and counted, and runs again at its next deadline.
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Task:
+    """A callable that should run every interval seconds."""
+
+    def __init__(self, name, interval, func, deadline):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.deadline = deadline
+        self.runs = 0
+        self.missed = 0
+        self.errors = 0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+
+    def stats(self):
+        """Returns run count, missed deadlines and jitter (seconds late) as a dict."""
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "missed": self.missed,
+            "errors": self.errors,
+            "mean_jitter": self.total_jitter / self.runs if self.runs else 0.0,
+            "max_jitter": self.max_jitter,
+        }
+
+
+class Scheduler:
+    """Runs tasks when their deadlines are due and sleeps until the next one."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.tasks = {}
+        self._queue = []
+        self._order = itertools.count()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def every(self, name, interval, func, delay=0.0):
+        """Registers func to run every interval seconds, first after delay seconds.
+
+        Tasks due at the same time run in the order they were registered.
+        """
+        task = Task(name, interval, func, self.clock() + delay)
+        with self._lock:
+            self.tasks[name] = task
+            heapq.heappush(self._queue, (task.deadline, next(self._order), task))
+        return task
+
+    def trigger(self, name):
+        """Makes a task due right now and wakes the loop. Safe to call from other threads."""
+        with self._lock:
+            task = self.tasks[name]
+            task.deadline = self.clock()
+            heapq.heappush(self._queue, (task.deadline, next(self._order), task))
+        self._wake.set()
+
+    def run_pending(self):
+        """Runs every task that is due and returns the seconds until the next deadline."""
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return None
+                deadline, _, task = self._queue[0]
+                now = self.clock()
+                if deadline > now:
+                    return deadline - now
+                heapq.heappop(self._queue)
+                if deadline != task.deadline:
+                    # Stale entry left behind by trigger()
+                    continue
+
+            lateness = now - deadline
+            task.runs += 1
+            task.total_jitter += lateness
+            task.max_jitter = max(task.max_jitter, lateness)
+            # Skip whole intervals we slept through rather than running them back to back
+            skipped = int(lateness // task.interval) if task.interval > 0 else 0
+            task.missed += skipped
+
+            try:
+                task.func()
+            except Exception as e:
+                # One failing task (e.g. a panel that dropped off the bus) must not stop the others
+                task.errors += 1
+                print(f"Task {task.name} failed: {e!r}")
+
+            with self._lock:
+                if task.deadline == deadline:
+                    task.deadline = deadline + task.interval * (skipped + 1)
+                    heapq.heappush(self._queue, (task.deadline, next(self._order), task))
+
+    def run_forever(self):
+        """Runs tasks as they become due, sleeping until the next earliest deadline."""
+        while True:
+            delay = self.run_pending()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def stats(self):
+        """Returns per-task statistics keyed by task name."""
+        return {name: task.stats() for name, task in self.tasks.items()}
@@ -0,0 +1,139 @@
+# startup.py
+# Fast time-to-first-frame.
+# As soon as the display is up, a dashboard paints the frame it showed last
+# time (kept on disk by FrameCache) or a splash, then warms its collectors and
+# the weather fetch up concurrently and swaps in real data once it is ready.
+# Both moments are exported as gauges, measured from process start:
+#   oled_startup_first_frame_seconds  cached frame or splash on the panel
+#   oled_startup_ready_seconds        first frame with real data on the panel
+
+import os
+import threading
+import time
+
+import config
+from metrics import register_gauge
+
+_imported_at = time.monotonic()
+
+first_frame_seconds = None
+ready_seconds = None
+
+register_gauge("startup_first_frame_seconds", "Seconds from process start to the first frame (cached or splash).",
+               lambda: first_frame_seconds)
+register_gauge("startup_ready_seconds", "Seconds from process start to the first frame with real data.",
+               lambda: ready_seconds)
+
+
+def process_age():
+    """Seconds since this process was started, including interpreter startup and imports."""
+    try:
+        with open("/proc/self/stat", 'r') as f:
+            # Skip past the command name, it may contain spaces; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", 'r') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _imported_at
+
+
+class FrameCache:
+    """Keeps the last frame a dashboard showed on disk, written at most every interval seconds."""
+
+    def __init__(self, name, interval=None):
+        self.path = os.path.join(config.FRAME_CACHE_DIR, f"{name}.frame")
+        self.interval = config.FRAME_CACHE_INTERVAL if interval is None else interval
+        self._saved = None
+        self._saved_at = 0.0
+
+    def load(self, mode, size):
+        """Returns the cached frame as an image, or None if there is none for this mode and size."""
+        from PIL import Image
+        try:
+            with open(self.path, 'rb') as f:
+                header, data = f.read().split(b"\n", 1)
+            cached_mode, width, height = header.decode().split()
+            if cached_mode != mode or (int(width), int(height)) != size:
+                return None
+            return Image.frombytes(mode, size, data)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, image):
+        """Called with every frame sent to the panel; the first one marks the dashboard as ready."""
+        global ready_seconds
+        if ready_seconds is None:
+            ready_seconds = process_age()
+
+        now = time.monotonic()
+        if now - self._saved_at < self.interval:
+            return
+        self._saved_at = now
+        data = image.tobytes()
+        if data == self._saved:
+            return
+        self._saved = data
+
+        # Written atomically so a restart mid-write never paints a torn frame
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(config.FRAME_CACHE_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(f"{image.mode} {image.width} {image.height}\n".encode())
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def draw_splash(device, message="Starting..."):
+    """Draws message centered on the panel."""
+    from fonts import get_font
+    font = get_font()
+    with device.canvas() as draw:
+        left, top, right, bottom = draw.multiline_textbbox((0, 0), message, font=font)
+        draw.multiline_text(((device.width - right) // 2, (device.height - bottom) // 2), message,
+                            font=font, fill="white", align="center")
+
+
+def show_first_frame(device, name, splash=None):
+    """Paints the frame device showed last time, or splash() if there is none, right away.
+
+    From then on every frame sent to device is kept in the frame cache.
+    Returns True if a cached frame was shown.
+    """
+    global first_frame_seconds
+    cache = FrameCache(name)
+    image = cache.load(device.mode, device.size)
+    if image is not None:
+        device.display(image)
+    elif splash is not None:
+        splash()
+    else:
+        draw_splash(device)
+    if first_frame_seconds is None:
+        first_frame_seconds = process_age()
+    device.frame_cache = cache
+    return image is not None
+
+
+def warm_up(funcs, timeout=None):
+    """Runs funcs concurrently on daemon threads and waits until all are done or timeout seconds passed.
+
+    Returns True if every func finished in time.
+    """
+    def run(func):
+        try:
+            func()
+        except Exception as e:
+            print(f"Warm-up of {getattr(func, '__name__', func)} failed: {e}")
+
+    timeout = config.WARM_UP_TIMEOUT if timeout is None else timeout
+    threads = [threading.Thread(target=run, args=(func,), name="warm-up", daemon=True) for func in funcs]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    return not any(thread.is_alive() for thread in threads)
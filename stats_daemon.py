@@ -0,0 +1,52 @@
+# stats_daemon.py
+# Collector daemon: runs the system stat collectors and the weather fetcher
+# once for every dashboard on this Pi and publishes the latest values into
+# shared memory after each collection (see statsbus.py). Dashboards started
+# while it runs read them from there and collect nothing themselves. Needs no
+# display; start it before the dashboards, e.g. as its own systemd service.
+
+import config
+from collectors import collector_tasks
+from metrics import register_gauge, start_metrics_server
+from scheduler import Scheduler
+from startup import warm_up
+from statsbus import StatsPublisher
+from weather import fetch_weather_data, weather_locations
+
+WEATHER_INTERVAL = 5  # Seconds between looks at the fetcher's latest weather
+
+
+def main():
+    if not config.STATS_BUS_NAME:
+        print("STATS_BUS_NAME is not set in config.py, nothing to publish to")
+        return
+    publisher = StatsPublisher(config.STATS_BUS_NAME)
+    register_gauge("stats_bus_publishes", "Times the collector daemon published the stats.",
+                   lambda: publisher.publishes)
+    stats = {}
+
+    def collect_weather():
+        # Every location, so each dashboard can rotate through them on its own
+        stats["weather_by_location"] = {name: fetch_weather_data(name) for name in weather_locations()}
+
+    # Values re-read on change notifications go out right away, and make the dashboards redraw
+    tasks = collector_tasks(stats, on_change=lambda: publisher.publish(stats, changed=True), from_daemon=False)
+    tasks.append(("weather", WEATHER_INTERVAL, collect_weather))
+
+    warmed = warm_up([collect for _, _, collect in tasks] + [start_metrics_server])
+    publisher.publish(stats)
+
+    scheduler = Scheduler()
+    for name, interval, collect in tasks:
+        def publish_after(collect=collect):
+            collect()
+            publisher.publish(stats)
+        scheduler.every(name, interval, publish_after, delay=interval if warmed else 0)
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,292 @@
+# statsbus.py
+# Shared-memory stats bus between the collector daemon and the dashboards.
+#
+# stats_daemon.py runs the collectors (and the weather fetcher) once for the
+# whole Pi and publishes the latest values into a fixed-layout
+# multiprocessing.shared_memory block after every collection. Dashboards map
+# the block read-only and copy the values into their stats dict straight from
+# the mapping: no syscalls, no pickling, and no collector (psutil holding the
+# GIL, a hung mount, a slow network call) ever runs in their process.
+#
+# The block is guarded by a seqlock: the sequence number is odd while the
+# daemon writes and bumped to the next even number afterwards; a reader that
+# saw the same even number before and after decoding has a consistent copy.
+# A CRC of the values backs it up, as nothing orders the stores of an
+# interpreter on the Pi's weakly ordered ARM cores. The block outlives the
+# daemon, so dashboards keep their mapping across daemon restarts.
+#
+# Block layout (little-endian):
+#   header: magic, payload size, daemon pid, sequence number, payload CRC32, time of the last publish
+#   payload: change count, present-field bits, mount and location counts, the fields of FIELDS,
+#            MAX_MOUNTS mount slots, MAX_LOCATIONS weather slots
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import config
+from metrics import register_gauge
+
+MAGIC = b"OLEDBUS1"
+HEADER = struct.Struct('<8sIIQId')
+IDENTITY = struct.Struct('<8sII')  # magic, payload size, daemon pid
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 16
+STAMP = struct.Struct('<Id')  # CRC32 of the payload, time of the last publish
+STAMP_OFFSET = SEQ_OFFSET + SEQ.size
+MAX_MOUNTS = 8
+MAX_LOCATIONS = 8
+READ_ATTEMPTS = 100  # A publish takes microseconds; past this many torn reads keep the last values
+
+# Published stats keys and their formats; tuples are stored flat, text as UTF-8 in fixed-size fields
+FIELDS = [
+    ("cpu_usage", "d"), ("cpu_speed", "16s"), ("cpu_temp", "16s"), ("temperature", "16s"),
+    ("memory", "3d"), ("ram_usage", "d"), ("ram_remaining", "16s"), ("fan_speed", "16s"),
+    ("ip_address", "46s"), ("disk", "3d"), ("disk_io", "2d"), ("net_io", "2d"),
+]
+COUNTS = struct.Struct('<QQBB')  # change count, present-field bits, mounts, locations
+VALUES = struct.Struct('<' + "".join(fmt for _, fmt in FIELDS))
+# label, state, has usage, total, used, free, percent
+MOUNT = struct.Struct('<16s8s?QQQd')
+# location name, has weather, description, temperature, humidity
+WEATHER = struct.Struct('<48s?64sdi')
+PAYLOAD_SIZE = COUNTS.size + VALUES.size + MOUNT.size * MAX_MOUNTS + WEATHER.size * MAX_LOCATIONS
+SIZE = HEADER.size + PAYLOAD_SIZE
+
+# Same fields as psutil's disk_usage() result, which the storage layout reads
+DiskUsage = namedtuple("DiskUsage", "total used free percent")
+
+
+def _text(value, size):
+    data = str(value).encode()[:size]
+    # Never cut a multi-byte character in half
+    return data.decode(errors="ignore").encode()
+
+
+def encode(stats, changes=0):
+    """Packs the published values of a stats dict into a payload."""
+    out = bytearray(PAYLOAD_SIZE)
+    present = 0
+    values = []
+    for index, (key, fmt) in enumerate(FIELDS):
+        count = int(fmt[:-1]) if fmt[-1] != "s" and fmt[:-1] else 1
+        value = stats.get(key)
+        if value is not None:
+            present |= 1 << index
+        if fmt[-1] == "s":
+            values.append(_text(value, int(fmt[:-1])) if value is not None else b"")
+        elif count > 1:
+            values.extend(value if value is not None else (0.0,) * count)
+        else:
+            values.append(value if value is not None else 0.0)
+
+    mounts = (stats.get("mounts") or [])[:MAX_MOUNTS]
+    locations = list((stats.get("weather_by_location") or {}).items())[:MAX_LOCATIONS]
+    COUNTS.pack_into(out, 0, changes, present, len(mounts), len(locations))
+    VALUES.pack_into(out, COUNTS.size, *values)
+    offset = COUNTS.size + VALUES.size
+    for label, usage, state in mounts:
+        if usage is None:
+            MOUNT.pack_into(out, offset, _text(label, 16), _text(state, 8), False, 0, 0, 0, 0.0)
+        else:
+            MOUNT.pack_into(out, offset, _text(label, 16), _text(state, 8), True,
+                            int(usage.total), int(usage.used), int(usage.free), usage.percent)
+        offset += MOUNT.size
+    offset = COUNTS.size + VALUES.size + MOUNT.size * MAX_MOUNTS
+    for name, weather in locations:
+        if weather is None:
+            WEATHER.pack_into(out, offset, _text(name, 48), False, b"", 0.0, 0)
+        else:
+            description, temperature, humidity = weather
+            WEATHER.pack_into(out, offset, _text(name, 48), True, _text(description, 64), temperature, humidity)
+        offset += WEATHER.size
+    return bytes(out)
+
+
+def _string(data):
+    return data.rstrip(b"\0").decode(errors="replace")
+
+
+def decode(buf, offset=0):
+    """Unpacks a payload (from any buffer, e.g. the mapping itself) into (stats values, change count)."""
+    changes, present, mount_count, location_count = COUNTS.unpack_from(buf, offset)
+    flat = VALUES.unpack_from(buf, offset + COUNTS.size)
+    stats = {}
+    pos = 0
+    for index, (key, fmt) in enumerate(FIELDS):
+        count = int(fmt[:-1]) if fmt[-1] != "s" and fmt[:-1] else 1
+        value = _string(flat[pos]) if fmt[-1] == "s" else (flat[pos] if count == 1 else flat[pos:pos + count])
+        pos += count
+        if present & (1 << index):
+            stats[key] = value
+
+    mounts = []
+    base = offset + COUNTS.size + VALUES.size
+    for slot in range(min(mount_count, MAX_MOUNTS)):
+        label, state, has_usage, total, used, free, percent = MOUNT.unpack_from(buf, base + slot * MOUNT.size)
+        mounts.append((_string(label), DiskUsage(total, used, free, percent) if has_usage else None, _string(state)))
+    stats["mounts"] = mounts
+
+    weather = {}
+    base += MOUNT.size * MAX_MOUNTS
+    for slot in range(min(location_count, MAX_LOCATIONS)):
+        name, has_weather, description, temperature, humidity = WEATHER.unpack_from(buf, base + slot * WEATHER.size)
+        weather[_string(name)] = (_string(description), temperature, humidity) if has_weather else None
+    stats["weather_by_location"] = weather
+    return stats, changes
+
+
+def _shm_path(name):
+    # Where Linux keeps POSIX shared memory, i.e. multiprocessing.shared_memory blocks
+    return os.path.join("/dev/shm", name.lstrip("/"))
+
+
+class StatsPublisher:
+    """Writes the values of a stats dict into the shared block; the collector daemon's end of the bus."""
+
+    def __init__(self, name):
+        from multiprocessing import resource_tracker, shared_memory
+        seq = 0
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name)
+            if shm.size >= SIZE and HEADER.unpack_from(shm.buf)[:2] == (MAGIC, PAYLOAD_SIZE):
+                # Left by an earlier daemon: reused, so dashboards that mapped it keep reading
+                seq = HEADER.unpack_from(shm.buf)[3]
+            else:
+                # Another layout: replaced, dashboards attach to the new one when they restart
+                shm.unlink()
+                shm.close()
+                shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        # It is meant to outlive this process: keep the resource tracker from unlinking it at exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        self._shm = shm
+
+        self.name = name
+        self.changes = 0
+        self.publishes = 0
+        self._lock = threading.Lock()
+        # Even again if an earlier daemon died mid-write; its last values stay readable until the first publish
+        self._seq = seq + (seq & 1)
+        IDENTITY.pack_into(shm.buf, 0, MAGIC, PAYLOAD_SIZE, os.getpid())
+        SEQ.pack_into(shm.buf, SEQ_OFFSET, self._seq)
+
+    def publish(self, stats, changed=False):
+        """Publishes the current values; changed counts a change dashboards should redraw for right away."""
+        with self._lock:
+            if changed:
+                self.changes += 1
+            payload = encode(stats, self.changes)
+            buf = self._shm.buf
+            SEQ.pack_into(buf, SEQ_OFFSET, self._seq + 1)
+            buf[HEADER.size:SIZE] = payload
+            STAMP.pack_into(buf, STAMP_OFFSET, zlib.crc32(payload), time.time())
+            self._seq += 2
+            SEQ.pack_into(buf, SEQ_OFFSET, self._seq)
+            self.publishes += 1
+
+    def unlink(self):
+        """Removes the block; processes that mapped it keep their mapping."""
+        os.unlink(_shm_path(self.name))
+
+    def close(self):
+        self._shm.close()
+
+
+class StatsReader:
+    """Reads the shared block, a dashboard's end of the bus. The mapping is read-only."""
+
+    def __init__(self, name, stale_after=None):
+        fd = os.open(_shm_path(name), os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        if len(self._mm) < SIZE or HEADER.unpack_from(self._mm)[:2] != (MAGIC, PAYLOAD_SIZE):
+            self._mm.close()
+            raise ValueError(f"{name} is not a stats block of this version")
+        self.name = name
+        self.stale_after = stale_after
+        self.torn_reads = 0
+        self._payload = memoryview(self._mm)[HEADER.size:SIZE]
+        self._seq = None
+        self._values = None
+        self._changes = None
+
+    @property
+    def age(self):
+        """Seconds since the daemon last published."""
+        return time.time() - STAMP.unpack_from(self._mm, STAMP_OFFSET)[1]
+
+    @property
+    def stale(self):
+        """True while the daemon has not published for stale_after seconds: it stopped or hangs."""
+        return self.stale_after is not None and self.age > self.stale_after
+
+    def read(self):
+        """Returns (stats values, change count) as last published, or None before the first publish."""
+        mm = self._mm
+        for _ in range(READ_ATTEMPTS):
+            seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if seq == self._seq or seq == 0:
+                break
+            if seq & 1:
+                continue
+            try:
+                values = decode(self._payload)
+            except (struct.error, ValueError):
+                values = None
+            crc = STAMP.unpack_from(mm, STAMP_OFFSET)[0]
+            if values is not None and SEQ.unpack_from(mm, SEQ_OFFSET)[0] == seq and zlib.crc32(self._payload) == crc:
+                self._seq = seq
+                self._values = values
+                break
+            self.torn_reads += 1
+        return self._values
+
+    def update(self, stats):
+        """Copies the published values into stats. Returns True if the daemon saw a change since the last call."""
+        published = self.read()
+        if published is None:
+            return False
+        values, changes = published
+        stats.update(values)
+        changed = self._changes is not None and changes != self._changes
+        self._changes = changes
+        return changed
+
+    def close(self):
+        self._payload.release()
+        self._mm.close()
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_stats_reader():
+    """Returns the shared StatsReader if a collector daemon has published, else None (collect in-process then).
+
+    The daemon may stop or hang later on; callers check reader.stale before
+    trusting what it read.
+    """
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            name = config.STATS_BUS_NAME
+            try:
+                reader = StatsReader(name, config.STATS_BUS_STALE_AFTER) if name else None
+            except (OSError, ValueError):
+                reader = None
+            if reader is not None:
+                register_gauge("stats_bus_age_seconds", "Seconds since the collector daemon last published.",
+                               lambda: reader.age)
+                register_gauge("stats_bus_torn_reads", "Reads of the stats bus retried because a publish was under way.",
+                               lambda: reader.torn_reads)
+            _reader = reader or False
+    return _reader or None
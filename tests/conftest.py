@@ -0,0 +1,26 @@
+# conftest.py
+# The tests run on the headless backends (see display.create_device) and need
+# no panel, I2C bus or network: python -m pytest
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["OLED_BACKEND"] = "capture"
+for variable in ("OLED_RECORD", "OLED_MIRROR"):
+    os.environ.pop(variable, None)
+
+import pytest  # noqa: E402
+
+import config  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def scratch_paths(tmp_path, monkeypatch):
+    """Keeps history, frame cache and weather cache out of the checkout, and every test off a running daemon."""
+    monkeypatch.setattr(config, "HISTORY_DIR", str(tmp_path / "history"))
+    monkeypatch.setattr(config, "FRAME_CACHE_DIR", str(tmp_path / "frames"))
+    monkeypatch.setattr(config, "WEATHER_CACHE_PATH", str(tmp_path / "weather_cache.json"))
+    monkeypatch.setattr(config, "RECORD_DIR", None)
+    monkeypatch.setattr(config, "MIRROR_PORT", None)
+    monkeypatch.setattr(config, "STATS_BUS_NAME", None)
@@ -0,0 +1,87 @@
+# panel.py
+# A model of the controller display RAM, fed with the I2C messages a
+# MockSMBus recorded, so tests can check what a panel would show.
+
+import luma.oled.device
+
+from display import DiffDisplay, pack_pages_python
+from transport import I2CTransport, MockSMBus
+
+# Argument bytes that follow each multi-byte command
+ARGUMENTS = {
+    "ssd1306": {0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5, 0x81: 1, 0x8D: 1, 0xA3: 2,
+                0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1},
+    "sh1106": {0x81: 1, 0x8D: 1, 0xA8: 1, 0xAD: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1},
+}
+
+
+class PanelRAM:
+    """Display RAM of an ssd1306 (horizontal addressing) or sh1106 (page addressing), 132 columns x 8 pages."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.ram = [bytearray(132) for _ in range(8)]
+        self.column = 0
+        self.page = 0
+        self.window = (0, 127, 0, 7)
+        self.data_bytes = 0
+
+    def feed(self, bus):
+        """Applies and forgets every message bus recorded since the last call."""
+        while bus.writes:
+            _, message = bus.writes.popleft()
+            if message[0] == 0x00:
+                self._commands(message[1:])
+            else:
+                self._data(message[1:])
+
+    def _commands(self, commands):
+        arguments = ARGUMENTS[self.driver]
+        pos = 0
+        while pos < len(commands):
+            command = commands[pos]
+            args = commands[pos + 1:pos + 1 + arguments.get(command, 0)]
+            pos += 1 + len(args)
+            if self.driver == "ssd1306":
+                if command == 0x21:
+                    self.window = (args[0], args[1]) + self.window[2:]
+                    self.column = args[0]
+                elif command == 0x22:
+                    self.window = self.window[:2] + (args[0], args[1])
+                    self.page = args[0]
+            elif 0xB0 <= command <= 0xB7:
+                self.page = command - 0xB0
+            elif command < 0x10:
+                self.column = (self.column & 0xF0) | command
+            elif command < 0x20:
+                self.column = (self.column & 0x0F) | ((command & 0x0F) << 4)
+
+    def _data(self, data):
+        self.data_bytes += len(data)
+        first_column, last_column, first_page, last_page = self.window
+        for value in data:
+            self.ram[self.page][self.column] = value
+            self.column += 1
+            if self.driver == "ssd1306" and self.column > last_column:
+                self.column = first_column
+                self.page = first_page if self.page >= last_page else self.page + 1
+
+    def shown(self, device):
+        """The page bytes the panel shows, in the layout DiffDisplay packs frames into."""
+        offset = device._colstart if self.driver == "ssd1306" else device._page_address_offset
+        return b"".join(bytes(self.ram[page][offset:offset + device._w]) for page in range(device._h // 8))
+
+
+def panel(driver="ssd1306", rdwr=True, **kwargs):
+    """Returns (DiffDisplay, MockSMBus, PanelRAM) for a panel on the capture bus, its RAM synced after init."""
+    bus = MockSMBus(keep=100000, rdwr=rdwr)
+    device = DiffDisplay(getattr(luma.oled.device, driver)(I2CTransport(bus), **kwargs))
+    ram = PanelRAM(driver)
+    ram.feed(bus)
+    return device, bus, ram
+
+
+def packed(device, image):
+    """What the panel should show for image, packed by the reference packer."""
+    frame = device.device.preprocess(image)
+    return b"".join(pack_pages_python(frame, device._w, device._pages))
@@ -0,0 +1,75 @@
+import subprocess
+import time
+
+import collectors
+from collectors import CpuSampler, cpu_percentages
+
+BOOT = """cpu  1000 0 500 8000 200 0 0 300 0 0
+cpu0 500 0 250 4000 100 0 0 150 0 0
+cpu1 500 0 250 4000 100 0 0 150 0 0
+intr 12345 0 0
+ctxt 67890
+"""
+# cpu0 busy for 450 of 1000 jiffies, 50 of them stolen, 50 waiting for I/O; cpu1 idle
+LATER = """cpu  1300 0 600 9500 250 0 0 350 0 0
+cpu0 800 0 350 4500 150 0 0 200 0 0
+cpu1 500 0 250 5000 100 0 0 150 0 0
+intr 12400 0 0
+ctxt 67990
+"""
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_cpu_percentages():
+    assert cpu_percentages([1000, 0, 500, 8000, 200, 0, 0, 300], [1300, 0, 600, 9500, 250, 0, 0, 350]) == (22.5, 2.5, 2.5)
+    # Kernels before 2.6.11 have no steal column
+    assert cpu_percentages([0, 0, 0, 0], [30, 0, 10, 60]) == (40.0, 0.0, 0.0)
+    assert cpu_percentages([5, 0, 0, 5], [5, 0, 0, 5]) == (0.0, 0.0, 0.0)
+
+
+def test_cpu_sampler_measures_each_window(tmp_path):
+    path = tmp_path / "stat"
+    path.write_text(BOOT)
+    sampler = CpuSampler(interval=3600, path=str(path))
+    # The average since boot until the first window completes
+    assert (sampler.total, sampler.iowait, sampler.steal, sampler.per_core) == (18.0, 2.0, 3.0, [18.0, 18.0])
+
+    sampler.start()
+    path.write_text(LATER)
+    sampler._wake.set()  # End the window now
+    wait_for(lambda: sampler._prev["cpu"][0] == 1300)
+    assert (sampler.total, sampler.iowait, sampler.steal, sampler.per_core) == (22.5, 2.5, 2.5, [45.0, 0.0])
+    sampler.stop()
+    sampler.join(1.0)
+
+
+def test_ip_address_forks_hostname_only_when_proc_net_is_unreadable(monkeypatch):
+    forks = []
+
+    def hostname(args, **kwargs):
+        forks.append(args)
+        return "10.0.0.9 fe80::1\n"
+
+    monkeypatch.setattr(subprocess, "check_output", hostname)
+    monkeypatch.setattr(collectors, "get_default_interface", lambda: "wlan0")
+    monkeypatch.setattr(collectors, "list_interfaces", lambda: ["lo", "eth0", "wlan0"])
+    addresses = {"wlan0": "192.168.1.20"}
+    monkeypatch.setattr(collectors, "get_interface_address", addresses.get)
+    assert collectors.read_ip_address() == "192.168.1.20"
+
+    # Not connected
+    addresses.clear()
+    assert collectors.read_ip_address() == "N/A"
+    assert forks == []
+
+    def unreadable():
+        raise FileNotFoundError(collectors.NET_DEV_PATH)
+    monkeypatch.setattr(collectors, "list_interfaces", unreadable)
+    assert collectors.read_ip_address() == "10.0.0.9"
+    assert forks == [["hostname", "-I"]]
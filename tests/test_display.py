@@ -0,0 +1,120 @@
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from panel import packed, panel
+
+PANELS = [
+    ("ssd1306", {"width": 128, "height": 64}),
+    ("ssd1306", {"width": 128, "height": 64, "rotate": 2}),
+    ("ssd1306", {"width": 128, "height": 32}),
+    ("ssd1306", {"width": 64, "height": 48}),
+    ("sh1106", {"width": 128, "height": 64}),
+    ("sh1106", {"width": 128, "height": 64, "rotate": 2}),
+]
+
+
+def frames(size, count, seed=1):
+    """Random frames where each differs from the last by a little, a lot, or not at all."""
+    rng = random.Random(seed)
+    image = Image.new('1', size)
+    draw = ImageDraw.Draw(image)
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.rectangle((x, y, x + rng.randrange(1, 12), y + rng.randrange(1, 6)), fill=rng.choice((0, 255)))
+        elif kind < 0.8:
+            draw.rectangle((0, 0) + size, fill=0)
+            draw.text((rng.randrange(size[0] // 2), rng.randrange(size[1] // 2)), str(rng.random()), fill=255)
+        yield image.copy()
+
+
+@pytest.mark.parametrize("driver,options", PANELS)
+def test_diffed_frames_show_the_same_as_full_redraws(driver, options):
+    device, bus, ram = panel(driver, **options)
+    reference, reference_bus, reference_ram = panel(driver, **options)
+    for image in frames(device.size, 150):
+        device.display(image)
+        ram.feed(bus)
+        # The reference sends every frame whole
+        reference.invalidate()
+        reference.display(image)
+        reference_ram.feed(reference_bus)
+
+        assert ram.shown(device) == reference_ram.shown(reference) == packed(device, image)
+    assert device.bytes_sent < reference.bytes_sent
+    assert device.bytes_sent + device.bytes_saved == reference.bytes_sent
+
+
+@pytest.mark.parametrize("driver,options", PANELS)
+def test_patches_leave_the_panel_as_the_last_frame_says(driver, options):
+    device, bus, ram = panel(driver, **options)
+    image = next(frames(device.size, 1))
+    device.display(image)
+    rng = random.Random(2)
+    for _ in range(50):
+        page = rng.randrange(device._pages)
+        start = rng.randrange(device._w - 8)
+        data = [bytes(rng.randrange(256) for _ in range(8))]
+        device.patch(page, start, data, masks=[rng.choice((0xFF, 0x0F, 0x3C))])
+        ram.feed(bus)
+        assert ram.shown(device) == b"".join(device._last)
+
+
+@pytest.mark.parametrize("driver,window_cost", [("ssd1306", 6), ("sh1106", 3)])
+def test_only_the_dirty_columns_of_dirty_pages_are_sent(driver, window_cost):
+    device, bus, ram = panel(driver)
+    image = Image.new('1', device.size)
+    device.display(image)
+    ram.feed(bus)
+    full_cost = device._full_cost
+
+    # One pixel: one page, one column
+    image.putpixel((10, 20), 255)
+    device.display(image)
+    assert bus.writes
+    ram.feed(bus)
+    assert device.last_bytes_sent == window_cost + 1
+    assert device.last_bytes_saved == full_cost - window_cost - 1
+    assert ram.shown(device) == packed(device, image)
+
+    # Two pixels far apart in one page: one window spanning both
+    before = ram.data_bytes
+    image.putpixel((5, 40), 255)
+    image.putpixel((100, 41), 255)
+    device.display(image)
+    ram.feed(bus)
+    assert ram.data_bytes - before == 96
+    assert device.last_bytes_sent == window_cost + 96
+
+    # Nothing changed: nothing on the bus
+    device.display(image)
+    assert not bus.writes
+    assert device.last_bytes_sent == 0
+    assert device.last_bytes_saved == full_cost
+    assert device.stats()["frames"] == 4
+
+
+def test_ssd1306_rewrites_everything_in_one_window_when_cheaper():
+    device, bus, ram = panel("ssd1306")
+    device.display(Image.new('1', device.size))
+    ram.feed(bus)
+    # Every page dirty across its width: a window per page would cost 7 * 6 bytes more than one over the panel
+    image = Image.new('1', device.size)
+    ImageDraw.Draw(image).rectangle((0, 0, 127, 63), outline=255)
+    device.display(image)
+    assert device.last_bytes_sent == device._full_cost == 6 + 1024
+    assert device.last_bytes_saved == 0
+    ram.feed(bus)
+    assert ram.shown(device) == packed(device, image)
+
+
+def test_invalidate_sends_the_next_frame_whole():
+    device, bus, ram = panel("sh1106")
+    image = next(frames(device.size, 1))
+    device.display(image)
+    device.invalidate()
+    device.display(image)
+    assert device.last_bytes_sent == device._full_cost == (3 + 128) * 8
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from fleet import FleetReceiver, FleetSender, decode_sample, encode_sample
+
+SAMPLE = (12.5, 40.0, 1.5, 63.0, 48.5)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def receiver():
+    receiver = FleetReceiver("127.0.0.1", 0)
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def test_samples_round_trip():
+    host, boot, seq, values = decode_sample(encode_sample("pi-rack-3", 7, 42, *SAMPLE[:4], None))
+    assert (host, boot, seq) == ("pi-rack-3", 7, 42)
+    assert values == SAMPLE[:4] + (None,)
+    with pytest.raises(ValueError):
+        decode_sample(b"OF\x01")
+
+
+def test_a_restarted_agent_is_followed_from_its_first_sample(receiver):
+    sender = FleetSender(*receiver.address, host="pi-1")
+    for cpu in (10.0, 20.0, 30.0):
+        sender.send((cpu,) + SAMPLE[1:])
+    wait_for(lambda: receiver.received == 3)
+    state = receiver.hosts["pi-1"]
+    assert (state.seq, state.values[0], state.samples, state.lost) == (3, 30.0, 3, 0)
+
+    # Restarted: a new boot nonce, and the sequence begins again at 1
+    sender.close()
+    sender = FleetSender(*receiver.address, host="pi-1")
+    sender.send((5.0,) + SAMPLE[1:])
+    wait_for(lambda: receiver.received == 4)
+    assert (state.seq, state.values[0], state.restarts, state.lost) == (1, 5.0, 1, 0)
+    [(host, values, age, stale)] = receiver.snapshot()
+    assert (host, values[0], stale) == ("pi-1", 5.0, False)
+    sender.close()
+
+
+def test_duplicates_and_reordered_samples_are_dropped(receiver):
+    address = ("10.0.0.5", 9110)
+    receiver.handle(encode_sample("pi-2", 1, 5, 50.0, *SAMPLE[1:]), address)
+    receiver.handle(encode_sample("pi-2", 1, 5, 60.0, *SAMPLE[1:]), address)
+    receiver.handle(encode_sample("pi-2", 1, 4, 40.0, *SAMPLE[1:]), address)
+    receiver.handle(encode_sample("pi-2", 1, 8, 80.0, *SAMPLE[1:]), address)
+    receiver.handle(b"not a sample", address)
+    state = receiver.hosts["pi-2"]
+    assert (state.seq, state.values[0], state.samples, state.lost, state.restarts) == (8, 80.0, 2, 2, 0)
+    assert receiver.rejected == 1
+
+
+def test_late_samples_from_before_a_restart_are_dropped(receiver):
+    address = ("10.0.0.6", 9110)
+    receiver.handle(encode_sample("pi-3", 1, 40, 40.0, *SAMPLE[1:]), address)
+    receiver.handle(encode_sample("pi-3", 2, 1, 10.0, *SAMPLE[1:]), address)
+    # Sent by the old run, delivered after the new one's first sample
+    receiver.handle(encode_sample("pi-3", 1, 41, 41.0, *SAMPLE[1:]), address)
+    receiver.handle(encode_sample("pi-3", 2, 2, 20.0, *SAMPLE[1:]), address)
+    state = receiver.hosts["pi-3"]
+    assert (state.boot, state.seq, state.values[0], state.restarts, state.lost) == (2, 2, 20.0, 1, 0)
+    assert list(state.retired) == [1]
@@ -0,0 +1,27 @@
+from PIL import Image, ImageDraw
+
+from fonts import TextCache, draw_text, get_font
+
+
+def test_least_recently_used_text_is_evicted():
+    cache = TextCache(maxsize=2)
+    font = get_font()
+    first = cache.get("CPU", font)
+    cache.get("RAM", font)
+    assert cache.get("CPU", font) is first
+    cache.get("Disk", font)  # Evicts RAM, used longest ago
+    assert cache.get("CPU", font) is first
+    cache.get("RAM", font)  # Rendered again, evicts Disk
+    assert (cache.hits, cache.misses, cache.stats()["size"]) == (2, 4, 2)
+    cache.get("Disk", font)
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_cached_text_draws_like_pil():
+    font = get_font()
+    drawn, pasted = Image.new('1', (128, 16)), Image.new('1', (128, 16))
+    ImageDraw.Draw(drawn).text((3, 2), "Temp: 48.3'C", font=font, fill=255)
+    draw_text(ImageDraw.Draw(pasted), (3, 2), "Temp: 48.3'C", font=font, fill=255)
+    assert pasted.tobytes() == drawn.tobytes()
+    draw_text(ImageDraw.Draw(pasted), (3, 2), "   ", font=font)
+    assert pasted.tobytes() == drawn.tobytes()
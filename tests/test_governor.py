@@ -0,0 +1,66 @@
+import config
+import governor
+from governor import RefreshGovernor
+
+
+class Sampler:
+    def __init__(self):
+        self.intervals = []
+
+    def set_interval(self, interval):
+        self.intervals.append(interval)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.cpu = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def process_time(self):
+        return self.cpu
+
+
+def test_steady_metrics_back_off_and_changes_snap_back(monkeypatch):
+    sampler = Sampler()
+    monkeypatch.setattr(governor, "get_cpu_sampler", lambda start=True: sampler)
+    clock = Clock()
+    refresh = RefreshGovernor("test", min_interval=1.0, max_interval=4.0,
+                              clock=clock.monotonic, cpu_clock=clock.process_time)
+
+    # Nothing to compare the first values with yet
+    assert refresh.update(cpu=20.0, temperature=50.0, memory=None) == 1.0
+    assert refresh.update(cpu=20.5, temperature=50.0) == 1.5
+    assert refresh.update(cpu=20.0, temperature=50.2) == 2.25
+    # Between steady and fast: kept
+    assert refresh.update(cpu=22.0, temperature=50.2) == 2.25
+    assert refresh.update(cpu=22.0, temperature=50.2) == 3.375
+    assert refresh.update(cpu=22.0, temperature=50.2) == 4.0
+    assert refresh.update(cpu=22.0, temperature=50.2) == 4.0
+    # A fast change
+    assert refresh.update(cpu=22.0, temperature=50.2 + config.GOVERNOR_FAST_CHANGE) == 1.0
+    assert sampler.intervals == [1.0, 1.5, 2.25, 2.25, 3.375, 4.0, 4.0, 1.0]
+
+
+def test_values_past_their_threshold_keep_the_minimum_interval(monkeypatch):
+    monkeypatch.setattr(governor, "get_cpu_sampler", lambda start=True: None)
+    refresh = RefreshGovernor("test", min_interval=1.0, max_interval=4.0)
+    hot = config.GOVERNOR_THRESHOLDS["temperature"]
+    refresh.update(cpu=10.0, temperature=40.0)
+    assert refresh.update(cpu=10.0, temperature=40.0) == 1.5
+    for _ in range(3):
+        assert refresh.update(cpu=10.0, temperature=hot) == 1.0
+
+
+def test_cpu_use_is_measured_per_interval(monkeypatch):
+    monkeypatch.setattr(governor, "get_cpu_sampler", lambda start=True: None)
+    clock = Clock()
+    refresh = RefreshGovernor("test", clock=clock.monotonic, cpu_clock=clock.process_time)
+    clock.now, clock.cpu = 2.0, 0.05
+    refresh.update(cpu=10.0)
+    assert refresh.cpu_percent == 2.5
+    clock.now, clock.cpu = 12.0, 0.06
+    refresh.update(cpu=10.0)
+    assert refresh.cpu_percent == 0.1
@@ -0,0 +1,52 @@
+import math
+import multiprocessing
+
+from history import MetricHistory, sparkline_segments
+
+TIERS = [(10, 6), (60, 4)]
+
+
+def test_buckets_average_and_gaps_read_as_nan(tmp_path):
+    history = MetricHistory(str(tmp_path / "cpu.ring"), TIERS)
+    for now, value in [(0, 10.0), (5, 20.0), (10, 30.0), (40, 50.0)]:
+        history.record(value, now)
+    # Buckets 2 and 3 were skipped, bucket 4 is still open
+    values = history.values(4)
+    assert values[:2] == [15.0, 30.0]
+    assert all(math.isnan(value) for value in values[2:])
+    history.record(0.0, 60)
+    assert history.values(1, tier=1) == [27.5]
+    history.close()
+
+    # Reopened with the same tiers, the history is still there
+    history = MetricHistory(str(tmp_path / "cpu.ring"), TIERS)
+    assert history.values(1, tier=1) == [27.5]
+    history.close()
+
+
+def record(path, count):
+    history = MetricHistory(path, TIERS)
+    for _ in range(count):
+        history.record(1.0, 5.0)
+    history.close()
+
+
+def test_processes_sharing_a_file_lose_no_samples(tmp_path):
+    path = str(tmp_path / "cpu.ring")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=record, args=(path, 2000)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    history = MetricHistory(path, TIERS)
+    _, bucket, total, count = history._read_tier(0)
+    assert (bucket, total, count) == (0, 8000.0, 8000)
+    history.close()
+
+
+def test_sparklines_break_at_gaps():
+    segments = sparkline_segments((0, 0, 4, 10), [0.0, 5.0, float("nan"), 10.0], low=0, high=10)
+    assert segments == [((1, 10), (2, 5)), ((4, 0),)]
@@ -0,0 +1,14 @@
+from icons import icon_code
+
+
+def test_unmapped_descriptions_fall_back_to_their_condition_group():
+    assert icon_code("Clear sky") == "01"
+    assert icon_code("Light rain") == "10"
+    assert icon_code("Heavy intensity rain") == "10"
+    # Matched in order: drizzle before rain, the storm before either
+    assert icon_code("Light intensity drizzle rain") == "09"
+    assert icon_code("Thunderstorm with heavy drizzle") == "11"
+    assert icon_code("Light shower sleet") == "13"
+    assert icon_code("Overcast clouds: 85-100%") == "04"
+    assert icon_code("Sand/dust whirls") == "50"
+    assert icon_code("Volcanic eruption") == "unknown"
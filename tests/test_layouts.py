@@ -0,0 +1,38 @@
+from layouts import RenderMemo, system_info
+from panel import panel
+
+STATS = {"ip_address": "192.168.1.20", "cpu_usage": 12.5, "temperature": "48.3'C",
+         "memory": (40.0, 1.5, 3.7), "disk": (31.2, 18.4, 58.9)}
+
+
+def test_unchanged_values_are_neither_drawn_nor_sent():
+    device, bus, ram = panel("ssd1306")
+    memo = RenderMemo("test")
+
+    def render(stats):
+        values = system_info.values(stats)
+        if memo.changed(values):
+            with device.canvas() as draw:
+                system_info.paint(draw, values)
+
+    render(STATS)
+    ram.feed(bus)
+    sent = ram.data_bytes
+    assert sent > 0
+    for _ in range(3):
+        render(dict(STATS))
+    assert (memo.drawn, memo.skipped) == (1, 3)
+    assert not bus.writes
+
+    render(dict(STATS, cpu_usage=13.0))
+    assert (memo.drawn, memo.skipped) == (2, 3)
+    ram.feed(bus)
+    assert 0 < ram.data_bytes - sent < sent
+
+    # Drawn again after invalidate(), though the diff layer has nothing to send
+    memo.invalidate()
+    sent = ram.data_bytes
+    render(dict(STATS, cpu_usage=13.0))
+    assert (memo.drawn, memo.skipped) == (3, 3)
+    ram.feed(bus)
+    assert ram.data_bytes == sent
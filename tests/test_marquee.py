@@ -0,0 +1,41 @@
+from PIL import Image, ImageDraw
+
+from fonts import get_font
+from layouts import DEFAULT_FONT
+from marquee import Marquee
+from panel import packed, panel
+
+BOX = (73, 39, 128, 51)  # The weather description's line
+
+
+def test_steps_show_what_a_redraw_would():
+    device, bus, ram = panel("ssd1306")
+    marquee = Marquee(device, "Thunderstorm with heavy drizzle", BOX, get_font(*DEFAULT_FONT), speed=30, step=3)
+    assert marquee.scrolling and marquee.interval == 0.1
+    image = Image.new('1', device.size)
+    draw = ImageDraw.Draw(image)
+    draw.text((0, 20), "Temp: 12°C", fill=255)
+    marquee.paint(draw)
+    device.display(image)
+    ram.feed(bus)
+
+    for step in range(1, 40):
+        assert marquee.step()
+        assert marquee.offset == 3 * step % marquee.period
+        ram.feed(bus)
+        marquee.paint(draw)
+        assert ram.shown(device) == packed(device, image)
+
+
+def test_scrolling_costs_a_fraction_of_the_bus():
+    device = panel("ssd1306")[0]
+    marquee = Marquee(device, "Thunderstorm with heavy drizzle", BOX, get_font(*DEFAULT_FONT), speed=30, step=3)
+    image = Image.new('1', device.size)
+    marquee.paint(ImageDraw.Draw(image))
+    device.display(image)
+    sent = device.bytes_sent
+    for _ in range(100):
+        marquee.step()
+    bytes_per_second = (device.bytes_sent - sent) / (100 * marquee.interval)
+    # A 100 kHz bus moves about 11 KB/s (9 clocks a byte)
+    assert bytes_per_second < 100000 / 9 / 8
@@ -0,0 +1,106 @@
+import errno
+import random
+import threading
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+from mirror import MirrorClient, MirrorServer, apply_windows, encode_windows
+from panel import panel
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_windows_round_trip():
+    rng = random.Random(5)
+    last = bytes(rng.randrange(256) for _ in range(1024))
+    frame = bytearray(last)
+    for _ in range(20):
+        frame[rng.randrange(1024)] = rng.randrange(256)
+    shown = bytearray(last)
+    apply_windows(shown, encode_windows(bytes(frame), last, 128, 8), 128)
+    assert shown == frame
+    assert encode_windows(last, last, 128, 8) == b""
+
+
+@pytest.mark.parametrize("viewers", [1, 4])
+def test_every_viewer_ends_on_the_last_frame_encoded_once(viewers):
+    server = MirrorServer("127.0.0.1", 0).start()
+    device, _, _ = panel("ssd1306")
+    channel = device.mirror = server.add_display("panel", device)
+    url = f"http://127.0.0.1:{server.port}"
+    image = Image.new('1', device.size)
+    draw = ImageDraw.Draw(image)
+    draw.text((0, 0), "mirror", fill=255)
+    device.display(image)
+    wait_for(lambda: channel.seq == 1)
+    shown = [bytes(device._last[0].obj)]
+
+    clients = [MirrorClient(url, "panel", timeout=10) for _ in range(viewers)]
+    received = [[] for _ in clients]
+
+    def follow(client, frames):
+        for frame, _ in client:
+            frames.append(frame)
+
+    for client, frames in zip(clients, received):
+        threading.Thread(target=follow, args=(client, frames), daemon=True).start()
+    # Every viewer starts from the same keyframe
+    wait_for(lambda: all(received))
+    assert channel.encoded == 2
+
+    rng = random.Random(6)
+    for step in range(40):
+        if step % 3:
+            x, y = rng.randrange(120), rng.randrange(56)
+            draw.rectangle((x, y, x + rng.randrange(1, 8), y + rng.randrange(1, 8)), fill=rng.choice((0, 255)))
+            device.display(image)
+        else:
+            device.patch(rng.randrange(device._pages), rng.randrange(100), [bytes(rng.randrange(256) for _ in range(8))])
+        frame = bytes(device._last[0].obj)
+        if frame != shown[-1]:
+            shown.append(frame)
+            # One at a time, so none is coalesced with the next
+            wait_for(lambda: channel.seq == len(shown))
+
+    wait_for(lambda: all(frames[-1] == shown[-1] for frames in received))
+    for frames in received:
+        assert frames == shown
+    # One event per frame however many watch, plus the keyframe they started from
+    assert channel.encoded == len(shown) + 1
+    assert server.viewers == viewers
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+class Published:
+    def __init__(self):
+        self.frames = []
+
+    def publish(self, frame):
+        self.frames.append(bytes(frame))
+
+
+def test_only_what_reached_the_panel_is_mirrored():
+    device, bus, _ = panel("ssd1306")
+    device.mirror = Published()
+    image = Image.new('1', device.size)
+    ImageDraw.Draw(image).text((0, 0), "mirror", fill=255)
+    device.display(image)
+    assert device.mirror.frames == [bytes(device._last[0].obj)]
+
+    def unplugged(*messages):
+        raise OSError(errno.EIO, "Remote I/O error")
+    bus.i2c_rdwr = unplugged
+    with pytest.raises(Exception):
+        device.patch(0, 0, [b"\xff" * 8])
+    ImageDraw.Draw(image).text((0, 20), "lost", fill=255)
+    with pytest.raises(Exception):
+        device.display(image)
+    assert len(device.mirror.frames) == 1
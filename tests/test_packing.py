@@ -0,0 +1,42 @@
+import random
+
+import pytest
+from PIL import Image
+
+from display import PACKERS, pack_pages_python
+from recorder import pages_to_image
+
+SIZES = [(128, 64), (128, 32), (64, 48), (16, 8)]
+
+
+def noise(size, seed):
+    rng = random.Random(seed)
+    return Image.frombytes('1', size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] // 8)))
+
+
+@pytest.mark.parametrize("name", sorted(PACKERS))
+@pytest.mark.parametrize("size", SIZES)
+def test_packers_agree_with_the_reference(name, size):
+    if name == "numpy":
+        pytest.importorskip("numpy")
+    width, height = size
+    for seed in range(5):
+        image = noise(size, seed)
+        expected = pack_pages_python(image, width, height // 8)
+        assert PACKERS[name](image, width, height // 8) == expected
+        # Into preallocated page views, as DiffDisplay packs
+        buf = bytearray(width * height // 8)
+        out = [memoryview(buf)[page * width:(page + 1) * width] for page in range(height // 8)]
+        PACKERS[name](image, width, height // 8, out)
+        assert bytes(buf) == b"".join(expected)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("rotate", [0, 1, 2, 3])
+def test_pages_unpack_to_the_image_drawn(size, rotate):
+    width, height = size
+    shown = noise(size, 7)
+    # A dashboard's image that luma's preprocess() (rotate by -90 degrees per step) turns into shown
+    drawn = shown.rotate(rotate * 90, expand=True)
+    data = b"".join(pack_pages_python(shown, width, height // 8))
+    assert pages_to_image(data, width, height, rotate).tobytes() == drawn.tobytes()
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+from luma.core.device import dummy
+from PIL import Image, ImageDraw
+
+from display import DiffDisplay
+from fonts import get_font
+from layouts import DEFAULT_FONT
+from marquee import Marquee
+from panel import panel
+from recorder import PATCH_INTERVAL, ROTATE_AFTER, FrameReader, FrameRecorder, rle_decode, rle_encode, xor_bytes
+
+
+def samples():
+    rng = random.Random(3)
+    yield b""
+    yield b"\x00"
+    yield b"\x00" * 1024
+    yield bytes(range(256)) * 2
+    yield b"ab" * 200 + b"\xff" * 300 + b"c"
+    # Runs of every length around the 128-byte limits, between literals
+    yield b"".join(bytes([n % 256]) * n + b"xy" for n in range(1, 300, 7))
+    for _ in range(20):
+        yield bytes(rng.choice((0, 0, 0, rng.randrange(256))) for _ in range(rng.randrange(2000)))
+
+
+@pytest.mark.parametrize("data", list(samples()))
+def test_rle_round_trips(data):
+    assert rle_decode(rle_encode(data)) == data
+
+
+def test_rle_shrinks_runs():
+    assert len(rle_encode(b"\x00" * 1024)) == 16
+
+
+def test_xor_undoes_itself():
+    a, b = bytes(range(200)), bytes(reversed(range(200)))
+    assert xor_bytes(xor_bytes(a, b), b) == a
+
+
+def test_recording_replays_every_frame(tmp_path):
+    rng = random.Random(4)
+    frame = bytearray(1024)
+    frames = []
+    clock = iter(range(100000)).__next__
+    recorder = FrameRecorder(str(tmp_path / "panel.oledrec"), 128, 64, rotate=2, clock=clock)
+    for _ in range(1300):  # Past two keyframe intervals
+        if rng.random() < 0.7:
+            frame[rng.randrange(1024)] = rng.randrange(256)
+        frames.append(bytes(frame))
+        recorder.record(frame)
+    recorder.close()
+
+    reader = FrameReader(recorder.path)
+    assert (reader.width, reader.height, reader.rotate) == (128, 64, 2)
+    assert [data for _, data in reader] == frames
+    assert recorder.bytes_written < 1300 * 1024 // 10
+
+
+@pytest.mark.parametrize("backend", ["capture", "dummy"])
+def test_patches_are_recorded_like_frames(tmp_path, backend):
+    device = panel("ssd1306")[0] if backend == "capture" else DiffDisplay(dummy(mode="1"))
+    device.recorder = FrameRecorder(str(tmp_path / "panel.oledrec"), device._w, device._pages * 8, patch_interval=0)
+    image = Image.new('1', device.size)
+    ImageDraw.Draw(image).text((0, 0), "recorded", fill=255)
+    device.display(image)
+    shown = [bytes(device._last[0].obj)]
+    rng = random.Random(5)
+    for _ in range(20):
+        device.patch(rng.randrange(device._pages), rng.randrange(100), [bytes(rng.randrange(256) for _ in range(8))])
+        shown.append(bytes(device._last[0].obj))
+    device.recorder.close()
+
+    # patch_interval 0 records every patch
+    assert [data for _, data in FrameReader(device.recorder.path)] == shown
+
+
+def test_a_day_of_scrolling_text_stays_within_the_budget(tmp_path):
+    device = panel("ssd1306")[0]
+    now = [0.0]
+    device.recorder = FrameRecorder(str(tmp_path / "panel.oledrec"), device._w, device._pages * 8, clock=lambda: now[0])
+    marquee = Marquee(device, "Thunderstorm with heavy drizzle", (73, 39, 128, 51), get_font(*DEFAULT_FONT))
+    image = Image.new('1', device.size)
+    marquee.paint(ImageDraw.Draw(image))
+    device.display(image)
+    minutes = 5
+    steps = round(minutes * 60 / marquee.interval)
+    for step in range(1, steps + 1):
+        now[0] = step * marquee.interval
+        marquee.step()
+    last = bytes(device._last[0].obj)
+    device.recorder.close()
+
+    frames = list(FrameReader(device.recorder.path))
+    assert len(frames) <= 2 + minutes * 60 / PATCH_INTERVAL
+    assert frames[-1][1] == last
+    assert device.recorder.bytes_written * 24 * 60 / minutes < 7e6
+
+
+def test_recordings_continue_in_a_new_file_every_day(tmp_path):
+    now = [0.0]
+    recorder = FrameRecorder(str(tmp_path / "panel.oledrec"), 128, 64, clock=lambda: now[0])
+    frames = [bytes([value]) * 1024 for value in range(5)]
+    for at, frame in zip([0.0, 3600.0, ROTATE_AFTER - 1, ROTATE_AFTER + 5, 2 * ROTATE_AFTER + 10], frames):
+        now[0] = at
+        recorder.record(frame)
+    recorder.close()
+
+    assert recorder.paths == [str(tmp_path / name) for name in ("panel.oledrec", "panel.1.oledrec", "panel.2.oledrec")]
+    readers = [FrameReader(path) for path in recorder.paths]
+    assert [reader.start for reader in readers] == [0.0, ROTATE_AFTER + 5, 2 * ROTATE_AFTER + 10]
+    assert [[frame for _, frame in reader] for reader in readers] == [frames[:3], frames[3:4], frames[4:]]
+    assert list(readers[0])[-1][0] == ROTATE_AFTER - 1
+    assert recorder.frames == 5
@@ -0,0 +1,81 @@
+import pytest
+
+from scheduler import Scheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_tasks_run_when_their_deadlines_are_due(clock):
+    scheduler = Scheduler(clock)
+    runs = []
+    scheduler.every("fast", 1.0, lambda: runs.append("fast"))
+    scheduler.every("slow", 2.5, lambda: runs.append("slow"), delay=2.5)
+
+    assert scheduler.run_pending() == 1.0
+    assert runs == ["fast"]
+    clock.now += 0.5
+    assert scheduler.run_pending() == 0.5
+    assert runs == ["fast"]
+    clock.now += 2.0
+    # Due at the same time: in the order registered
+    assert scheduler.run_pending() == pytest.approx(0.5)
+    assert runs == ["fast", "fast", "slow"]
+    assert scheduler.stats()["fast"]["runs"] == 2
+
+
+def test_late_runs_count_missed_deadlines_and_jitter(clock):
+    scheduler = Scheduler(clock)
+    task = scheduler.every("cpu", 1.0, lambda: None)
+    scheduler.run_pending()
+    clock.now += 4.25  # Slept through 3 deadlines, the fourth is 0.25 late
+    assert scheduler.run_pending() == pytest.approx(0.75)
+    stats = task.stats()
+    assert (stats["runs"], stats["missed"]) == (2, 3)
+    assert stats["max_jitter"] == pytest.approx(3.25)
+    assert stats["mean_jitter"] == pytest.approx(3.25 / 2)
+    # Back on the original grid rather than 1 s after the late run
+    assert task.deadline == 105.0
+
+
+def test_trigger_runs_a_task_now_and_once(clock):
+    scheduler = Scheduler(clock)
+    runs = []
+    scheduler.every("redraw", 10.0, lambda: runs.append(clock.now))
+    scheduler.run_pending()
+    clock.now += 3
+    scheduler.trigger("redraw")
+    assert scheduler._wake.is_set()
+    # Wakes once more at the deadline the trigger replaced, but does not run it
+    assert scheduler.run_pending() == 7.0
+    assert runs == [100.0, 103.0]
+    clock.now += 7
+    assert scheduler.run_pending() == 3.0
+    assert runs == [100.0, 103.0]
+
+
+def test_a_failing_task_is_rescheduled_and_the_others_keep_running(clock, capsys):
+    scheduler = Scheduler(clock)
+    runs = []
+
+    def unplugged():
+        raise OSError("I2C device not found")
+    scheduler.every("redraw-1-0x3c", 1.0, unplugged)
+    scheduler.every("redraw-1-0x3d", 1.0, lambda: runs.append(clock.now))
+    for _ in range(3):
+        assert scheduler.run_pending() == 1.0
+        clock.now += 1
+    assert runs == [100.0, 101.0, 102.0]
+    assert scheduler.stats()["redraw-1-0x3c"]["errors"] == 3
+    assert scheduler.stats()["redraw-1-0x3c"]["runs"] == 3
+    assert "redraw-1-0x3c failed" in capsys.readouterr().out
@@ -0,0 +1,106 @@
+import importlib.util
+import os
+
+import pytest
+
+import collectors
+import config
+import statsbus
+import weather
+from statsbus import StatsPublisher, StatsReader, decode, encode
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATS = {
+    "cpu_usage": 12.5, "cpu_speed": "1.5 GHz", "memory": (40.0, 1.5, 3.7), "ip_address": "192.168.1.20",
+    "mounts": [("/", statsbus.DiskUsage(100, 40, 60, 40.0), "ok"), ("usb", None, "hung")],
+    "weather_by_location": {"London": ("Light rain", 12.5, 81), "Paris": None},
+}
+
+
+@pytest.fixture
+def publisher(monkeypatch):
+    name = f"oled_stats_test_{os.getpid()}"
+    monkeypatch.setattr(config, "STATS_BUS_NAME", name)
+    monkeypatch.setattr(statsbus, "_reader", None)
+    publisher = StatsPublisher(name)
+    yield publisher
+    publisher.unlink()
+    publisher.close()
+
+
+def test_payloads_round_trip():
+    values, changes = decode(encode(STATS, 3))
+    assert changes == 3
+    assert values == STATS
+
+
+def test_readers_see_every_publish(publisher):
+    reader = StatsReader(publisher.name)
+    assert reader.read() is None
+    publisher.publish(STATS)
+    stats = {}
+    assert not reader.update(stats)
+    assert stats == STATS
+    publisher.publish(dict(STATS, cpu_usage=50.0), changed=True)
+    assert reader.update(stats)
+    assert stats["cpu_usage"] == 50.0
+    assert reader.age < 1
+    reader.close()
+
+
+def test_dashboards_collect_for_themselves_while_the_daemon_is_quiet(publisher, monkeypatch):
+    publisher.publish(STATS)
+    stats = {}
+    [(name, _, read_published)] = collectors.collector_tasks(stats)
+    assert name == "stats_bus"
+    read_published()
+    assert stats["cpu_usage"] == 12.5
+
+    collected = []
+
+    def collect_cpu():
+        collected.append(True)
+        stats["cpu_usage"] = 99.0
+
+    monkeypatch.setattr(collectors, "collector_tasks", lambda *args, **kwargs: [("cpu", 3600, collect_cpu)])
+    reader = statsbus.get_stats_reader()
+    monkeypatch.setattr(reader, "stale_after", -1.0)
+    assert reader.stale
+    read_published()
+    read_published()  # Not due again yet
+    assert collected == [True]
+    assert stats["cpu_usage"] == 99.0
+
+    # The daemon is back
+    monkeypatch.setattr(reader, "stale_after", config.STATS_BUS_STALE_AFTER)
+    publisher.publish(STATS)
+    read_published()
+    assert stats["cpu_usage"] == 12.5
+    assert collected == [True]
+
+
+def test_scripts_read_the_daemon_while_it_publishes(publisher, monkeypatch):
+    spec = importlib.util.spec_from_file_location("oled_stats2_under_test", os.path.join(HERE, "oled_stats2.py"))
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    local = {"ip_address": "10.0.0.2", "cpu_usage": 77.0, "memory": (50.0, 2.0, 4.0), "temperature": "51.0'C",
+             "disk": (10.0, 5.0, 50.0)}
+    for key, getter in [("ip_address", "get_ip_address"), ("cpu_usage", "get_cpu_usage"), ("memory", "get_memory_usage"),
+                        ("temperature", "get_temperature"), ("disk", "get_disk_usage")]:
+        monkeypatch.setattr(script, getter, lambda key=key: local[key])
+
+    publisher.publish(dict(STATS, temperature="45.1'C", disk=(31.2, 18.4, 58.9)))
+    stats = script.collect_stats()
+    assert (stats["cpu_usage"], stats["temperature"], stats["ip_address"]) == (12.5, "45.1'C", "192.168.1.20")
+    assert collectors.parse_temperature(stats["temperature"]) == 45.1
+
+    monkeypatch.setattr(config, "WEATHER_LOCATIONS", [{"q": "London"}, {"q": "Paris"}])
+    weather_stats = {}
+    weather.update_weather(weather_stats)
+    assert weather_stats == {"weather_location": "London", "weather": ("Light rain", 12.5, 81)}
+
+    # The daemon went quiet: collected in-process
+    monkeypatch.setattr(statsbus.get_stats_reader(), "stale_after", -1.0)
+    assert collectors.published_stats() is None
+    assert script.collect_stats() == local
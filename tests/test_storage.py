@@ -0,0 +1,44 @@
+import os
+import threading
+import time
+
+import psutil
+
+from collectors import StorageMonitor
+from statsbus import DiskUsage
+
+USAGE = DiskUsage(100, 40, 60, 40.0)
+
+
+def test_a_hung_mount_times_out_and_is_not_probed_again_until_it_answers(monkeypatch):
+    answer = threading.Event()
+    calls = []
+
+    def disk_usage(path):
+        calls.append(path)
+        if path == "/mnt/nfs":
+            answer.wait()
+        return USAGE
+
+    monkeypatch.setattr(psutil, "disk_usage", disk_usage)
+    monkeypatch.setattr(os.path, "ismount", lambda path: path != "/mnt/usb")
+    monitor = StorageMonitor(["/", "/mnt/nfs", "/mnt/usb"], timeout=0.2)
+
+    started = time.monotonic()
+    monitor.probe_mounts()
+    assert time.monotonic() - started < 1.0
+    assert monitor.states == {"/": "ok", "/mnt/nfs": "hung", "/mnt/usb": "missing"}
+    assert (monitor.usage("/"), monitor.usage("/mnt/nfs"), monitor.usage("/mnt/usb")) == (USAGE, None, None)
+    assert monitor.timeouts == 1
+
+    # Still stuck: no second thread is started for it
+    monitor.probe_mounts()
+    assert calls.count("/mnt/nfs") == 1
+    assert (monitor.states["/mnt/nfs"], monitor.timeouts) == ("hung", 1)
+
+    answer.set()
+    monitor._probes["/mnt/nfs"].join(1.0)
+    assert (monitor.states["/mnt/nfs"], monitor.usage("/mnt/nfs")) == ("ok", USAGE)
+    monitor.probe_mounts()
+    assert calls.count("/mnt/nfs") == 2
+    assert monitor.timeouts == 1
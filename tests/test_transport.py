@@ -0,0 +1,81 @@
+import random
+
+from PIL import Image
+
+from panel import packed, panel
+from transport import MAX_MESSAGES, SMBUS_BLOCK, I2CTransport, MockSMBus
+
+
+def noise(size, seed):
+    rng = random.Random(seed)
+    return Image.frombytes('1', size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] // 8)))
+
+
+def test_a_frame_goes_out_in_one_ioctl():
+    device, bus, ram = panel("sh1106")
+    calls = bus.calls
+    device.display(noise(device.size, 1))
+    # 8 pages of 3 commands and 128 data bytes, merged into 16 messages
+    assert bus.calls - calls == 1
+    assert len(bus.writes) == 16
+    ram.feed(bus)
+    assert ram.shown(device) == packed(device, noise(device.size, 1))
+
+
+def test_writes_outside_a_batch_go_out_at_once():
+    bus = MockSMBus()
+    transport = I2CTransport(bus)
+    transport.command(0xAE)
+    transport.data(b"\x01\x02")
+    assert bus.calls == 2
+    assert list(bus.writes) == [(0x3C, b"\x00\xae"), (0x3C, b"\x40\x01\x02")]
+    assert transport.bytes_sent == 3 + 4
+
+
+def test_batches_merge_runs_and_split_past_the_message_limit():
+    bus = MockSMBus()
+    transport = I2CTransport(bus, chunk_size=17)
+    with transport.batch():
+        transport.command(0x21, 0, 127)
+        transport.command(0x22, 0, 7)
+        with transport.batch():
+            transport.data(bytes(range(50)))
+        transport.data(bytes(range(50, 100)))
+        assert bus.calls == 0
+    # The commands merge into one message, the 100 data bytes into 16-byte ones
+    assert transport.messages == 1 + 7
+    assert bus.calls == 1
+    assert bytes(bus.writes[0][1]) == b"\x00\x21\x00\x7f\x22\x00\x07"
+    assert b"".join(message[1:] for _, message in list(bus.writes)[1:]) == bytes(range(100))
+    assert all(len(message) <= 17 for _, message in bus.writes)
+
+    bus.writes.clear()
+    with transport.batch():
+        for _ in range(MAX_MESSAGES + 1):
+            transport.command(0xE3)
+            transport.data(b"\x00")
+    assert bus.calls == 1 + 3
+    assert transport.messages == 8 + 2 * (MAX_MESSAGES + 1)
+
+
+def test_smbus_only_adapters_get_block_writes():
+    bus = MockSMBus(rdwr=False)
+    transport = I2CTransport(bus)
+    assert transport.chunk_size == SMBUS_BLOCK + 1
+    with transport.batch():
+        transport.command(*range(0xB0, 0xB0 + 20))
+        # Would overflow the first block: starts a new message rather than splitting
+        transport.command(*range(0xB0, 0xB0 + 20))
+        transport.data(bytes(100))
+    assert [len(message) - 1 for _, message in bus.writes] == [20, 20, 32, 32, 32, 4]
+    assert bus.calls == transport.transfers == 6
+
+
+def test_panels_on_smbus_only_adapters_show_every_frame():
+    device, bus, ram = panel("ssd1306", rdwr=False)
+    for seed in range(5):
+        image = noise(device.size, seed)
+        device.display(image)
+        assert all(len(message) <= SMBUS_BLOCK + 1 for _, message in bus.writes)
+        ram.feed(bus)
+        assert ram.shown(device) == packed(device, image)
@@ -0,0 +1,85 @@
+import select
+import socket
+import time
+
+from watchers import ChangeWatcher, ThermalTrips
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_trip_points_are_read_once_more_after_each_crossing(tmp_path):
+    (tmp_path / "trip_point_0_temp").write_text("60000\n")
+    (tmp_path / "trip_point_0_hyst").write_text("5000\n")
+    (tmp_path / "trip_point_1_temp").write_text("70000\n")
+    trips = ThermalTrips.from_zone(str(tmp_path))
+    assert trips.thresholds == [55.0, 60.0, 70.0]
+    assert ThermalTrips.from_zone(str(tmp_path / "missing")) is None
+
+    # First sample, then one more while the governor catches up, then quiet
+    assert [trips.crossed(temperature) for temperature in (40.0, 41.0, 42.0, 54.9)] == [True, True, False, False]
+    # Up past the trip point
+    assert [trips.crossed(temperature) for temperature in (61.0, 61.5, 62.0)] == [True, True, False]
+    # Down within the hysteresis, then below it
+    assert [trips.crossed(temperature) for temperature in (57.0, 57.5, 56.0, 50.0, 50.0, 50.0)] == \
+        [True, True, False, True, True, False]
+
+
+def test_a_burst_of_address_messages_is_one_change(tmp_path):
+    watcher = ChangeWatcher(mounts_path=str(tmp_path / "missing"))
+    kernel, ours = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    ours.setblocking(False)
+    watcher._add("address", ours, select.POLLIN)
+    calls = []
+    assert watcher.subscribe("address", lambda: calls.append(True))
+    assert not watcher.subscribe("mounts", lambda: None)
+
+    # Link, address and route messages of one change
+    for message in (b"link", b"address", b"route"):
+        kernel.send(message)
+    watcher.start()
+    wait_for(lambda: watcher.events["address"] == 1)
+    time.sleep(0.05)
+    assert (watcher.events["address"], calls) == (1, [True])
+    watcher.stop()
+    watcher.join(1.0)
+    kernel.close()
+    ours.close()
+
+
+class Poll:
+    """Reports each queued batch of (fd, events) in turn, like select.poll().poll()."""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+
+    def poll(self):
+        return self.batches.pop(0)
+
+
+def test_mount_table_changes_rearm_and_reach_every_listener(tmp_path, capsys):
+    mounts = tmp_path / "mounts"
+    mounts.write_text("/dev/root / ext4 rw 0 0\n")
+    watcher = ChangeWatcher(mounts_path=str(mounts))
+    assert watcher.watching("mounts")
+    calls = []
+
+    def broken():
+        raise RuntimeError("listener failed")
+    watcher.subscribe("mounts", broken)
+    watcher.subscribe("mounts", lambda: calls.append(True))
+
+    with open(mounts, "a") as f:
+        f.write("/dev/sda1 /mnt/usb vfat rw 0 0\n")
+    [(fd, (_, source))] = [(fd, entry) for fd, entry in watcher._sources.items() if entry[0] == "mounts"]
+    watcher._poll = Poll([(fd, select.POLLPRI)], [(watcher._stop_r, select.POLLIN)])
+    watcher.run()
+
+    assert (watcher.events["mounts"], calls) == (1, [True])
+    # Read to the end again, which arms the next POLLPRI
+    assert source.tell() == mounts.stat().st_size
+    assert "Error handling a mounts change: listener failed" in capsys.readouterr().out
@@ -0,0 +1,149 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from weather import GROUP_SIZE, CallQuota, WeatherFetcher
+
+RAIN = {"id": 2643743, "weather": [{"description": "light rain"}], "main": {"temp": 12.5, "humidity": 81}}
+
+
+class StubAPI(BaseHTTPRequestHandler):
+    """Answers with the responses queued on the server, recording each request."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.server.requests.append((url.path, parse_qs(url.query), dict(self.headers)))
+        status, headers, body = self.server.responses.pop(0)
+        body = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    server.requests = []
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher(api, **kwargs):
+    return WeatherFetcher([{"id": RAIN["id"], "name": "London"}], "key", interval=600, retry_delay=5,
+                          base_url=f"http://127.0.0.1:{api.server_address[1]}/data/2.5/", **kwargs)
+
+
+def test_unchanged_weather_is_revalidated_with_the_etag(api):
+    weather = fetcher(api)
+    api.responses.append((200, {"ETag": '"v1"'}, RAIN))
+    assert weather.fetch_once()
+    assert weather.latest() == ("Light rain", 12.5, 81)
+    path, params, headers = api.requests[0]
+    assert path == "/data/2.5/weather"
+    assert params == {"id": [str(RAIN["id"])], "appid": ["key"], "units": ["metric"]}
+    assert "If-None-Match" not in headers
+
+    # Fresh: nothing is fetched
+    assert weather.fetch_once()
+    assert len(api.requests) == 1
+
+    weather.entries["London"].fetched_at = 0.0
+    api.responses.append((304, {}, None))
+    assert weather.fetch_once()
+    assert api.requests[1][2]["If-None-Match"] == '"v1"'
+    assert weather.latest() == ("Light rain", 12.5, 81)
+    assert 599 < weather.next_delay() <= 600
+    weather.stop()
+
+
+def test_server_errors_back_off(api):
+    weather = fetcher(api)
+    api.responses += [(500, {}, None), (500, {}, None), (200, {}, RAIN)]
+    assert not weather.fetch_once()
+    assert weather.failures == 1
+    assert weather.latest() is None
+    assert 4.5 <= weather.next_delay() <= 5.5
+    assert not weather.fetch_once()
+    assert 9 <= weather.next_delay() <= 11
+    assert weather.fetch_once()
+    assert weather.failures == 0
+    assert weather.latest() == ("Light rain", 12.5, 81)
+    weather.stop()
+
+
+def test_a_restart_shows_the_cached_weather_without_calling(api, tmp_path):
+    cache_path = str(tmp_path / "weather_cache.json")
+    weather = fetcher(api, cache_path=cache_path, calls_per_hour=10)
+    api.responses.append((200, {"ETag": '"v1"'}, RAIN))
+    assert weather.fetch_once()
+    weather.stop()
+
+    restarted = fetcher(api, cache_path=cache_path, calls_per_hour=10)
+    assert restarted.latest() == ("Light rain", 12.5, 81)
+    assert restarted.entries["London"].etag == '"v1"'
+    assert restarted.quota.used() == 1
+    assert restarted.due() == []
+    assert restarted.fetch_once()
+    assert len(api.requests) == 1
+    restarted.stop()
+
+
+def test_due_ids_share_group_calls_and_fresh_ones_ride_along(api):
+    locations = [{"id": 1000 + i} for i in range(45)] + [{"q": "Paris,FR"}]
+    weather = WeatherFetcher(locations, "key", interval=600,
+                             base_url=f"http://127.0.0.1:{api.server_address[1]}/data/2.5/")
+    for entry in list(weather.entries.values())[21:45]:
+        entry.fetched_at = 1000.0
+    due = weather.due(now=1100.0)
+    assert len(due) == 22
+
+    calls = weather.plan(due)
+    sizes = [(endpoint, len(entries)) for endpoint, _, entries in calls]
+    assert sizes == [("group", 20), ("group", GROUP_SIZE), ("weather", 1)]
+    # The 21st due ID fills its call up with the first IDs that are not due
+    assert calls[1][1] == {"id": ",".join(str(1000 + i) for i in range(20, 40))}
+    assert calls[2][1] == {"q": "Paris,FR"}
+
+    # A lone ID with nothing to ride along goes to the single-city endpoint
+    only = WeatherFetcher([{"id": 7}], "key")
+    assert only.plan(only.due()) == [("weather", {"id": 7}, list(only.entries.values()))]
+    weather.stop()
+    only.stop()
+
+
+def test_calls_over_the_quota_wait_for_a_free_slot(api):
+    now = [0.0]
+    quota = CallQuota(2, window=3600.0, clock=lambda: now[0])
+    assert quota.acquire()
+    now[0] = 100.0
+    assert quota.acquire()
+    now[0] = 200.0
+    assert not quota.acquire()
+    assert (quota.used(), quota.denied, quota.wait_time()) == (2, 1, 3400.0)
+    now[0] = 3600.0
+    assert quota.acquire()
+    assert quota.wait_time() == 100.0  # Until the call at 100 leaves the window
+
+    weather = fetcher(api, calls_per_hour=1)
+    api.responses.append((200, {}, RAIN))
+    assert weather.fetch_once()
+    weather.entries["London"].fetched_at = 0.0
+    assert not weather.fetch_once()
+    assert len(api.requests) == 1
+    assert (weather.quota.denied, weather.last_error, weather.failures) == (1, "hourly call quota used up", 0)
+    # Not a failure: the next try waits for the slot, not for a backoff
+    assert 3590 < weather.next_delay() <= 3600
+    weather.stop()
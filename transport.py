@@ -0,0 +1,172 @@
+# transport.py
+# I2C transport for the ssd1306 / sh1106 panels, a drop-in replacement for
+# luma's i2c serial interface.
+#
+# Every command() and data() call becomes an I2C message (control byte 0x00 +
+# commands, or 0x40 + up to chunk_size - 1 data bytes). Inside batch(), the
+# messages of a whole frame are queued, runs of commands or data are merged,
+# and everything goes out in as few I2C_RDWR ioctls as possible. Buses with
+# only SMBus block writes get 32-byte blocks instead.
+#
+# Transfers (bus calls), messages, bytes and the achieved bytes/sec are
+# counted. Any object with smbus2's write_i2c_block_data()/i2c_rdwr() can
+# stand in for the bus; MockSMBus records what would have been sent so
+# transfer counts can be checked without hardware.
+#
+# The bus clock itself is set by the kernel, not here: on a Raspberry Pi add
+# dtparam=i2c_arm_baudrate=400000 to /boot/firmware/config.txt.
+# read_bus_clock() reports what the adapter is actually running at.
+
+import contextlib
+import errno
+import time
+from collections import deque
+
+CONTROL_COMMANDS = 0x00  # Co=0, D/C#=0: command bytes until the end of the message
+CONTROL_DATA = 0x40  # Co=0, D/C#=1: data bytes until the end of the message
+MAX_MESSAGES = 42  # I2C_RDWR_IOCTL_MAX_MSGS in the Linux i2c-dev driver
+SMBUS_BLOCK = 32  # Largest SMBus block write payload
+
+
+class I2CTransport:
+    """Serial interface for luma devices that coalesces writes into block transfers."""
+
+    def __init__(self, bus=None, port=1, address=0x3C, chunk_size=4096):
+        self.address = address
+        self._managed = bus is None
+        if bus is None:
+            import smbus2
+            try:
+                bus = smbus2.SMBus(port)
+            except OSError as e:
+                import luma.core.error
+                if e.errno == errno.ENOENT:
+                    raise luma.core.error.DeviceNotFoundError(f"I2C device not found: {e.filename}") from e
+                if e.errno in (errno.EPERM, errno.EACCES):
+                    raise luma.core.error.DevicePermissionError(f"I2C device permission denied: {e.filename}") from e
+                raise
+        self._bus = bus
+        # Message length limit including the control byte
+        if callable(getattr(bus, "i2c_rdwr", None)):
+            from smbus2 import i2c_msg
+            self._msg_write = i2c_msg.write
+            self.chunk_size = max(2, chunk_size)
+        else:
+            self._msg_write = None
+            self.chunk_size = max(2, min(chunk_size, SMBUS_BLOCK + 1))
+
+        self.transfers = 0
+        self.messages = 0
+        self.bytes_sent = 0
+        self.busy_seconds = 0.0
+        self._queue = None
+        self._depth = 0
+
+    @property
+    def bytes_per_second(self):
+        """Achieved throughput while the bus was busy, or None before the first transfer."""
+        return self.bytes_sent / self.busy_seconds if self.busy_seconds else None
+
+    def command(self, *cmd):
+        self._write(CONTROL_COMMANDS, cmd)
+
+    def data(self, data):
+        self._write(CONTROL_DATA, data)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Queues every write inside the block and sends them together at the end."""
+        if self._depth == 0:
+            self._queue = []
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._depth == 1:
+                self._queue = None
+            raise
+        finally:
+            self._depth -= 1
+        if self._depth == 0:
+            queue, self._queue = self._queue, None
+            self._send(queue)
+
+    def cleanup(self):
+        if self._managed:
+            self._bus.close()
+
+    def _write(self, control, payload):
+        queue = [] if self._queue is None else self._queue
+        limit = self.chunk_size - 1
+        payload = bytes(payload)
+        # Continue the previous message if it is of the same kind and has room;
+        # a command sequence is only appended whole so no command is split up
+        if queue and queue[-1][0] == control:
+            last = queue[-1]
+            room = limit + 1 - len(last)
+            if control == CONTROL_DATA or len(payload) <= room:
+                last += payload[:room]
+                payload = payload[room:]
+        for start in range(0, len(payload), limit):
+            queue.append(bytearray([control]) + payload[start:start + limit])
+        if self._queue is None:
+            self._send(queue)
+
+    def _send(self, queue):
+        if not queue:
+            return
+        start = time.perf_counter()
+        try:
+            if self._msg_write is not None:
+                for first in range(0, len(queue), MAX_MESSAGES):
+                    self._bus.i2c_rdwr(*[self._msg_write(self.address, message)
+                                         for message in queue[first:first + MAX_MESSAGES]])
+                    self.transfers += 1
+            else:
+                for message in queue:
+                    self._bus.write_i2c_block_data(self.address, message[0], list(message[1:]))
+                    self.transfers += 1
+        except OSError as e:
+            if e.errno in (errno.EREMOTEIO, errno.EIO):
+                import luma.core.error
+                raise luma.core.error.DeviceNotFoundError(
+                    f"I2C device not found on address: {self.address:#04x}") from e
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+        self.messages += len(queue)
+        # Payload plus the address byte every message starts with
+        self.bytes_sent += sum(len(message) + 1 for message in queue)
+
+
+class MockSMBus:
+    """Stand-in for smbus2.SMBus that records the last writes instead of touching a bus."""
+
+    def __init__(self, keep=1000, rdwr=True):
+        self.calls = 0
+        self.writes = deque(maxlen=keep)  # (address, message bytes), oldest first
+        if not rdwr:
+            # Behave like an adapter limited to SMBus block writes
+            self.i2c_rdwr = None
+
+    def write_i2c_block_data(self, address, register, data):
+        assert len(data) <= SMBUS_BLOCK
+        self.calls += 1
+        self.writes.append((address, bytes([register]) + bytes(data)))
+
+    def i2c_rdwr(self, *messages):
+        self.calls += 1
+        for message in messages:
+            self.writes.append((message.addr, bytes(message)))
+
+    def close(self):
+        pass
+
+
+def read_bus_clock(port):
+    """Returns the clock of I2C adapter port in Hz from the device tree, or None if unknown."""
+    try:
+        with open(f"/sys/class/i2c-adapter/i2c-{port}/of_node/clock-frequency", 'rb') as f:
+            return int.from_bytes(f.read(4), "big")
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,157 @@
+# watchers.py
+# Change notifications for the values that almost never change.
+# One thread sleeps in poll() on a netlink route socket (woken by link,
+# address and route changes, i.e. the IP address) and on /proc/self/mounts
+# (which signals POLLPRI whenever the mount table changes, i.e. drives plugged
+# or unplugged) and calls the listeners of whatever changed. Nothing is read
+# in between, so the collectors can stop polling these values.
+#
+# sysfs does not notify changes of the fan's cooling state, but the thermal
+# governor only changes it when the temperature crosses a trip point of the
+# thermal zone. ThermalTrips tells from the temperature samples taken anyway
+# when the state is worth reading again.
+
+import bisect
+import glob
+import os
+import select
+import socket
+import threading
+
+# rtnetlink multicast groups: link state, IPv4 addresses, IPv4 routes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+MOUNTS_PATH = "/proc/self/mounts"
+THERMAL_ZONE_PATH = "/sys/class/thermal/thermal_zone0"
+
+
+class ChangeWatcher(threading.Thread):
+    """Calls listeners when the network configuration ("address") or the mount table ("mounts") changes."""
+
+    def __init__(self, mounts_path=MOUNTS_PATH):
+        super().__init__(name="change-watcher", daemon=True)
+        self.events = {"address": 0, "mounts": 0}
+        self._listeners = {"address": [], "mounts": []}
+        self._lock = threading.Lock()
+        self._poll = select.poll()
+        self._sources = {}  # fd: (kind, socket or file)
+        self._stop_r, self._stop_w = os.pipe()
+        self._poll.register(self._stop_r, select.POLLIN)
+
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE))
+            sock.setblocking(False)
+            self._add("address", sock, select.POLLIN)
+        except (OSError, AttributeError):
+            pass  # Not Linux, or no netlink in this sandbox: the address is polled instead
+        try:
+            mounts = open(mounts_path, 'rb')
+            mounts.read()
+            self._add("mounts", mounts, select.POLLPRI)
+        except OSError:
+            pass
+
+    def _add(self, kind, source, events):
+        self._sources[source.fileno()] = (kind, source)
+        self._poll.register(source.fileno(), events)
+
+    def watching(self, kind):
+        """True if changes of kind are notified here."""
+        return any(watched == kind for watched, _ in self._sources.values())
+
+    def subscribe(self, kind, callback):
+        """Calls callback() from the watcher thread after every change of kind.
+
+        Returns False if kind cannot be watched here; the caller keeps polling it then.
+        """
+        if not self.watching(kind):
+            return False
+        with self._lock:
+            self._listeners[kind].append(callback)
+        return True
+
+    def run(self):
+        while True:
+            changed = set()
+            for fd, _ in self._poll.poll():
+                if fd == self._stop_r:
+                    return
+                kind, source = self._sources[fd]
+                if kind == "address":
+                    self._drain(source)
+                else:
+                    # Reading the table again arms the next notification
+                    source.seek(0)
+                    source.read()
+                changed.add(kind)
+
+            for kind in changed:
+                self.events[kind] += 1
+                with self._lock:
+                    listeners = list(self._listeners[kind])
+                for callback in listeners:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"Error handling a {kind} change: {e}")
+
+    @staticmethod
+    def _drain(sock):
+        # A change arrives as a burst of messages (link, address, route), handled as one
+        while True:
+            try:
+                if not sock.recv(65536):
+                    return
+            except BlockingIOError:
+                return
+            except OSError:
+                return  # ENOBUFS: messages were dropped, but something changed all the same
+
+    def stop(self):
+        os.write(self._stop_w, b"x")
+
+
+class ThermalTrips:
+    """Says from the temperature samples when a thermal zone's cooling state is worth reading again.
+
+    The thermal governor only changes the state when the temperature rises
+    past a trip point or falls below a trip point minus its hysteresis.
+    """
+
+    def __init__(self, thresholds):
+        self.thresholds = sorted(set(thresholds))
+        self._band = None
+        self._settle = 0
+
+    @classmethod
+    def from_zone(cls, path=THERMAL_ZONE_PATH):
+        """Reads the trip points (degrees Celsius) of a thermal zone; None if it has none."""
+        thresholds = []
+        for trip in glob.glob(os.path.join(path, "trip_point_*_temp")):
+            try:
+                with open(trip, 'r') as f:
+                    temp = int(f.read().strip()) / 1000.0
+            except (OSError, ValueError):
+                continue
+            try:
+                with open(trip[:-len("temp")] + "hyst", 'r') as f:
+                    hysteresis = int(f.read().strip()) / 1000.0
+            except (OSError, ValueError):
+                hysteresis = 0.0
+            thresholds += [temp, temp - hysteresis]
+        return cls(thresholds) if thresholds else None
+
+    def crossed(self, temperature):
+        """Returns True if the cooling state should be read again after this temperature sample."""
+        band = bisect.bisect(self.thresholds, temperature)
+        if band != self._band:
+            self._band = band
+            # The governor acts on the zone's own polling interval, so read once more next sample
+            self._settle = 1
+            return True
+        if self._settle:
+            self._settle -= 1
+            return True
+        return False
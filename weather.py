@@ -0,0 +1,346 @@
+# weather.py
+# Background OpenWeatherMap fetcher.
+# Fetches on its own thread with a reused HTTP connection, conditional requests
+# and exponential backoff, and keeps the last good response on disk so a
+# restarted service can show weather straight away. requests is only imported
+# when the fetcher is created, so dashboards can paint before paying for it.
+#
+# Several locations share one fetcher. Each has its own TTL; locations given by
+# city ID are fetched together through the group endpoint (up to 20 per call),
+# and IDs that are not due yet ride along for free when a group call goes out
+# anyway. Locations given by name cost one call each. Calls over the last hour
+# are counted, survive restarts through the cache file and are capped to the
+# configured quota; a location that would exceed it waits for a free slot.
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import config
+from metrics import timed, register_gauge
+from statsbus import get_stats_reader
+
+API_URL = "http://api.openweathermap.org/data/2.5/"
+GROUP_SIZE = 20  # Most city IDs the group endpoint takes in one call
+
+
+def parse_weather(data):
+    """Returns (description, temperature, humidity) from an OpenWeatherMap response."""
+    description = data['weather'][0]['description'].capitalize()
+    temperature = data['main']['temp']
+    humidity = data['main']['humidity']
+    return description, temperature, humidity
+
+
+def location_name(location):
+    """Returns the name a location is shown and looked up by."""
+    return location.get("name") or location.get("q") or str(location["id"])
+
+
+class CallQuota:
+    """Counts API calls over a sliding window and refuses the ones above limit."""
+
+    def __init__(self, limit=None, window=3600.0, clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.calls = deque()  # Timestamps of the calls in the window, oldest first
+        self.denied = 0
+
+    def used(self):
+        """Calls made within the last window."""
+        cutoff = self.clock() - self.window
+        while self.calls and self.calls[0] <= cutoff:
+            self.calls.popleft()
+        return len(self.calls)
+
+    def acquire(self):
+        """Records a call and returns True, or returns False if the quota is used up."""
+        if self.limit is not None and self.used() >= self.limit:
+            self.denied += 1
+            return False
+        self.calls.append(self.clock())
+        return True
+
+    def wait_time(self):
+        """Seconds until acquire() can succeed again."""
+        if self.limit is None or self.used() < self.limit:
+            return 0.0
+        if not self.calls:
+            return self.window
+        return self.calls[0] + self.window - self.clock()
+
+
+class LocationWeather:
+    """Latest response for one location, plus what is needed to refresh it."""
+
+    __slots__ = ("location", "name", "ttl", "data", "fetched_at", "etag", "last_modified")
+
+    def __init__(self, location, ttl):
+        self.location = location
+        self.name = location_name(location)
+        self.ttl = ttl
+        self.data = None
+        self.fetched_at = 0.0
+        self.etag = None
+        self.last_modified = None
+
+
+class WeatherFetcher(threading.Thread):
+    """Keeps the latest weather for a list of locations up to date in the background."""
+
+    def __init__(self, locations, api_key, interval=60, timeout=10, cache_path=None,
+                 retry_delay=5, max_backoff=900, calls_per_hour=None, base_url=API_URL):
+        super().__init__(name="weather-fetcher", daemon=True)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.interval = interval
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.quota = CallQuota(calls_per_hour)
+
+        # Per location TTL, the fetch interval unless the location sets its own
+        self.entries = {}
+        for location in locations:
+            entry = LocationWeather(location, location.get("ttl", interval))
+            self.entries[entry.name] = entry
+        if not self.entries:
+            raise ValueError("no weather locations configured")
+        self.names = list(self.entries)
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # One pooled keep-alive connection, retries are handled by our backoff
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+        self.failures = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._errors = (requests.RequestException, ValueError, KeyError, IndexError, TypeError)
+        self._load_cache()
+
+    def latest(self, name=None):
+        """Returns the last good (description, temperature, humidity) for a location, or None if there is none yet.
+
+        Without a name, the first configured location is used.
+        """
+        entry = self.entries.get(self.names[0] if name is None else name)
+        if entry is None or entry.data is None:
+            return None
+        return parse_weather(entry.data)
+
+    def due(self, now=None):
+        """Returns the entries whose TTL has run out."""
+        now = time.time() if now is None else now
+        return [entry for entry in self.entries.values() if now - entry.fetched_at >= entry.ttl]
+
+    def plan(self, due):
+        """Splits the due entries into as few calls as possible: [(endpoint, params, entries)]."""
+        by_id = [entry for entry in due if "id" in entry.location]
+        if by_id:
+            # Fill the last group call up with IDs that are not due yet, they cost nothing extra
+            spare = -len(by_id) % GROUP_SIZE
+            by_id += [entry for entry in self.entries.values()
+                      if "id" in entry.location and entry not in due][:spare]
+        calls = []
+        for first in range(0, len(by_id), GROUP_SIZE):
+            group = by_id[first:first + GROUP_SIZE]
+            if len(group) == 1:
+                calls.append(("weather", {"id": group[0].location["id"]}, group))
+            else:
+                calls.append(("group", {"id": ",".join(str(entry.location["id"]) for entry in group)}, group))
+        for entry in due:
+            if "id" not in entry.location:
+                calls.append(("weather", {"q": entry.location["q"]}, [entry]))
+        return calls
+
+    def request(self, endpoint, params, entries):
+        """Performs one call and stores the responses for entries."""
+        # Conditional requests only make sense for a single location's response
+        headers = {}
+        if len(entries) == 1:
+            if entries[0].etag:
+                headers["If-None-Match"] = entries[0].etag
+            if entries[0].last_modified:
+                headers["If-Modified-Since"] = entries[0].last_modified
+
+        response = self.session.get(self.base_url + endpoint, headers=headers, timeout=self.timeout,
+                                    params=dict(params, appid=self.api_key, units="metric"))
+        now = time.time()
+        if response.status_code == 304:
+            entries[0].fetched_at = now
+            return
+        response.raise_for_status()
+        data = response.json()
+
+        if endpoint == "group":
+            results = {item["id"]: item for item in data["list"]}
+        else:
+            results = {entries[0].location.get("id"): data}
+        for entry in entries:
+            item = results.get(entry.location.get("id"))
+            if item is None:
+                # Unknown city ID; keep the old response and wait a TTL instead of asking again at once
+                print(f"No weather returned for {entry.name}")
+            else:
+                parse_weather(item)  # Reject responses we can't display
+                entry.data = item
+                if len(entries) == 1:
+                    entry.etag = response.headers.get("ETag")
+                    entry.last_modified = response.headers.get("Last-Modified")
+            entry.fetched_at = now
+
+    @timed("fetch_weather_data")
+    def fetch_once(self):
+        """Fetches every location that is due. Returns True if all of them are current."""
+        calls = self.plan(self.due())
+        for endpoint, params, entries in calls:
+            if not self.quota.acquire():
+                self.last_error = "hourly call quota used up"
+                self._save_cache()
+                return False
+            try:
+                self.request(endpoint, params, entries)
+            except self._errors as e:
+                self.failures += 1
+                self.last_error = e
+                self._save_cache()
+                return False
+
+        self.failures = 0
+        self.last_error = None
+        if calls:
+            self._save_cache()
+        return True
+
+    def next_delay(self):
+        """Seconds until the next fetch: the earliest TTL or a free quota slot, or an exponential backoff after failures."""
+        if self.failures:
+            backoff = min(self.retry_delay * 2 ** (self.failures - 1), self.max_backoff)
+            return backoff * random.uniform(0.9, 1.1)
+        expires = min(entry.fetched_at + entry.ttl for entry in self.entries.values())
+        return max(0.0, expires - time.time(), self.quota.wait_time())
+
+    def run(self):
+        # Don't refetch on startup while the cached responses are still fresh
+        delay = self.next_delay()
+        while not self._stop_event.wait(delay):
+            self.fetch_once()
+            delay = self.next_delay()
+
+    def stop(self):
+        self._stop_event.set()
+        self.session.close()
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+            # A cache from the single-location fetcher belongs to the first location
+            locations = cached["locations"] if "locations" in cached else {self.names[0]: cached}
+            calls = [float(timestamp) for timestamp in cached.get("calls", [])]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+
+        self.quota.calls.extend(sorted(calls))
+        for name, entry in self.entries.items():
+            saved = locations.get(name)
+            try:
+                parse_weather(saved["data"])
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue
+            entry.data = saved["data"]
+            entry.etag = saved.get("etag")
+            entry.last_modified = saved.get("last_modified")
+            entry.fetched_at = saved.get("fetched_at", 0.0)
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        self.quota.used()  # Drop calls that left the window
+        cached = {
+            "locations": {
+                entry.name: {
+                    "data": entry.data,
+                    "etag": entry.etag,
+                    "last_modified": entry.last_modified,
+                    "fetched_at": entry.fetched_at,
+                }
+                for entry in self.entries.values() if entry.data is not None
+            },
+            "calls": list(self.quota.calls),
+        }
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+
+_weather_fetcher = None
+_weather_fetcher_lock = threading.Lock()
+
+
+def get_weather_fetcher():
+    """Returns the shared WeatherFetcher for config.WEATHER_LOCATIONS, starting it on first use."""
+    global _weather_fetcher
+    with _weather_fetcher_lock:
+        if _weather_fetcher is None:
+            fetcher = WeatherFetcher(
+                config.WEATHER_LOCATIONS,
+                config.API_KEY,
+                interval=config.WEATHER_UPDATE_INTERVAL,
+                timeout=config.WEATHER_TIMEOUT,
+                cache_path=config.WEATHER_CACHE_PATH,
+                calls_per_hour=config.WEATHER_CALLS_PER_HOUR)
+            register_gauge("weather_calls_last_hour", "OpenWeatherMap calls made within the last hour.",
+                           fetcher.quota.used)
+            register_gauge("weather_calls_denied", "OpenWeatherMap calls held back by the hourly quota.",
+                           lambda: fetcher.quota.denied)
+            for name, entry in fetcher.entries.items():
+                register_gauge("weather_age_seconds", "Age of the weather shown for a location.",
+                               lambda entry=entry: time.time() - entry.fetched_at if entry.data else None,
+                               location=name)
+            fetcher.start()
+            _weather_fetcher = fetcher
+    return _weather_fetcher
+
+
+def weather_locations():
+    """Names of the configured locations, in the order pages rotate through them."""
+    return [location_name(location) for location in config.WEATHER_LOCATIONS]
+
+
+def fetch_weather_data(name=None):
+    """Returns the latest (description, temperature, humidity) for a location without blocking, or None."""
+    return get_weather_fetcher().latest(name)
+
+
+def update_weather(stats, advance=False):
+    """Stores the location being shown and its latest weather in stats, moving on to the next location if advance."""
+    names = weather_locations()
+    name = stats.get("weather_location")
+    if name not in names:
+        name = names[0]
+    elif advance:
+        name = names[(names.index(name) + 1) % len(names)]
+    stats["weather_location"] = name
+    reader = get_stats_reader()
+    if reader is not None and not reader.stale:
+        # Fetched by the collector daemon, see statsbus.py
+        published = reader.read()
+        stats["weather"] = published[0]["weather_by_location"].get(name) if published is not None else None
+    else:
+        stats["weather"] = fetch_weather_data(name)